@@ -35,6 +35,11 @@ configcomment = """#
 # nullvalue       : The value used to replace null or empty entries when printing into a file
 # outfile_max_mb  : Max size of each fits file in MB (default 1GB)
 # compression     : Toggles compression on output files (default no)
+# manifest        : Write a JSON manifest (shards, rows, checksums) next to output files (default yes)
+# readahead       : Number of chunks read ahead while uploading data to the DB (default 1)
+# schema_scan     : Scan the whole file for column types before uploading by chunks (default yes)
+# metadata_ttl    : Hours before the metadata cached on disk for auto-completion is refreshed
+#                   in the background at startup (default 24)
 # autocommit      : Auto commit changes in DB (default yes)
 # trim_whitespace : Trim whitespace from strings when uploading data to the DB (default yes)
 # desdm_coldefs   : Use DESDM DB compatible data types when uploading data (default yes)
@@ -103,6 +108,18 @@ def get_config(configfile):
     if not config.has_option('easyaccess', 'compression'):
         configwrite = True
         config.set('easyaccess', 'compression', 'no')
+    if not config.has_option('easyaccess', 'manifest'):
+        configwrite = True
+        config.set('easyaccess', 'manifest', 'yes')
+    if not config.has_option('easyaccess', 'readahead'):
+        configwrite = True
+        config.set('easyaccess', 'readahead', '1')
+    if not config.has_option('easyaccess', 'schema_scan'):
+        configwrite = True
+        config.set('easyaccess', 'schema_scan', 'yes')
+    if not config.has_option('easyaccess', 'metadata_ttl'):
+        configwrite = True
+        config.set('easyaccess', 'metadata_ttl', '24')
     if not config.has_option('easyaccess', 'trim_whitespace'):
         configwrite = True
         config.set('easyaccess', 'trim_whitespace', 'yes')
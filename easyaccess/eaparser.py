@@ -2,6 +2,7 @@ from __future__ import print_function
 import argparse
 from . import config_ea as config_mod
 from .version import __version__
+from .eautils.load_utils import parse_chunksize
 import sys
 import os
 
@@ -39,7 +40,9 @@ def get_args(config_file):
         dest="loadtable",
         help="Loads data from a csv, tab, or fits formatted file \
                         into a DB table using the filename as the table name or a custom \
-                        name with --tablename MYTABLE. Not available in desdr.",
+                        name with --tablename MYTABLE. A quoted pattern ('tiles/*.fits') \
+                        or a directory loads several files into one table (with --tablename). \
+                        Not available in desdr.",
     )
     parser.add_argument(
         "-at",
@@ -58,18 +61,78 @@ def get_args(config_file):
     parser.add_argument(
         "--chunksize",
         dest="chunksize",
-        type=int,
+        type=parse_chunksize,
         default=None,
         help="Number of rows to be inserted at a time. Useful for large files "
-        "that do not fit in memory. Use with --load_table or --append_table",
+        "that do not fit in memory ('auto' tunes it while uploading). "
+        "Use with --load_table or --append_table",
     )
     parser.add_argument(
         "--memsize",
         dest="memsize",
         type=int,
         default=None,
-        help=" Size of chunk to be read at a time in Mb. Use with --load_table or "
-        "--append_table",
+        help="Memory in Mb shared by all the chunks held at the same time "
+        "(read ahead and being inserted). Use with --load_table or --append_table",
+    )
+    parser.add_argument(
+        "--workers",
+        dest="workers",
+        type=int,
+        default=None,
+        help="Number of DB sessions inserting chunks in parallel. Use with --load_table "
+        "or --append_table",
+    )
+    parser.add_argument(
+        "--columns",
+        dest="columns",
+        default=None,
+        help="Comma separated list of columns to upload. Use with --load_table "
+        "or --append_table",
+    )
+    parser.add_argument(
+        "--resume",
+        dest="resume",
+        action="store_true",
+        help="Commit by chunks and continue a previous --load_table or --append_table "
+        "of the same file that failed",
+    )
+    parser.add_argument(
+        "--key",
+        dest="key",
+        default=None,
+        help="Comma separated list of key columns, rows already in the table are "
+        "skipped. Use with --append_table",
+    )
+    parser.add_argument(
+        "--index",
+        dest="index",
+        default=None,
+        help="Comma separated list of columns of one (composite) index built once the "
+        "table is loaded. "
+        "Use with --load_table",
+    )
+    parser.add_argument(
+        "--nologging",
+        dest="nologging",
+        action="store_true",
+        help="Create the table NOLOGGING and load it with direct-path inserts. "
+        "Use with --load_table",
+    )
+    parser.add_argument(
+        "--gather-stats",
+        dest="gather_stats",
+        action="store_true",
+        help="Gather the table statistics once it is loaded. Use with --load_table",
+    )
+    parser.add_argument(
+        "--max-errors",
+        dest="max_errors",
+        type=int,
+        default=None,
+        help="Max number of rows rejected by the DB, they are written to "
+        "<filename without extensions>.bad. "
+        "Use with --load_table or --append_table",
     )
     parser.add_argument(
         "-s",
@@ -10,6 +10,7 @@ import shutil
 import stat
 import re
 import getpass
+import hashlib
 from multiprocessing import Process
 from easyaccess.version import __version__
 import easyaccess.config_ea as config_mod
@@ -22,6 +23,7 @@ from easyaccess.eautils.import_utils import Import
 from easyaccess.eautils.cli_utils import CommandActions
 from easyaccess.eautils.db_utils import DatabaseActions
 from easyaccess.eautils.des_utils import DesActions
+from easyaccess.eautils.meta_utils import MetadataCache
 from easyaccess.eautils.ea_utils import *
 import threading
 import time
@@ -136,6 +138,10 @@ Connected as {user} to {db}.
         self.outfile_max_mb = self.config.getint('easyaccess', 'outfile_max_mb')
         self.autocommit = self.config.getboolean('easyaccess', 'autocommit')
         self.compression = self.config.getboolean('easyaccess', 'compression')
+        self.manifest = self.config.getboolean('easyaccess', 'manifest')
+        self.readahead = self.config.getint('easyaccess', 'readahead')
+        self.schema_scan = self.config.getboolean('easyaccess', 'schema_scan')
+        self.metadata_ttl = self.config.getfloat('easyaccess', 'metadata_ttl')
         self.desdm_coldefs = self.config.getboolean('easyaccess', 'desdm_coldefs')
         self.trim_whitespace = self.config.getboolean('easyaccess', 'trim_whitespace')
         self.dbname = db
@@ -156,7 +162,7 @@ Connected as {user} to {db}.
         connected = False
         for tries in range(1):
             try:
-                self.con = cx_Oracle.connect(self.user, self.password, dsn=self.dsn)
+                self.con = self.open_connection()
                 if self.autocommit:
                     self.con.autocommit = True
                 connected = True
@@ -217,11 +223,32 @@ Connected as {user} to {db}.
                 os._exit(0)
         self.cur = self.con.cursor()
         self.cur.arraysize = int(self.prefetch)
+        self.metadata_cache = MetadataCache(self.dbname, self.user)
+        self.resolved_tables = {}
+        # guards resolved_tables and the switch of the metadata between threads
+        self.metadata_lock = threading.RLock()
+        self.metadata_thread = None
+        self.metadata_status = 'not loaded'
+        self.set_metadata([], [], [])
         msg = self.last_pass_changed()
         if msg and not self.quiet:
             print(msg)
         self.set_messages()
 
+    def open_connection(self):
+        """
+        Open the session to the DB used by the interpreter
+        """
+        return cx_Oracle.connect(self.user, self.password, dsn=self.dsn)
+
+    def new_connection(self):
+        """
+        Open a new session to the DB with the same credentials, e.g. for
+        worker threads. The interpreter connection is not affected.
+        """
+        con = cx_Oracle.connect(self.user, self.password, dsn=self.dsn, threaded=True)
+        return con
+
     def handler(self, signum, frame):
         """
         Executed with ^Z (Ctrl+Z) is pressed.
@@ -410,20 +437,25 @@ Connected as {user} to {db}.
         Initialization before prompting user for commands.
         Despite the claims in the Cmd documentation, Cmd.preloop() is not a stub.
         """
-        self.cache_table_names = []
-        self.cache_usernames = []
-        self.cache_column_names = []
+        self.set_metadata([], [], [])
         self.metadata = False
         cmd.Cmd.preloop(self)  # # sets up command completion
-        if self.refresh:
-            try:
-                self.do_refresh_metadata_cache('')
-                print()
-            except:
-                print(colored(
-                    "\n Couldn't load metadata into cache (try later), no"
-                    " autocompletion for tables, columns or users this time\n",
-                    "red", self.ct))
+        if self.refresh and self.metadata_cache.load():
+            # start with the metadata saved on disk, refresh it if too old
+            # the columns of each table are read when first searched
+            self.set_metadata(self.metadata_cache.tables, self.metadata_cache.users,
+                              self.metadata_cache.columns,
+                              load_columns=self.metadata_cache.load_columns)
+            self.resolved_tables.update(self.metadata_cache.resolved)
+            self.metadata_status = 'ready'
+            if self.metadata_cache.is_stale(self.metadata_ttl):
+                self.refresh_metadata_background()
+        elif self.refresh:
+            # first time, do not wait for it
+            print('Loading metadata into cache in the background, auto-completion of tables,'
+                  ' columns and users will be available when it finishes'
+                  ' (refresh_metadata_cache --status)\n')
+            self.refresh_metadata_background(incremental=False)
 
         # history
         ht = open(history_file, 'r')
@@ -648,13 +680,12 @@ Connected as {user} to {db}.
             line = '@ ' + line[1:]
             return complete_path(line)
         if line.upper().find('SELECT') > -1:
-            # return self._complete_colnames(text)
-            if line.upper().find('FROM') == -1:
-                return self._complete_colnames(text)
-            elif line.upper().find('FROM') > -1 and line.upper().find('WHERE') == -1:
+            # tables right after FROM or JOIN, columns anywhere else
+            keywords = re.findall(r'\b(SELECT|FROM|JOIN|WHERE|ON|USING|BY|HAVING)\b',
+                                  line[:begidx].upper())
+            if keywords and keywords[-1] in ('FROM', 'JOIN'):
                 return self._complete_tables(text)
-            else:
-                return self._complete_colnames(text)
+            return self._complete_query_columns(text, line)
         else:
             return self._complete_tables(text)
 
@@ -684,6 +715,33 @@ Connected as {user} to {db}.
             msg += ' command to get rid of this message\n'
             return msg
 
+    def print_data(self, data, header, extra="", err_arg='No rows selected'):
+        """
+        Print the rows of a query (DataFrame) with the 'extra' message above
+        them, or the header and 'err_arg' if there are none
+        """
+        if extra != "":
+            print(colored(extra + '\n', "cyan", self.ct))
+        if len(data) == 0:
+            fline = '   '
+            for col in header:
+                fline += '%s  ' % col
+            print(fline)
+            print(colored(err_arg, "red", self.ct))
+        elif 'COMMENTS' in data.columns:
+            try:
+                width = data['COMMENTS'].str.len().max()
+                if pd.isnull(width):
+                    width = 4
+                format_f = lambda s: '{: <{width}}'.format(s, width=int(width))
+                temp_col = format_f('COMMENTS')
+                data = data.rename(columns={'COMMENTS': temp_col})
+                print(data.to_string(formatters={temp_col: format_f}))
+            except:
+                pass
+        else:
+            print(data)
+
     def query_and_print(self, query, print_time=True,
                         err_arg='No rows selected', suc_arg='Done!', extra="",
                         clear=False, extra_func=None, return_df=False):
@@ -754,19 +812,11 @@ Connected as {user} to {db}.
                 if print_time:
                     print()
                 if len(data) == 0:
-                    fline = '   '
-                    for col in header:
-                        fline += '%s  ' % col
-                    if extra != "":
-                        print(colored(extra + '\n', "cyan", self.ct))
-                    print(fline)
-                    print(colored(err_arg, "red", self.ct))
+                    self.print_data(data, header, extra=extra, err_arg=err_arg)
                 else:
                     if extra_func is None:
                         data.columns = header
                     data.index += 1
-                    if extra != "":
-                        print(colored(extra + '\n', "cyan", self.ct))
                     # ADW: Oracle distinguishes between NaN and Null while
                     # pandas does not making this replacement confusing...
                     # try:
@@ -774,20 +824,10 @@ Connected as {user} to {db}.
                     # except:
                     # pass
                     if return_df:
+                        if extra != "":
+                            print(colored(extra + '\n', "cyan", self.ct))
                         return data
-                    if 'COMMENTS' in data.columns:
-                        try:
-                            width = data['COMMENTS'].str.len().max()
-                            if pd.isnull(width):
-                                width = 4
-                            format_f = lambda s: '{: <{width}}'.format(s, width=int(width))
-                            temp_col = format_f('COMMENTS')
-                            data.rename(columns={'COMMENTS': temp_col}, inplace=True)
-                            print(data.to_string(formatters={temp_col: format_f}))
-                        except:
-                            pass
-                    else:
-                        print(data)
+                    self.print_data(data, header, extra=extra, err_arg=err_arg)
             else:
                 t2 = time.time()
                 tt.cancel()
@@ -850,6 +890,10 @@ Connected as {user} to {db}.
                 mode_write = 'w'
                 header_out = True
                 com_it = 0
+                manifest = None
+                if self.manifest:
+                    manifest = eafile.ExportManifest(fileout, query=query,
+                                                     comp=self.compression)
                 while True:
                     data = pd.DataFrame(self.cur.fetchmany())
                     rowline = ' Rows : %d, Rows/sec: %d ' % (
@@ -890,7 +934,8 @@ Connected as {user} to {db}.
 
                         fileindex = eafile.write_file(fileout, data, info2, fileindex,
                                                       mode_write,
-                                                      max_mb=self.outfile_max_mb, query=query, comp=self.compression)
+                                                      max_mb=self.outfile_max_mb, query=query,
+                                                      comp=self.compression, manifest=manifest)
 
                         if first:
                             mode_write = 'a'
@@ -908,6 +953,10 @@ Connected as {user} to {db}.
                 if print_time:
                     print(colored('\n Written %d rows to %s in %.2f seconds and %d trips' % (
                         self.cur.rowcount, fileout, (t2 - t1), com_it - 1), "green", self.ct))
+                if manifest is not None and manifest.shards:
+                    manifest_file = manifest.write()
+                    if print_time:
+                        print(colored(' Manifest written to %s' % manifest_file, "green", self.ct))
                 if print_time:
                     print()
             else:
@@ -929,38 +978,120 @@ Connected as {user} to {db}.
         data = self.cur.fetchall()
         return data
 
-    def get_tables_names(self):
+    def get_tables_names(self, cursor=None):
 
         if self.dbname in dbnames:
             query = """
             select table_name from DES_ADMIN.CACHE_TABLES
             union select table_name from user_tables
             """
-        temp = self.cur.execute(query)
+        if cursor is None:
+            cursor = self.cur
+        temp = cursor.execute(query)
         tnames = pd.DataFrame(temp.fetchall())
         table_list = tnames.values.flatten().tolist()
         return table_list
 
 
-    def get_userlist(self):
+    def get_userlist(self, cursor=None):
         if self.dbname in ('dessci', 'desoper'):
             query = 'select distinct username from dba_users order by username'
         if self.dbname in ('destest'):
             query = 'select distinct username from dba_users order by username'
         if self.dbname in ('desdr'):
             return []
-        temp = self.cur.execute(query)
+        if cursor is None:
+            cursor = self.cur
+        temp = cursor.execute(query)
         tnames = pd.DataFrame(temp.fetchall())
         user_list = tnames.values.flatten().tolist()
         return user_list
 
-    def get_columnlist(self):
+    def get_columnlist(self, cursor=None):
         query = """SELECT column_name from DES_ADMIN.CACHE_COLUMNS"""
-        temp = self.cur.execute(query)
+        if cursor is None:
+            cursor = self.cur
+        temp = cursor.execute(query)
         cnames = pd.DataFrame(temp.fetchall())
         col_list = cnames.values.flatten().tolist()
         return col_list
 
+    def get_tables_columns(self, cursor=None):
+        """
+        Column names of the cached tables as a dictionary
+        'OWNER.TABLE' -> [columns]
+        """
+        if self.dbname not in dbnames:
+            return {}
+        query = """
+        SELECT t.owner || '.' || t.table_name, t.column_name
+        FROM all_tab_cols t, DES_ADMIN.CACHE_TABLES d
+        WHERE t.owner || '.' || t.table_name = d.table_name
+        ORDER BY t.owner, t.table_name, t.column_id
+        """
+        if cursor is None:
+            cursor = self.cur
+        cursor.execute(query)
+        columns_by_table = {}
+        for table, column in cursor.fetchall():
+            columns_by_table.setdefault(table, []).append(column)
+        return columns_by_table
+
+    def get_db_time(self, cursor=None):
+        """
+        Current DB time as 'YYYY-MM-DD HH24:MI:SS'
+        """
+        if cursor is None:
+            cursor = self.cur
+        cursor.execute("select to_char(sysdate, 'YYYY-MM-DD HH24:MI:SS') from dual")
+        return cursor.fetchone()[0]
+
+    def get_changed_columns(self, since, cursor=None):
+        """
+        Owner, table and column names of the tables and views created or
+        altered (last_ddl_time) after 'since', a DB time as
+        'YYYY-MM-DD HH24:MI:SS'
+        """
+        query = """
+        select c.owner, c.table_name, c.column_name from all_objects o, all_tab_columns c
+        where o.last_ddl_time > to_date(:since, 'YYYY-MM-DD HH24:MI:SS')
+        and o.object_type in ('TABLE', 'VIEW', 'MATERIALIZED VIEW')
+        and c.owner = o.owner and c.table_name = o.object_name
+        order by c.owner, c.table_name, c.column_id
+        """
+        if cursor is None:
+            cursor = self.cur
+        cursor.execute(query, since=since)
+        return cursor.fetchall()
+
+    def get_table_columns(self, table, cursor=None):
+        """
+        Column names of a table or view ('TABLE' or 'OWNER.TABLE'), also
+        through a synonym when there is no table with that name
+        """
+        if cursor is None:
+            cursor = self.cur
+        owner, name = table.split('.') if '.' in table else (None, table)
+        owner_clause = 'and owner = :owner' if owner else ''
+        params = {'name': name, 'owner': owner} if owner else {'name': name}
+        query = """
+        select column_name from all_tab_cols
+        where table_name = :name %s and hidden_column = 'NO'
+        order by column_id
+        """ % owner_clause
+        cursor.execute(query, params)
+        columns = [row[0] for row in cursor.fetchall()]
+        if columns:
+            return columns
+        query = """
+        select c.column_name from all_synonyms s, all_tab_cols c
+        where s.synonym_name = :name %s and c.owner = s.table_owner
+        and c.table_name = s.table_name and c.hidden_column = 'NO'
+        order by c.column_id
+        """ % owner_clause.replace('owner', 's.owner')
+        cursor.execute(query, params)
+        return [row[0] for row in cursor.fetchall()]
+
 
     def do_exit(self, line):
         """
@@ -970,6 +1101,10 @@ Connected as {user} to {db}.
             os.system('rm -f easy.buf')
         except:
             pass
+        if self.metadata_cache.timestamp is not None and \
+                self.resolved_tables != self.metadata_cache.resolved:
+            # keep the table names resolved in this session
+            self._save_metadata(self.metadata_cache.db_time)
         try:
             self.cur.close()
         except:
@@ -1010,6 +1145,14 @@ Connected as {user} to {db}.
             compression       : yes/no toggles compressed output files (bzip2 for h5, gzip for rest).
                                 default(no). It is slower but yields smaller files, fits doesn't support
                                 append on compressed files, workaround is to increase prefetch
+            manifest          : yes/no toggles writing a JSON manifest with the files, row ranges
+                                and checksums of each output (default yes)
+            readahead         : Number of chunks read and converted ahead while the current one
+                                is inserted by load_table/append_table, 0 to disable (default 1)
+            schema_scan       : yes/no toggles scanning the whole file for the column types
+                                before uploading it by chunks (default yes)
+            metadata_ttl      : Hours before the metadata for auto-completion saved on disk is
+                                refreshed in the background at startup (default 24)
             autocommit        : yes/no toggles the autocommit for DB changes (default is yes)
             trim_whitespace   : Trim whitespace from strings when uploading data to the DB
                                 (default yes)
@@ -1060,7 +1203,7 @@ Connected as {user} to {db}.
             for section in (self.config.sections()):
                 if self.config.has_option(section, key):
                     if key in ['loading_bar', 'color_terminal', 'autocommit', 'trim_whitespace',
-                               'desdm_coldefs', 'compression']:
+                               'desdm_coldefs', 'compression', 'manifest', 'schema_scan']:
                         val = val.lower()
                         temp = True if val in positive else False if val in negative else 'error'
                         if temp == 'error':
@@ -1101,6 +1244,14 @@ Connected as {user} to {db}.
                 self.outfile_max_mb = self.config.getint('easyaccess', 'outfile_max_mb')
             if key == 'compression':
                 self.compression = self.config.getboolean('easyaccess', 'compression')
+            if key == 'manifest':
+                self.manifest = self.config.getboolean('easyaccess', 'manifest')
+            if key == 'readahead':
+                self.readahead = self.config.getint('easyaccess', 'readahead')
+            if key == 'schema_scan':
+                self.schema_scan = self.config.getboolean('easyaccess', 'schema_scan')
+            if key == 'metadata_ttl':
+                self.metadata_ttl = self.config.getfloat('easyaccess', 'metadata_ttl')
             if key == 'autocommit':
                 self.autocommit = self.config.getboolean('easyaccess', 'autocommit')
             if key == 'trim_whitespace':
@@ -1119,6 +1270,13 @@ Connected as {user} to {db}.
         exists = self.cur.fetchall()[0][0]
         return exists
 
+    def count_rows(self, table):
+        """
+        Number of rows in a table
+        """
+        self.cur.execute('select count(*) from %s' % table.upper())
+        return self.cur.fetchall()[0][0]
+
     def load_data(self, filename):
         """Load data from a file into a pandas.DataFrame or
         fitsio.FITS object. We return the object itself, since it
@@ -1179,18 +1337,20 @@ Connected as {user} to {db}.
         except cx_Oracle.DatabaseError:
             print(colored(
                 "\n Couldn't drop '%s' (doesn't exist)." % (table.upper()), 'red', self.ct))
+        self.forget_table(table)
         if self.autocommit:
             self.con.commit()
 
-    def create_table(self, table, columns, dtypes):
+    def create_table(self, table, columns, dtypes, nologging=False):
         """
         Create a DB table from a list of columns and numpy dtypes.
 
         Parameters:
         ----------
-        table   : Name of the Oracle table to create
-        columns : List of column names
-        dtypes  : List of numpy dtypes
+        table     : Name of the Oracle table to create
+        columns   : List of column names
+        dtypes    : List of numpy dtypes
+        nologging : Create the table NOLOGGING (no redo for direct-path inserts)
 
         Returns:
         --------
@@ -1198,10 +1358,110 @@ Connected as {user} to {db}.
         """
         qtable = 'create table %s ' % table
         qtable += self.new_table_columns(columns, dtypes)
+        if nologging:
+            qtable += ' nologging'
         self.cur.execute(qtable)
+        self.forget_table(table)
         if self.autocommit:
             self.con.commit()
 
+    def create_index(self, table, columns):
+        """
+        Create an index on the columns of a table (a composite one if there
+        are several), built in parallel and without redo.
+
+        Parameters:
+        ----------
+        table   : Name of the table
+        columns : List of column names
+
+        Returns:
+        --------
+        name : Name of the index
+        """
+        # Oracle names are limited to 30 characters: the truncated name is
+        # made unique with a hash of the table and columns
+        full = ('%s_%s' % (table, '_'.join(columns))).upper()
+        digest = hashlib.md5(full.encode('utf-8')).hexdigest()[:4].upper()
+        name = '%s_%s_IDX' % (full[:21], digest)
+        self.cur.execute('create index %s on %s (%s) nologging parallel' % (
+            name, table.upper(), ','.join(columns)))
+        self.cur.execute('alter index %s noparallel' % name)
+        return name
+
+    def gather_stats(self, table):
+        """
+        Gather the optimizer statistics of a table of the user.
+        """
+        self.cur.execute("begin dbms_stats.gather_table_stats(ownname => user, "
+                         "tabname => :tab, degree => dbms_stats.auto_degree); end;",
+                         tab=table.upper())
+
+    def insert_query(self, table, columns, dtypes, direct=False):
+        """
+        Create the SQL statement to insert rows into a DB table. Trailing
+        whitespace is removed from string columns if 'trim_whitespace' is set.
+
+        Parameters:
+        -----------
+        table   : Name of the table to insert into
+        columns : List of column names.
+        dtypes  : List of numpy dtypes
+        direct  : Direct-path insert (APPEND_VALUES hint). The rows must be
+                  committed before the table is used again in the session.
+
+        Returns:
+        --------
+        qinsert : SQL statement with one bind variable per column
+        """
+        cols = ','.join(columns)
+        vals = ','.join(self.bind_values(columns, dtypes))
+
+        hint = '/*+ APPEND_VALUES */ ' if direct else ''
+        qinsert = 'insert %sinto %s (%s) values (%s)' % (
+            hint, table.upper(), cols, vals)
+        return qinsert
+
+    def merge_query(self, table, columns, dtypes, key):
+        """
+        Create the SQL statement to insert only the rows whose key is not
+        in the table yet, so the same rows can be appended more than once.
+
+        Parameters:
+        -----------
+        table   : Name of the table to insert into
+        columns : List of column names.
+        dtypes  : List of numpy dtypes
+        key     : List of the columns identifying a row
+
+        Returns:
+        --------
+        qmerge : SQL statement with one bind variable per column
+        """
+        source = ','.join('%s %s' % (val, column) for val, column in
+                          zip(self.bind_values(columns, dtypes), columns))
+        on = ' and '.join('t.%s = s.%s' % (k, k) for k in key)
+        cols = ','.join(columns)
+        vals = ','.join('s.%s' % column for column in columns)
+
+        qmerge = ('merge into %s t using (select %s from dual) s on (%s) '
+                  'when not matched then insert (%s) values (%s)' % (
+                      table.upper(), source, on, cols, vals))
+        return qmerge
+
+    def bind_values(self, columns, dtypes):
+        """
+        Bind variables for the columns of an insert. Trailing whitespace is
+        removed from string columns if 'trim_whitespace' is set.
+        """
+        cvals = []
+        for column, dtype in zip(columns, dtypes):
+            if dtype.kind == 'S' and self.trim_whitespace:
+                cvals.append('TRIM(TRAILING FROM :%s)' % column)
+            else:
+                cvals.append(':%s' % column)
+        return cvals
+
     def insert_data(self, table, columns, values, dtypes=None, niter=0):
         """Insert data into a DB table.
 
@@ -1223,25 +1483,92 @@ Connected as {user} to {db}.
         if dtypes is None:
             len(columns) * [None]
 
-        # Remove trailing whitespace from string values
-        cvals = []
-        for column, dtype in zip(columns, dtypes):
-            if dtype.kind == 'S' and self.trim_whitespace:
-                cvals.append('TRIM(TRAILING FROM :%s)' % column)
-            else:
-                cvals.append(':%s' % column)
+        qinsert = self.insert_query(table, columns, dtypes)
+        self.execute_insert(table, columns, qinsert, values, niter=niter)
 
-        cols = ','.join(columns)
-        vals = ','.join(cvals)
+    def insert_arrays(self, table, columns, arrays, dtypes=None, niter=0, cursor=None,
+                      rows=None, key=None, direct=False, errors=None):
+        """Insert numpy column arrays into a DB table.
+
+        Each column is converted to python values in a single call and
+        the bind variables are declared up front with `setinputsizes`,
+        so the whole chunk is sent as one array DML operation without
+        cx_Oracle inspecting each row. cx_Oracle still needs one tuple
+        per row, they are made by zipping the converted columns (not
+        from `df.values.tolist()`), one chunk at a time.
+
+        Parameters:
+        -----------
+        table   : Name of the table to insert into
+        columns : List of column names.
+        arrays  : List of numpy arrays, one per column
+        dtypes  : List of numpy dtypes (default: dtypes of the arrays)
+        cursor  : Cursor from another session to insert with (default: the
+                  interpreter cursor). Nothing is committed or printed
+                  when given.
+        rows    : Rows already converted from the arrays (see eafile.Chunk.prepare)
+        key     : List of key columns. Rows with a key already in the table
+                  are skipped (see merge_query). Keys can not be null
+        direct  : Direct-path insert (see insert_query)
+        errors  : List where the errors of the rejected rows are added (see
+                  execute_insert). By default any bad row fails the insert
 
-        qinsert = 'insert into %s (%s) values (%s)' % (
-            table.upper(), cols, vals)
+        Returns:
+        --------
+        Time spent inserting the rows in seconds
+        """
+        if dtypes is None:
+            dtypes = [array.dtype for array in arrays]
+
+        if key:
+            upper = [column.upper() for column in columns]
+            for name in key:
+                if name.upper() not in upper:
+                    raise ValueError('Key column %s is not in the file' % name.upper())
+                if eafile.has_nulls(arrays[upper.index(name.upper())]):
+                    # NULL never matches in the ON clause of the merge, those
+                    # rows would be inserted again on every append
+                    raise ValueError('Key column %s has null values' % name.upper())
+            qinsert = self.merge_query(table, columns, dtypes, key)
+        else:
+            qinsert = self.insert_query(table, columns, dtypes, direct=direct)
+        sizes = [eafile.bind_size(array) for array in arrays]
+        if rows is None:
+            rows = list(zip(*[eafile.column_values(array) for array in arrays]))
+        return self.execute_insert(table, columns, qinsert, rows, sizes, niter=niter,
+                                   cursor=cursor, errors=errors)
+
+    def execute_insert(self, table, columns, qinsert, rows, sizes=None, niter=0, cursor=None,
+                       errors=None):
+        """
+        Run an insert statement for all the rows with `executemany`.
+        Returns the time spent in the DB.
+
+        If 'errors' is a list, the rows are inserted in batch error mode:
+        the good rows are inserted and the errors of the rejected ones
+        (cx_Oracle error objects with the 'offset' of the row) are added
+        to the list instead of failing the whole insert. The rows are then
+        not committed here ('autocommit'), the caller commits them once it
+        has checked that there are not too many rejected rows.
+        """
         self.msg = ''
+        main_session = cursor is None
+        if cursor is None:
+            cursor = self.cur
         try:
             t1 = time.time()
-            self.cur.executemany(qinsert, values)
+            if sizes is not None:
+                cursor.setinputsizes(*sizes)
+            rejected = 0
+            if errors is not None:
+                cursor.executemany(qinsert, rows, batcherrors=True)
+                batch_errors = cursor.getbatcherrors()
+                rejected = len(batch_errors)
+                errors.extend(batch_errors)
+            else:
+                cursor.executemany(qinsert, rows)
             t2 = time.time()
-            if self.autocommit:
+            if self.autocommit and main_session and errors is None:
                 self.con.commit()
         except cx_Oracle.DatabaseError as e:
             if self.desdm_coldefs:
@@ -1250,9 +1577,15 @@ Connected as {user} to {db}.
                 self.msg += " DESDB ~> config desdm_coldefs set no"
             raise cx_Oracle.DatabaseError(self.msg)
 
-        print(colored(
-            '\n [Iter: %d] Inserted %d rows and %d columns into table %s in %.2f seconds' % (
-                niter + 1, len(values), len(columns), table.upper(), t2 - t1), "green", self.ct))
+        if main_session:
+            print(colored(
+                '\n [Iter: %d] Inserted %d rows and %d columns into table %s in %.2f seconds' % (
+                    niter + 1, len(rows) - rejected, len(columns), table.upper(), t2 - t1),
+                "green", self.ct))
+            if rejected:
+                print(colored(' [Iter: %d] %d rows rejected' % (niter + 1, rejected),
+                              "red", self.ct))
+        return t2 - t1
 
 
 def initial_message(quiet=False, clear=True):
@@ -1327,6 +1660,20 @@ def cli():
             linein += ' --chunksize ' + str(args.chunksize)
         if args.memsize is not None:
             linein += ' --memsize ' + str(args.memsize)
+        if args.workers is not None:
+            linein += ' --workers ' + str(args.workers)
+        if args.columns is not None:
+            linein += ' --columns ' + args.columns
+        if args.resume:
+            linein += ' --resume'
+        if args.index is not None:
+            linein += ' --index ' + args.index
+        if args.nologging:
+            linein += ' --nologging'
+        if args.gather_stats:
+            linein += ' --gather-stats'
+        if args.max_errors is not None:
+            linein += ' --max-errors ' + str(args.max_errors)
         cmdinterp.onecmd(linein)
     elif args.appendtable is not None:
         cmdinterp = easy_or(conf, desconf, db, interactive=False,
@@ -1338,6 +1685,16 @@ def cli():
             linein += ' --chunksize ' + str(args.chunksize)
         if args.memsize is not None:
             linein += ' --memsize ' + str(args.memsize)
+        if args.workers is not None:
+            linein += ' --workers ' + str(args.workers)
+        if args.columns is not None:
+            linein += ' --columns ' + args.columns
+        if args.resume:
+            linein += ' --resume'
+        if args.key is not None:
+            linein += ' --key ' + args.key
+        if args.max_errors is not None:
+            linein += ' --max-errors ' + str(args.max_errors)
         cmdinterp.onecmd(linein)
     else:
         initial_message(args.quiet, clear=True)
@@ -1,3 +1,4 @@
 __all__ = ["db_api", "des_logo", "dircache", "dtypes",
            "fileio", "fun_utils", "import_utils", "ea_utils",
-           "cli_utils", "db_utils", "python_api", "des_utils"]
+           "cli_utils", "db_utils", "python_api", "des_utils", "load_utils",
+           "meta_utils"]
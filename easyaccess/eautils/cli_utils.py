@@ -4,6 +4,7 @@ from easyaccess.version import __version__
 import os
 import sys
 import webbrowser
+from easyaccess.eautils.meta_utils import PrefixIndex, query_tables
 
 try:
     from builtins import input, str, range
@@ -136,18 +137,58 @@ class CommandActions(object):
         del tut
 
     def _complete_tables(self, text):
-            options_tables = self.cache_table_names
-            if text:
-                return [option for option in options_tables if option.startswith(text.upper())]
-            else:
-                return options_tables
+        return self.table_index.complete(text.upper())
 
     def _complete_colnames(self, text):
-        options_colnames = self.cache_column_names
-        if text:
-            return [option for option in options_colnames if option.startswith(text.upper())]
-        else:
-            return options_colnames
+        return self.column_index.complete(text.upper())
+
+    def _complete_query_columns(self, text, line):
+        """
+        Complete only the columns of the tables in the FROM clause of the
+        line, 'alias.col' if text starts with an alias (or table name).
+        Falls back to all the column names when no table is found.
+        """
+        tables = query_tables(line)
+        if '.' in text:
+            alias, prefix = text.rsplit('.', 1)
+            table = tables.get(alias.upper())
+            if table is None:
+                return []
+            columns = self._table_columns(table)
+            if columns is None:
+                return []
+            return [alias + '.' + col for col in columns.complete(prefix.upper())]
+        completions = set()
+        for table in set(tables.values()):
+            columns = self._table_columns(table)
+            if columns is not None:
+                completions.update(columns.complete(text.upper()))
+        if not completions:
+            return self._complete_colnames(text)
+        return sorted(completions)
+
+    def _table_columns(self, table):
+        """
+        Prefix index of the columns of a table, read from the DB the first
+        time and kept in a LRU cache by the resolved (schema, table, link),
+        so the names of a table through synonyms share it. None if there
+        are none or they can not be read.
+        """
+        try:
+            key = self.get_tablename_tuple(table)
+        except Exception:
+            return None
+        columns = self.table_columns.get(key)
+        if columns is None:
+            # tables through a DB link are only known once described
+            if key[2]:
+                return None
+            try:
+                columns = PrefixIndex(self.get_table_columns('%s.%s' % key[:2]))
+            except Exception:
+                return None
+            self.table_columns.put(key, columns)
+        return columns if len(columns) else None
 
     def complete_prefetch(self, text, line, start_index, end_index):
         if text:
@@ -1,6 +1,23 @@
 from easyaccess.eautils.ea_utils import *
+from easyaccess.eautils.load_utils import UploadProgress, InsertWorkers, ReadAhead, LoadJournal
+from easyaccess.eautils.load_utils import ChunkTuner, chunks_in_memory, parse_chunksize
+from easyaccess.eautils.load_utils import column_list
+from easyaccess.eautils.load_utils import RejectFile, FileReport
+from easyaccess.eautils.meta_utils import PrefixIndex, MetadataSnapshot, like_regex, search_names
+from easyaccess.eautils.meta_utils import sql_search
 import os
+import re
 import stat
+import threading
+import time
+import json
+from collections import OrderedDict
+import pandas as pd
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 try:
     from builtins import input, str, range
@@ -19,6 +36,17 @@ except ImportError:
     readline_present = False
 
 class DatabaseActions(object):
+    # auto-completion metadata, all of it replaced at once by set_metadata
+    table_index = property(lambda self: self.metadata_snapshot.table_index)
+    user_index = property(lambda self: self.metadata_snapshot.user_index)
+    column_index = property(lambda self: self.metadata_snapshot.column_index)
+    cache_table_names = property(lambda self: self.metadata_snapshot.table_index.names)
+    cache_usernames = property(lambda self: self.metadata_snapshot.user_index.names)
+    cache_column_names = property(lambda self: self.metadata_snapshot.column_index.names)
+    columns_by_table = property(lambda self: self.metadata_snapshot.columns_by_table)
+    table_columns = property(lambda self: self.metadata_snapshot.table_columns)
+    table_descriptions = property(lambda self: self.metadata_snapshot.table_descriptions)
+
     def do_execproc(self, line):
         """
         DB:Execute procedures in the DB, arguments can be floating numbers or strings
@@ -85,122 +113,329 @@ class DatabaseActions(object):
         tablename = tablename.upper()
         pattern = None
         try:
-            extra = arg.split()[1]
-            if extra.upper() == 'WITH':
+            if arg.split()[1].upper() == 'WITH':
                 pattern = arg.split()[2].upper()
         except:
             pass
 
         try:
-            schema, table, link = self.get_tablename_tuple(tablename)
-            # schema, table and link are now valid.
-            link = "@" + link if link else ""
-            qcom = """
-            select comments from all_tab_comments%s atc
-            where atc.table_name = '%s'""" % (link, table)
-            comment_table = self.query_results(qcom)[0][0]
+            description = self.describe(tablename)
         except:
-            try:
-                schema, table, link = self.get_tablename_tuple(tablename)
-                # schema, table and link are now valid.
-                link = "@" + link if link else ""
-                qcom = """
-                select comments from all_mview_comments%s atc
-                where atc.mview_name = '%s'""" % (link, table)
-                comment_table = self.query_results(qcom)[0][0]
-            except:
-                comment_table = ''
-                print(colored("Table not found.", "red", self.ct))
-                return
-
-        try:
-            qnum = """
-            select to_char(num_rows) from all_tables where
-            table_name='%s' and  owner = '%s' """ % (table, schema)
-            numrows_table = self.query_results(qnum)[0][0]
-            if numrows_table is None:
-                numrows_table = 'Not available'
-        except:
-            numrows_table = "Not available"
+            print(colored("Table not found.", "red", self.ct))
+            return
 
         # String formatting parameters
-        params = dict(schema=schema, table=table, link=link,
-                      pattern=pattern, comment=comment_table)
-
+        params = dict(table=description['table'], pattern=pattern,
+                      comment=description['comment'])
+        data = description['columns']
         if pattern:
-            comm = """Description of %(table)s with """
-            comm += """pattern %(pattern)s commented as: '%(comment)s'""" % params
-            comm += "\nEstimated number of rows:" + colored(" %s" % numrows_table, "green", self.ct)
-            q = """
-            select atc.column_name, atc.data_type,
-            case atc.data_type
-            when 'NUMBER' then '(' || atc.data_precision || ',' || atc.data_scale || ')'
-            when 'VARCHAR2' then atc.CHAR_LENGTH || ' characters'
-            else atc.data_length || ''  end as DATA_FORMAT,
-            acc.comments
-            from all_tab_cols%(link)s atc , all_col_comments%(link)s acc
-            where atc.owner = '%(schema)s' and atc.table_name = '%(table)s'
-            and acc.owner = '%(schema)s' and acc.table_name = '%(table)s'
-            and acc.column_name = atc.column_name
-            and atc.column_name like '%(pattern)s'
-            order by atc.column_name
-            """ % params
+            comm = """Description of %(table)s with """ \
+                   """pattern %(pattern)s commented as: '%(comment)s'""" % params
+            data = data[data['COLUMN_NAME'].str.match(like_regex(pattern))]
         else:
             comm = """Description of %(table)s commented as: '%(comment)s'""" % params
-            comm += "\nEstimated number of rows:" + colored(" %s" % numrows_table, "green", self.ct)
-            q = """
-            select atc.column_name, atc.data_type,
-            case atc.data_type
-            when 'NUMBER' then '(' || atc.data_precision || ',' || atc.data_scale || ')'
-            when 'VARCHAR2' then atc.CHAR_LENGTH || ' characters'
-            else atc.data_length || ''  end as DATA_FORMAT,
-            acc.comments
-            from all_tab_cols%(link)s atc , all_col_comments%(link)s acc
-            where atc.owner = '%(schema)s' and atc.table_name = '%(table)s'
-            and acc.owner = '%(schema)s' and acc.table_name = '%(table)s'
-            and acc.column_name = atc.column_name
-            order by atc.column_name
-            """ % params
+        comm += "\nEstimated number of rows:" + colored(" %s" % description['num_rows'],
+                                                        "green", self.ct)
+        data = data.reset_index(drop=True)
+        data.index += 1
 
         if extra is None:
             extra = comm
-        err_msg = 'Table does not exist or it is not accessible by user or pattern do not match'
-        df = self.query_and_print(q, print_time=False,
-                                  err_arg=err_msg, extra=extra, clear=clear, return_df=return_df)
+        if clear:
+            self.do_clear(None)
+        print()
+        if len(data) == 0:
+            err_msg = 'Table does not exist or it is not accessible by user or pattern do not match'
+            self.print_data(data, data.columns, extra=extra, err_arg=err_msg)
+            print()
+            return
         if return_df:
-            return df
+            if extra != "":
+                print(colored(extra + '\n', "cyan", self.ct))
+            return data
+        self.print_data(data, data.columns, extra=extra)
+        print()
         return
 
+    def describe(self, tablename):
+        """
+        Description of a table: its comment, estimated number of rows and
+        columns (COLUMN_NAME, DATA_TYPE, DATA_FORMAT, COMMENTS), read in a
+        single query and cached until the next metadata refresh.
+        """
+        schema, table, link = self.get_tablename_tuple(tablename)
+        description = self.table_descriptions.get((schema, table, link))
+        if description is not None:
+            return description
+        # schema, table and link are now valid.
+        params = dict(link="@" + link if link else "")
+        q = """
+        select atc.column_name, atc.data_type,
+        case atc.data_type
+        when 'NUMBER' then '(' || atc.data_precision || ',' || atc.data_scale || ')'
+        when 'VARCHAR2' then atc.CHAR_LENGTH || ' characters'
+        else atc.data_length || ''  end as DATA_FORMAT,
+        acc.comments,
+        nvl((select comments from all_tab_comments%(link)s
+             where owner = :schema and table_name = :tname),
+            (select comments from all_mview_comments%(link)s
+             where owner = :schema and mview_name = :tname)) as TABLE_COMMENT,
+        (select to_char(num_rows) from all_tables%(link)s
+         where owner = :schema and table_name = :tname) as NUM_ROWS
+        from all_tab_cols%(link)s atc , all_col_comments%(link)s acc
+        where atc.owner = :schema and atc.table_name = :tname
+        and acc.owner = :schema and acc.table_name = :tname
+        and acc.column_name = atc.column_name and atc.hidden_column = 'NO'
+        order by atc.column_name
+        """ % params
+        self.cur.execute(q, schema=schema, tname=table)
+        rows = self.cur.fetchall()
+        if not rows:
+            raise Exception("No table found for: %s" % tablename)
+        columns = pd.DataFrame([row[:4] for row in rows],
+                               columns=['COLUMN_NAME', 'DATA_TYPE', 'DATA_FORMAT', 'COMMENTS'])
+        description = dict(table=table, comment=rows[0][4] or '',
+                           num_rows=rows[0][5] or 'Not available', columns=columns)
+        self.table_descriptions.put((schema, table, link), description)
+        # also used to complete the columns of this table
+        self.table_columns.put((schema, table, link), PrefixIndex(columns['COLUMN_NAME']))
+        return description
+
+    def forget_table(self, table):
+        """
+        Drop what is cached about a table of the user (its description,
+        columns and resolved name), e.g. once it is created, dropped or
+        loaded.
+        """
+        table = table.upper()
+        key = (self.user.upper(), table, '')
+        self.table_descriptions.pop(key)
+        self.table_columns.pop(key)
+        with self.metadata_lock:
+            self.resolved_tables.pop(table, None)
+            self.resolved_tables.pop('%s.%s' % key[:2], None)
+
     def complete_describe_table(self, text, line, start_index, end_index):
         return self._complete_tables(text)
 
+    def do_describe_tables(self, arg):
+        """
+        DB:Describes all the tables matching an oracle pattern (e.g. Y6A2_%)
+        at once, their columns with types and comments. The tables are
+        the ones in own schema or reached by a synonym, use OWNER.PATTERN
+        for the tables of other schema.
+
+        Usage: describe_tables <pattern>               # summary of the tables found
+               describe_tables <pattern> > schema.json # write the schemas to a file
+
+        The output file can be .json (tables with their columns) or .csv
+        (one row per column)
+        """
+        if arg == '':
+            return self.do_help('describe_tables')
+        arg = arg.replace(';', '')
+        outputfile = None
+        if arg.find('>') > -1:
+            arg, outputfile = [part.strip() for part in arg.split('>', 1)]
+        if arg == '':
+            return self.do_help('describe_tables')
+        pattern = arg.split()[0]
+        if outputfile is not None:
+            ext = os.path.splitext(outputfile)[1].lower()
+            if ext not in ('.json', '.csv'):
+                print(colored('Output file must be .json or .csv', 'red', self.ct))
+                return
+        try:
+            schemas = self.get_schemas(pattern)
+        except:
+            print_exception(mode=self.ct)
+            return
+        if not schemas:
+            print(colored('No tables found for: %s' % pattern.upper(), 'red', self.ct))
+            return
+        if outputfile is None:
+            summary = pd.DataFrame(
+                [(schema['owner'], name, len(schema['columns']), schema['comment'])
+                 for name, schema in schemas.items()],
+                columns=['OWNER', 'TABLE_NAME', 'COLUMNS', 'COMMENTS'])
+            summary.index += 1
+            self.print_data(summary, summary.columns)
+            print(colored('\n%d tables, to write their schemas use: describe_tables %s > schema.json'
+                          % (len(schemas), pattern), 'green', self.ct))
+            return
+        try:
+            if ext == '.json':
+                with open(outputfile, 'w') as fout:
+                    json.dump(schemas, fout, indent=1)
+            else:
+                rows = [(name, schema['owner'], col['column_name'], col['data_type'],
+                         col['data_format'], col['comments'])
+                        for name, schema in schemas.items() for col in schema['columns']]
+                pd.DataFrame(rows, columns=['TABLE_NAME', 'OWNER', 'COLUMN_NAME', 'DATA_TYPE',
+                                            'DATA_FORMAT', 'COMMENTS']).to_csv(outputfile,
+                                                                               index=False)
+        except:
+            print_exception(mode=self.ct)
+            return
+        print(colored('%d tables written to %s' % (len(schemas), outputfile), 'green', self.ct))
+
+    def complete_describe_tables(self, text, line, start_index, end_index):
+        if line.find('>') > -1:
+            return complete_path(line[line.find('>'):])
+        return self._complete_tables(text)
+
+    def get_schemas(self, pattern):
+        """
+        Columns (name, type, format and comments) of all the tables matching
+        an oracle pattern ('%' or '*' for any string), in one query.
+
+        Parameters:
+        -----------
+        pattern : Table name pattern, OWNER.PATTERN for the tables of a schema,
+                  otherwise own tables and synonyms, resolved as in
+                  get_tablename_tuple (own tables first, then own synonyms and
+                  the public ones not shadowed by them, following chains of
+                  synonyms up to the closest table; not through DB links)
+
+        Returns:
+        --------
+        An OrderedDict of table name -> dict(owner, comment, columns), columns
+        being a list of dicts (column_name, data_type, data_format, comments)
+        """
+        pattern = pattern.upper().replace('*', '%')
+        if '.' in pattern:
+            owner, pattern = pattern.split('.', 1)
+            tables = """
+            select OWNER, TABLE_NAME, TABLE_NAME NAME from ALL_TAB_COMMENTS
+            where OWNER = :owner and TABLE_NAME like :pattern
+            """
+            params = dict(owner=owner, pattern=pattern)
+        else:
+            # one table per name: the own table or the closest one in the
+            # chain of synonyms
+            tables = """
+            select OWNER, TABLE_NAME, NAME from (
+              select s.*, row_number() over (partition by NAME order by LVL) RN
+              from (select user OWNER, TABLE_NAME, TABLE_NAME NAME, 0 LVL
+                    from USER_TAB_COMMENTS where TABLE_NAME like :pattern
+                    union all
+                    select TABLE_OWNER, TABLE_NAME, connect_by_root SYNONYM_NAME, level
+                    from (select SYNONYM_NAME, TABLE_OWNER, TABLE_NAME from USER_SYNONYMS
+                          where DB_LINK is null
+                          union all
+                          select SYNONYM_NAME, TABLE_OWNER, TABLE_NAME from ALL_SYNONYMS p
+                          where OWNER = 'PUBLIC' and DB_LINK is null and not exists (
+                              select 1 from USER_SYNONYMS u
+                              where u.SYNONYM_NAME = p.SYNONYM_NAME))
+                    start with SYNONYM_NAME like :pattern
+                    connect by nocycle SYNONYM_NAME = prior TABLE_NAME) s
+              where exists (select 1 from ALL_TAB_COMMENTS c
+                            where c.OWNER = s.OWNER and c.TABLE_NAME = s.TABLE_NAME))
+            where RN = 1
+            """
+            params = dict(pattern=pattern)
+        q = """
+        select t.NAME, t.OWNER, tc.COMMENTS, atc.column_name, atc.data_type,
+        case atc.data_type
+        when 'NUMBER' then '(' || atc.data_precision || ',' || atc.data_scale || ')'
+        when 'VARCHAR2' then atc.CHAR_LENGTH || ' characters'
+        else atc.data_length || ''  end as DATA_FORMAT,
+        acc.comments
+        from (%s) t, all_tab_cols atc, all_col_comments acc, all_tab_comments tc
+        where atc.owner = t.OWNER and atc.table_name = t.TABLE_NAME
+        and acc.owner = atc.owner and acc.table_name = atc.table_name
+        and acc.column_name = atc.column_name and atc.hidden_column = 'NO'
+        and tc.owner(+) = t.OWNER and tc.table_name(+) = t.TABLE_NAME
+        order by t.NAME, atc.column_id
+        """ % tables
+        self.cur.execute(q, params)
+        schemas = OrderedDict()
+        for name, owner, comment, column, dtype, dformat, comments in self.cur.fetchall():
+            schema = schemas.setdefault(name, dict(owner=owner, comment=comment or '',
+                                                   columns=[]))
+            schema['columns'].append(dict(column_name=column, data_type=dtype,
+                                          data_format=dformat, comments=comments))
+        return schemas
+
     def do_find_tables(self, arg, extra=None, return_df=False):
         """
         DB:Lists tables and views matching an oracle pattern  e.g %SVA%,
+        a regular expression e.g. ^Y6A2_.*MOF or a name, best matches first
+        (the closest names if there is no table with it).
+
+        The tables are searched in the auto-completion metadata, the DB is
+        queried (the same matches, but no closest names) when it is older
+        than the metadata_ttl config option or with --server
 
-        Usage : find_tables PATTERN
+        Usage : find_tables PATTERN [--server]
         """
         if extra is None:
             extra = 'To select from a table use owner.table_name' \
                     ' except for DESADMIN where only table_name is enough'
+        arg = arg.replace(';', '')
+        server = '--server' in arg.split()
+        arg = ' '.join(word for word in arg.split() if word != '--server')
         if arg == '':
             return self.do_help('find_tables')
-        arg = arg.replace(';', '')
-        query = "SELECT owner,table_name from all_tables  WHERE upper(table_name) LIKE '%s' " % (
-            arg.upper())
+        if not server and self.metadata_is_fresh():
+            rows = [name.split('.', 1) if '.' in name else (self.user.upper(), name)
+                    for name in search_names(self.cache_table_names, arg)]
+            data = pd.DataFrame(rows, columns=['OWNER', 'TABLE_NAME'])
+            return self.print_found(data, extra=extra, return_df=return_df)
+        condition, order = sql_search('table_name', arg)
+        query = "SELECT owner,table_name from all_tables WHERE %s ORDER BY %s, owner" % (
+            condition, order)
         df = self.query_and_print(query, extra=extra, return_df=return_df)
         if return_df:
             return df
 
+    def metadata_is_fresh(self):
+        """
+        True if the auto-completion metadata was read from the DB less than
+        metadata_ttl hours ago, so it can be searched instead of the DB
+        """
+        return self.metadata_cache.timestamp is not None and \
+            not self.metadata_cache.is_stale(self.metadata_ttl) and \
+            len(self.cache_table_names) > 0
+
+    def print_found(self, data, extra="", err_arg='No rows selected', return_df=False):
+        """
+        Print (or return) the names found in the local metadata like the
+        results of a query
+        """
+        print()
+        data.index += 1
+        if len(data) == 0:
+            self.print_data(data, data.columns, extra=extra, err_arg=err_arg)
+            print(colored('\nSearched the metadata cache (updated %.1f hours ago),'
+                          ' use --server to search the DB' % (self.metadata_cache.age() / 3600.),
+                          "yellow", self.ct))
+            print()
+            return
+        if return_df:
+            if extra != "":
+                print(colored(extra + '\n', "cyan", self.ct))
+            return data
+        self.print_data(data, data.columns, extra=extra)
+        print(colored('\n%d rows from the metadata cache (updated %.1f hours ago)'
+                      % (len(data), self.metadata_cache.age() / 3600.), "green", self.ct))
+        print()
+
     def complete_find_tables(self, text, line, start_index, end_index):
         return self._complete_tables(text)
 
 
-    def do_load_table(self, line, name=None, chunksize=None, memsize=None):
+    def do_load_table(self, line, name=None, chunksize=None, memsize=None, workers=None,
+                      columns=None, resume=False, index=None, nologging=False,
+                      gather_stats=False, max_errors=None):
         """
         DB:Loads a table from a file (csv or fits) taking name from filename and columns from header
 
-        Usage: load_table <filename> [--tablename NAME] [--chunksize CHUNK] [--memsize MEMCHUNK]
+        Usage: load_table <filename|pattern|directory> [--tablename NAME] [--chunksize CHUNK]
+                             [--memsize MEMCHUNK]
+                             [--workers N] [--columns COL1,COL2,...] [--resume]
+                             [--index COL1,...] [--nologging] [--gather-stats]
+                             [--max-errors N]
         Ex: example.csv has the following content
              RA,DEC,MAG
              1.23,0.13,23
@@ -209,33 +444,64 @@ class DatabaseActions(object):
         This command will create a table named EXAMPLE with 3 columns RA,DEC and MAG and
         values taken from file
 
+        Several files can be loaded into one table with a pattern or a directory, e.g.
+        load_table 'tiles/*.fits' --tablename MYCAT. The columns are taken from the first
+        file (the others must have the same ones) and the files are loaded in parallel by
+        --workers sessions, each one reading and inserting a whole file at a time. Each file
+        is committed once loaded, so running the command again after a failure only loads
+        the files missing.
+
         Optional Arguments:
 
             --tablename NAME            given name for the table, default is taken from filename
             --chunksize CHUNK           Number of rows to be inserted at a time.
-                                        Useful for large files that do not fit in memory
-            --memsize MEMCHUNK          The size in Mb to be read in chunks. If both specified,
-                                        the lower number of rows is selected
-                                        (the lower memory limitations)
+                                        Useful for large files that do not fit in memory.
+                                        Use 'auto' to tune it while uploading for the best
+                                        insert rate (within --memsize)
+            --memsize MEMCHUNK          Memory in Mb for all the chunks held at the same
+                                        time (read ahead, being inserted and, with --workers,
+                                        queued), converted rows included, so each chunk gets
+                                        a share of it. If both specified, the lower number
+                                        of rows is selected (the lower memory limitations)
+            --workers N                 Number of DB sessions inserting chunks in parallel
+                                        (default 1). Use it with --chunksize or --memsize.
+                                        Rows are committed only when all chunks are inserted
+            --columns COL1,COL2,...     Upload only these columns of the file. Unused columns
+                                        of FITS binary tables are not read from disk
+            --resume                    Commit each chunk and keep track of them, so if the
+                                        load fails the table is kept and running the same
+                                        command again continues after the last committed chunk
+            --index COL1,...            Create one index on these columns (in parallel) once
+                                        the data is loaded. Several columns make a composite
+                                        index, in that order
+            --nologging                 Create the table NOLOGGING and load it with direct-path
+                                        (APPEND_VALUES) inserts, committing each chunk. Not used
+                                        with --workers. The table is set back to LOGGING at the end
+            --gather-stats              Gather the table statistics once it is loaded
+            --max-errors N              Keep loading when rows are rejected by the DB (bad
+                                        values, etc). They are written with their ORA error
+                                        to <filename without extensions>.bad (catalog.csv.gz ->
+                                        catalog.bad) and the load is aborted only if more than
+                                        N rows are rejected
 
         Note: - For csv or tab files, first line must have the column names (without # or any
         other comment) and same format as data (using ',' or space)
               - For fits file header must have columns names and data types
+              - Parquet, arrow and feather files are read with pyarrow (if installed)
+              - When uploading by chunks the whole file is scanned first to find the column
+                types (longest strings, etc). The result is saved in ~/.easyaccess/schemas
+                and reused while the file does not change (see config schema_scan)
               - For filenames use <table_name>.csv or <table_name>.fits do not use extra points
+              - Compressed files (<table_name>.csv.gz, .tab.bz2, .fits.gz, .xz) are read as a stream
         """
         line = line.replace(';', '')
-        load_parser = KeyParser(prog='', usage='', add_help=False)
-        load_parser.add_argument(
-            'filename', help='name for the file', action='store', default=None)
-        load_parser.add_argument(
-            '--tablename', help='name for the table', action='store', default=None)
-        load_parser.add_argument('--chunksize',
-                                 help='number of rows to read in blocks to avoid memory issues',
-                                 action='store', type=int, default=None)
-        load_parser.add_argument('--memsize', help='size of the chunks to be read in Mb ',
-                                 action='store', type=int, default=None)
-        load_parser.add_argument(
-            '-h', '--help', help='print help', action='store_true')
+        load_parser = self._load_parser('load')
+        load_parser.add_argument('--index', help='comma separated list of columns of one (composite) index',
+                                 action='store', default=None)
+        load_parser.add_argument('--nologging', help='nologging table and direct-path inserts',
+                                 action='store_true')
+        load_parser.add_argument('--gather-stats', help='gather table statistics',
+                                 dest='gather_stats', action='store_true')
         try:
             load_args = load_parser.parse_args(line.split())
         except SystemExit:
@@ -244,136 +510,115 @@ class DatabaseActions(object):
         if load_args.help:
             self.do_help('load_table')
             return
-        filename = eafile.get_filename(load_args.filename)
         table = load_args.tablename
+        files = eafile.expand_files(load_args.filename)
+        if files is not None:
+            if not files:
+                print(colored('\nNo input files found in %s\n' % load_args.filename,
+                              'red', self.ct))
+                return
+            if table is None and name is None:
+                print(colored('\nUse --tablename to load several files into one table\n',
+                              'red', self.ct))
+                return
+            filename = files[0]
+        else:
+            filename = eafile.get_filename(load_args.filename)
         invalid_chars = ['-', '$', '~', '@', '*']
+        if table is None and name is None:
+            if filename is not None and any((char in invalid_chars) for char in filename):
+                print()
+                print(colored(
+                    'Invalid table name, change filename or use --tablename\n', 'red', self.ct))
+                return
         for obj in [table, name]:
-            if obj is None:
-                if any((char in invalid_chars) for char in filename):
-                    print()
-                    print(colored(
-                        'Invalid table name, change filename or use --tablename\n', 'red', self.ct))
-                    return
-            else:
-                if any((char in invalid_chars) for char in obj):
-                    print(colored('\nInvalid table name\n', 'red', self.ct))
-                    return
-
-        chunk = load_args.chunksize
-        memchunk = load_args.memsize
-        if chunksize is not None:
-            chunk = chunksize
-        if memsize is not None:
-            memchunk = memsize
-        if memchunk is not None:
-            memchunk_rows = eafile.get_chunksize(filename, memory=memchunk)
-            if chunk is not None:
-                chunk = min(chunk, memchunk_rows)
-            else:
-                chunk = memchunk_rows
-        if filename is None:
-            return
-        base, ext = os.path.splitext(os.path.basename(filename))
+            if obj is not None and any((char in invalid_chars) for char in obj):
+                print(colored('\nInvalid table name\n', 'red', self.ct))
+                return
 
-        if ext == '.h5' and chunk is not None:
-            print(colored("\nHDF5 file upload with chunksize is not supported yet. Try without "
-                          "--chunksize\n", "red", self.ct))
+        options = self._load_options(load_args, filename, chunksize, memsize, workers, columns,
+                                     max_errors)
+        if options is None:
             return
+        chunk, tuner, nworkers, ucolumns, umax_errors = options
+        base, ext, comp = eafile.split_ext(os.path.basename(filename))
 
         if table is None:
             table = base
             if name is not None:
                 table = name
 
+        if files is not None:
+            uindex = column_list(index if index is not None else load_args.index)
+            self._load_table_files(table, files, chunk, tuner, nworkers, ucolumns, umax_errors,
+                                   uindex, nologging or load_args.nologging,
+                                   gather_stats or load_args.gather_stats)
+            return
+
+        journal = None
+        if resume or load_args.resume:
+            if nworkers > 1:
+                print(colored('\n--resume can not be used with --workers\n', 'red', self.ct))
+                return
+            journal = LoadJournal(self.dbname, self.user, table, filename)
+
         # check table first
-        if self.check_table_exists(table):
+        exists = self.check_table_exists(table)
+        resuming = journal is not None and journal.started
+        if resuming:
+            if journal.changed():
+                print(colored('\n %s changed since the load started, it can not be resumed\n'
+                              % filename, 'red', self.ct))
+                return
+            if exists:
+                print(colored('\n Resuming load of %s into %s after %d rows\n' % (
+                    filename, table.upper(), journal.rows), 'green', self.ct))
+            else:
+                # the table is gone, start over
+                journal.remove()
+                resuming = False
+        if exists and not resuming:
             print(
                 colored('\n Table already exists. Table can be removed with:', 'red', self.ct))
             print(colored(' DESDB ~> DROP TABLE %s;\n' %
                           table.upper(), 'red', self.ct))
             return
 
+        dtypes = None
+        if self.schema_scan and (chunk is not None or ext in eafile.ARROW_EXTS):
+            try:
+                dtypes = eafile.get_schema(filename, ucolumns, chunk)
+            except:
+                print_exception(mode=self.ct)
+                return
+
         try:
             data, iterator = eafile.read_file(filename)
         except:
             print_exception(mode=self.ct)
             return
 
-        # Get the data in a way that Oracle understands
-
-        iteration = 0
-        done = False
-        total_rows = 0
-        if data.file_type == 'pandas':
-            while not done:
-                try:
-                    if iterator:
-                        df = data.get_chunk(chunk)
-                    else:
-                        df = data
-                    df.file_type = 'pandas'
-                    if len(df) == 0:
-                        break
-                    if iteration == 0:
-                        dtypes = eafile.get_dtypes(df)
-                    columns = df.columns.values.tolist()
-                    values = df.values.tolist()
-                    total_rows += len(df)
-                except:
-                    break
-                if iteration == 0:
-                    try:
-                        self.create_table(table, columns, dtypes)
-                    except:
-                        print_exception(mode=self.ct)
-                        self.drop_table(table)
-                        return
-                try:
-                    if not done:
-                        self.insert_data(
-                            table, columns, values, dtypes, iteration)
-                        iteration += 1
-                        if not iterator:
-                            done = True
-                except:
-                    print_exception(mode=self.ct)
-                    self.drop_table(table)
-                    return
-
-        if data.file_type == 'fits':
-            if chunk is None:
-                chunk = data[1].get_nrows()
-            start = 0
-            while not done:
-                try:
-                    df = data
-                    if iteration == 0:
-                        dtypes = eafile.get_dtypes(df)
-                        columns = df[1].get_colnames()
-                    values = df[1][start:start + chunk].tolist()
-                    start += chunk
-                    if len(values) == 0:
-                        break
-                    total_rows += len(values)
-                except:
-                    break
-                if iteration == 0:
-                    try:
-                        self.create_table(table, columns, dtypes)
-                    except:
-                        print_exception(mode=self.ct)
-                        self.drop_table(table)
-                        return
-
-                try:
-                    if not done:
-                        self.insert_data(
-                            table, columns, values, dtypes, iteration)
-                        iteration += 1
-                except:
-                    print_exception(mode=self.ct)
-                    self.drop_table(table)
-                    return
+        rejects = None
+        if umax_errors is not None:
+            rejects = RejectFile(eafile.split_ext(filename)[0] + '.bad', umax_errors,
+                                 append=resuming)
+        nologging = nologging or load_args.nologging
+        # batch errors are not supported by direct-path inserts
+        direct = nologging and nworkers == 1 and rejects is None
+        if nologging and not direct:
+            print(colored('\n Direct-path inserts are not used with --workers or --max-errors\n',
+                          'cyan', self.ct))
+        timings = OrderedDict()
+        uploaded = self._upload_data(table, data, iterator, chunk, create=not exists,
+                                     workers=nworkers, columns=ucolumns, dtypes=dtypes,
+                                     tuner=tuner, journal=journal, nologging=nologging,
+                                     direct=direct, timings=timings, rejects=rejects)
+        if uploaded is None:
+            return
+        total_rows = uploaded[0]
+        uindex = column_list(index if index is not None else load_args.index)
+        self._post_load(table, uindex, nologging, gather_stats or load_args.gather_stats,
+                        timings)
 
         print(colored(
             '\n ** Table %s loaded successfully '
@@ -392,12 +637,15 @@ class DatabaseActions(object):
     def complete_load_table(self, text, line, start_idx, end_idx):
         return complete_path(line)
 
-    def do_append_table(self, line, name=None, chunksize=None, memsize=None):
+    def do_append_table(self, line, name=None, chunksize=None, memsize=None, workers=None,
+                        columns=None, resume=False, key=None, max_errors=None):
         """
         DB:Appends a table from a file (csv or fits) taking its name from filename
         and the columns from header.
 
         Usage: append_table <filename> [--tablename NAME] [--chunksize CHUNK] [--memsize MEMCHUNK]
+                               [--workers N] [--columns COL1,COL2,...] [--resume]
+                               [--key COL1,...] [--max-errors N]
         Ex: example.csv has the following content
              RA,DEC,MAG
              1.23,0.13,23
@@ -410,29 +658,44 @@ class DatabaseActions(object):
 
               --tablename NAME           given name for the table, default is taken from filename
               --chunksize CHUNK          Number of rows to be inserted at a time. Useful for large
-                                         files that do not fit in memory
-              --memsize MEMCHUNK         The size in Mb to be read in chunks. If both specified,
-                                         the lower number of rows is selected
-                                         (the lower memory limitations)
+                                         files that do not fit in memory. Use 'auto' to tune it
+                                         while uploading for the best insert rate (within --memsize)
+              --memsize MEMCHUNK         Memory in Mb for all the chunks held at the same time
+                                         (read ahead, being inserted and, with --workers,
+                                         queued), converted rows included, so each chunk gets
+                                         a share of it. If both specified, the lower number
+                                         of rows is selected (the lower memory limitations)
+              --workers N                Number of DB sessions inserting chunks in parallel
+                                         (default 1). Use it with --chunksize or --memsize.
+                                         Rows are committed only when all chunks are inserted
+              --columns COL1,COL2,...    Upload only these columns of the file. Unused columns
+                                         of FITS binary tables are not read from disk
+              --resume                   Commit each chunk and keep track of them, so running the
+                                         same command again after a failure continues after the
+                                         last committed chunk
+              --key COL1,...             Columns identifying a row. Rows whose key is already in
+                                         the table are skipped, so appending the same file twice
+                                         does not duplicate rows. Keys can not be null
+              --max-errors N             Keep appending when rows are rejected by the DB (bad
+                                         values, etc). They are written with their ORA error
+                                         to <filename without extensions>.bad (catalog.csv.gz ->
+                                         catalog.bad) and the append is aborted only if more
+                                         than N rows are rejected
 
         Note: - For csv or tab files, first line must have the column names
         (without # or any other comment) and same format as data (using ',' or space)
               - For fits file header must have columns names and data types
+              - Parquet, arrow and feather files are read with pyarrow (if installed)
+              - When uploading by chunks the whole file is scanned first to find the column
+                types (longest strings, etc). The result is saved in ~/.easyaccess/schemas
+                and reused while the file does not change (see config schema_scan)
               - For filenames use <table_name>.csv or <table_name>.fits do not use extra points
+              - Compressed files (<table_name>.csv.gz, .tab.bz2, .fits.gz, .xz) are read as a stream
         """
         line = line.replace(';', '')
-        append_parser = KeyParser(prog='', usage='', add_help=False)
-        append_parser.add_argument(
-            'filename', help='name for the file', action='store', default=None)
-        append_parser.add_argument(
-            '--tablename', help='name for the table to append to', action='store', default=None)
-        append_parser.add_argument('--chunksize',
-                                   help='number of rows to read in blocks to avoid memory '
-                                        'issues', action='store', default=None, type=int)
-        append_parser.add_argument('--memsize', help='size of the chunks to be read in Mb ',
-                                   action='store', type=int, default=None)
-        append_parser.add_argument(
-            '-h', '--help', help='print help', action='store_true')
+        append_parser = self._load_parser('append')
+        append_parser.add_argument('--key', help='comma separated list of key columns',
+                                   action='store', default=None)
         try:
             append_args = append_parser.parse_args(line.split())
         except SystemExit:
@@ -444,38 +707,22 @@ class DatabaseActions(object):
         filename = eafile.get_filename(append_args.filename)
         table = append_args.tablename
         invalid_chars = ['-', '$', '~', '@', '*']
+        if table is None and name is None:
+            if filename is not None and any((char in invalid_chars) for char in filename):
+                print(colored('\nInvalid table name, change filename '
+                              'or use --tablename\n', 'red', self.ct))
+                return
         for obj in [table, name]:
-            if obj is None:
-                if any((char in invalid_chars) for char in filename):
-                    print(colored('\nInvalid table name, change filename '
-                                  'or use --tablename\n', 'red', self.ct))
-                    return
-            else:
-                if any((char in invalid_chars) for char in obj):
-                    print(colored('\nInvalid table name\n', 'red', self.ct))
-                    return
-
-        chunk = append_args.chunksize
-        memchunk = append_args.memsize
-        if chunksize is not None:
-            chunk = chunksize
-        if memsize is not None:
-            memchunk = memsize
-        if memchunk is not None:
-            memchunk_rows = eafile.get_chunksize(filename, memory=memchunk)
-            if chunk is not None:
-                chunk = min(chunk, memchunk_rows)
-            else:
-                chunk = memchunk_rows
-
-        if filename is None:
-            return
-        base, ext = os.path.splitext(os.path.basename(filename))
+            if obj is not None and any((char in invalid_chars) for char in obj):
+                print(colored('\nInvalid table name\n', 'red', self.ct))
+                return
 
-        if ext == '.h5' and chunk is not None:
-            print(colored("\nHDF5 file upload with chunksize is not supported yet. Try without "
-                          "--chunksize\n", "red", self.ct))
+        options = self._load_options(append_args, filename, chunksize, memsize, workers, columns,
+                                     max_errors)
+        if options is None:
             return
+        chunk, tuner, nworkers, ucolumns, umax_errors = options
+        base, ext, comp = eafile.split_ext(os.path.basename(filename))
 
         if table is None:
             table = base
@@ -488,72 +735,572 @@ class DatabaseActions(object):
                   '\n DESDB ~> CREATE TABLE %s '
                   '(COL1 TYPE1(SIZE), ..., COLN TYPEN(SIZE));\n' % table.upper())
             return
+        ukey = column_list(key if key is not None else append_args.key)
+        journal = None
+        if resume or append_args.resume:
+            if nworkers > 1:
+                print(colored('\n--resume can not be used with --workers\n', 'red', self.ct))
+                return
+            journal = LoadJournal(self.dbname, self.user, table, filename)
+            if journal.changed():
+                print(colored('\n %s changed since the append started, it can not be resumed\n'
+                              % filename, 'red', self.ct))
+                return
+            if journal.started:
+                print(colored('\n Resuming append of %s into %s after %d rows\n' % (
+                    filename, table.upper(), journal.rows), 'green', self.ct))
+        dtypes = None
+        if self.schema_scan and (chunk is not None or ext in eafile.ARROW_EXTS):
+            try:
+                dtypes = eafile.get_schema(filename, ucolumns, chunk)
+            except:
+                print_exception(mode=self.ct)
+                return
+
         try:
             data, iterator = eafile.read_file(filename)
         except:
             print_exception(mode=self.ct)
             return
 
+        rejects = None
+        if umax_errors is not None:
+            rejects = RejectFile(eafile.split_ext(filename)[0] + '.bad', umax_errors,
+                                 append=journal is not None and journal.started)
+        uploaded = self._upload_data(table, data, iterator, chunk, workers=nworkers,
+                                     columns=ucolumns, dtypes=dtypes, tuner=tuner,
+                                     journal=journal, key=ukey, rejects=rejects)
+        if uploaded is None:
+            return
+        total_rows = uploaded[0]
+        self.forget_table(table)
+
+        print(colored('\n ** Table %s appended '
+                      'successfully with %d rows.' % (table.upper(), total_rows), "green", self.ct))
+
+
+    def _upload_data(self, table, data, iterator, chunk, create=False, workers=1,
+                     columns=None, dtypes=None, tuner=None, journal=None, key=None,
+                     nologging=False, direct=False, timings=None, rejects=None):
+        """
+        Insert the content of a file (as returned by eafile.read_file) into
+        a table, 'chunk' rows at a time. Columns are bound directly from
+        the numpy arrays (see insert_arrays).
+
+        Parameters:
+        -----------
+        table    : Name of the table
+        data     : pandas or fitsio object from eafile.read_file
+        iterator : Whether data is read by chunks
+        chunk    : Number of rows per chunk (None for all)
+        create   : Create the table from the first chunk. The table is
+                   dropped if the upload fails.
+        workers  : Number of sessions inserting chunks concurrently. With
+                   more than one worker, nothing is committed until all
+                   chunks are inserted and everything is rolled back on failure.
+        columns  : List of columns to upload (default all)
+        dtypes   : Column types for the whole file (see eafile.get_schema),
+                   by default they are taken from the first chunk
+        tuner    : ChunkTuner adapting the chunk size to the insert rate
+        journal  : LoadJournal for resumable uploads. Each chunk is committed
+                   and recorded, the rows already recorded are skipped and
+                   nothing is dropped or rolled back (but the failing chunk)
+                   if the upload fails.
+        key      : List of key columns, rows already in the table are skipped
+        nologging: Create the table NOLOGGING
+        direct   : Direct-path inserts, each chunk is committed
+        timings  : Dictionary where the time spent creating the table and
+                   inserting the rows is added
+        rejects  : RejectFile for the rows rejected by the DB. Bad rows do not
+                   fail the upload until there are too many of them
+
+        While a chunk is inserted, the next ones ('readahead' config
+        option) are read and converted in another thread.
+
+        Returns:
+        --------
+        Number of rows inserted (not counting the rejected ones) and of chunks
+        inserted by this call, or None if failed
+        """
+        table_rows = None
+        if journal is not None and key is None:
+            # rows in the table, to tell if the commit of the last chunk was
+            # done before a previous upload stopped (see LoadJournal)
+            try:
+                table_rows = 0 if create else self.count_rows(table)
+            except:
+                print_exception(mode=self.ct)
+                return None
+            if journal.resolve(table_rows):
+                print(colored(' The last chunk of the previous upload was committed, '
+                              'resuming after %d rows' % journal.rows, 'green', self.ct))
+        chunks = eafile.ChunkReader(data, iterator, chunk, columns=columns)
         iteration = 0
-        done = False
         total_rows = 0
-        if data.file_type == 'pandas':
-            while not done:
-                try:
-                    if iterator:
-                        df = data.get_chunk(chunk)
-                    else:
-                        df = data
-                    df.file_type = 'pandas'
-                    if len(df) == 0:
-                        break
-                    if iteration == 0:
-                        dtypes = eafile.get_dtypes(df)
-                    columns = df.columns.values.tolist()
-                    values = df.values.tolist()
-                    total_rows += len(df)
-                except:
-                    break
+        nchunks = 0
+        if journal is not None and journal.started:
+            chunks.skip(journal.rows)
+            iteration = journal.chunks
+            total_rows = journal.rows
+        reader = chunks
+        if self.readahead > 0 and chunk is not None:
+            reader = ReadAhead(chunks, self.readahead, prepare=lambda block: block.prepare())
+        pool = None
+        created = False
+        first = True
+        try:
+            for block in reader:
+                if first:
+                    first = False
+                    if dtypes is None:
+                        dtypes = eafile.get_dtypes(block)
+                    if create:
+                        t1 = time.time()
+                        self.create_table(table, block.columns, dtypes, nologging=nologging)
+                        created = True
+                        if timings is not None:
+                            timings['create table'] = time.time() - t1
+                        if journal is not None:
+                            journal.update(0, 0, count=table_rows)
+                    t_insert = time.time()
+                    if workers > 1:
+                        progress = UploadProgress(table, workers, self.ct)
+
+                        def insert(block, cursor):
+                            errors = [] if rejects is not None else None
+                            seconds = self.insert_arrays(table, block.columns, block.arrays,
+                                                         dtypes, cursor=cursor,
+                                                         rows=block.prepare().rows, key=key,
+                                                         errors=errors)
+                            if errors:
+                                rejects.add(block, errors)
+                            if tuner is not None:
+                                chunks.chunksize = tuner.update(len(block), seconds)
+                            progress.update(len(block))
+
+                        pool = InsertWorkers(workers, self.new_connection, insert)
+                if pool is not None:
+                    pool.put(block)
+                else:
+                    errors = [] if rejects is not None else None
+                    seconds = self.insert_arrays(table, block.columns, block.arrays, dtypes,
+                                                 iteration, rows=block.prepare().rows, key=key,
+                                                 direct=direct and not key, errors=errors)
+                    if errors:
+                        rejects.add(block, errors)
+                    if tuner is not None:
+                        chunks.chunksize = tuner.update(len(block), seconds)
+                    if journal is not None:
+                        if table_rows is not None:
+                            table_rows += len(block) - len(errors or [])
+                        journal.prepare(total_rows + len(block), iteration + 1, table_rows)
+                    # with rejects, autocommit waits for the --max-errors check
+                    if journal is not None or direct or (self.autocommit and errors is not None):
+                        self.con.commit()
+                    if journal is not None:
+                        journal.update(total_rows + len(block), iteration + 1, count=table_rows)
+                total_rows += len(block)
+                iteration += 1
+                nchunks += 1
+            if pool is not None:
+                committed = pool.finish()
+                progress.close()
+                if not committed:
+                    pool.reraise()
+            if timings is not None and not first:
+                timings['insert'] = time.time() - t_insert
+        except:
+            print_exception(mode=self.ct)
+            if pool is not None:
+                pool.finish(commit=False)
+            else:
+                # e.g. the rows of a chunk over --max-errors, not committed yet
+                self.con.rollback()
+            if journal is not None:
+                print(colored('\n %d rows are committed into %s, run the same command with '
+                              '--resume to continue\n' % (journal.rows, table.upper()),
+                              'red', self.ct))
+                return None
+            if created:
+                self.drop_table(table)
+            return None
+        finally:
+            if isinstance(reader, ReadAhead):
+                reader.close()
+            chunks.close()
+            if rejects is not None:
+                rejects.close()
+        if journal is not None:
+            journal.remove()
+        if rejects is not None and rejects.count:
+            total_rows -= rejects.count
+            print(colored('\n %d rows were rejected, they are in %s' % (
+                rejects.count, rejects.filename), 'red', self.ct))
+        if tuner is not None and tuner.summary() is not None:
+            print(colored('\n ' + tuner.summary(), 'green', self.ct))
+        return total_rows, nchunks
+
+    def _post_load(self, table, index=None, nologging=False, gather_stats=False, timings=None):
+        """
+        Steps run once all the rows are loaded: build the index, set the
+        table back to LOGGING and gather its statistics. Then print the time
+        spent in each phase of the load.
+        """
+        if timings is None:
+            timings = OrderedDict()
+        # the rows are in, a failure here only leaves the step undone
+        try:
+            if index:
+                t1 = time.time()
+                name = self.create_index(table, index)
+                timings['index'] = time.time() - t1
+                print(colored('\n Index %s created on %s' % (name, ','.join(index).upper()),
+                              'green', self.ct))
+        except:
+            print_exception(mode=self.ct)
+            print(colored(' The index on %s was not created' % ','.join(index).upper(),
+                          'red', self.ct))
+        finally:
+            if nologging:
                 try:
-                    if not done:
-                        self.insert_data(
-                            table, columns, values, dtypes, iteration)
-                        iteration += 1
-                        if not iterator:
-                            done = True
+                    self.cur.execute('alter table %s logging' % table.upper())
                 except:
                     print_exception(mode=self.ct)
-                    return
+                    print(colored(' %s is still NOLOGGING, run: alter table %s logging;'
+                                  % (table.upper(), table.upper()), 'red', self.ct))
+        if gather_stats:
+            try:
+                t1 = time.time()
+                self.gather_stats(table)
+                timings['gather stats'] = time.time() - t1
+            except:
+                print_exception(mode=self.ct)
+        # the cached description has the number of rows before the load
+        self.forget_table(table)
+        if timings:
+            print(colored('\n Time spent in each phase:', 'green', self.ct))
+            for phase, seconds in timings.items():
+                print(colored('   %-14s %10.2f s' % (phase, seconds), 'green', self.ct))
+
+    def _load_parser(self, action):
+        """
+        Parser with the options shared by load_table and append_table
+        ('action' is 'load' or 'append'), each command adds its own.
+        """
+        parser = KeyParser(prog='', usage='', add_help=False)
+        parser.add_argument('filename', help='name for the file', action='store', default=None)
+        parser.add_argument('--tablename', help='name for the table to %s' % action,
+                            action='store', default=None)
+        parser.add_argument('--chunksize',
+                            help='number of rows to read in blocks to avoid memory issues',
+                            action='store', type=parse_chunksize, default=None)
+        parser.add_argument('--memsize', help='memory in Mb shared by all the chunks in memory',
+                            action='store', type=int, default=None)
+        parser.add_argument('--workers', help='number of sessions inserting in parallel',
+                            action='store', type=int, default=1)
+        parser.add_argument('--columns', help='comma separated list of columns to upload',
+                            action='store', default=None)
+        parser.add_argument('--resume', help='resumable %s' % action, action='store_true')
+        parser.add_argument('--max-errors', help='max number of rejected rows',
+                            dest='max_errors', action='store', type=int, default=None)
+        parser.add_argument('-h', '--help', help='print help', action='store_true')
+        return parser
+
+    def _load_options(self, args, filename, chunksize=None, memsize=None, workers=None,
+                      columns=None, max_errors=None):
+        """
+        Check the options shared by load_table and append_table, parsed in
+        'args' or given from python (which take precedence), and find the
+        rows per chunk for 'filename' from --chunksize and --memsize.
+
+        Returns:
+        --------
+        chunk, tuner, nworkers, columns, max_errors or None if not valid.
+        'tuner' is the ChunkTuner for --chunksize auto (None otherwise)
+        """
+        chunk = parse_chunksize(chunksize) if chunksize is not None else args.chunksize
+        memchunk = memsize if memsize is not None else args.memsize
+        ucolumns = column_list(columns if columns is not None else args.columns)
+        nworkers = workers if workers is not None else args.workers
+        if nworkers < 1:
+            print(colored('\n--workers must be a positive number\n', 'red', self.ct))
+            return None
+        umax_errors = max_errors if max_errors is not None else args.max_errors
+        if umax_errors is not None and umax_errors < 0:
+            print(colored('\n--max-errors can not be negative\n', 'red', self.ct))
+            return None
+        if filename is None:
+            return None
+        auto = chunk == 'auto'
+        if auto:
+            chunk = None
+        if memchunk is not None:
+            # the budget is shared by all the chunks held at the same time,
+            # each one with its arrays and the rows converted for the insert
+            nchunks = chunks_in_memory(self.readahead, nworkers)
+            memchunk_rows = eafile.get_chunksize(filename, memory=memchunk / float(nchunks),
+                                                 columns=ucolumns, prepared=True)
+            print(colored('\n --memsize %s Mb for up to %d chunks in memory: %d rows per chunk'
+                          % (memchunk, nchunks, memchunk_rows), 'cyan', self.ct))
+            if chunk is not None:
+                chunk = min(chunk, memchunk_rows)
+            else:
+                chunk = memchunk_rows
+        tuner = None
+        if auto:
+            tuner = self._chunk_tuner(filename, chunk, nworkers, ucolumns)
+            chunk = tuner.size
+        return chunk, tuner, nworkers, ucolumns, umax_errors
 
-        if data.file_type == 'fits':
+    def _chunk_tuner(self, filename, maxrows=None, workers=1, columns=None):
+        """
+        ChunkTuner for '--chunksize auto'. Chunks are kept within the rows
+        fitting in --memsize if given (500 Mb otherwise).
+        """
+        if maxrows is None:
+            nchunks = chunks_in_memory(self.readahead, workers)
+            maxrows = eafile.get_chunksize(filename, memory=500 / float(nchunks),
+                                           columns=columns, prepared=True)
+        return ChunkTuner(min(10000, maxrows), maximum=maxrows)
+
+    def _load_table_files(self, table, files, chunk=None, tuner=None, workers=1, columns=None,
+                          max_errors=None, index=None, nologging=False, gather_stats=False):
+        """
+        Load several files into one table (load_table with a pattern or a
+        directory). The table is created with the columns of the first file
+        and types wide enough for all of them, then the files are inserted by
+        a pool of workers (see _load_files). The files already loaded by a
+        previous run of the same command (recorded in the load journal) are
+        skipped.
+        """
+        report = FileReport(len(files), self.ct)
+        journals = dict((f, LoadJournal(self.dbname, self.user, table, f)) for f in files)
+        exists = self.check_table_exists(table)
+        if exists and not any(journal.finished for journal in journals.values()):
+            print(colored('\n Table already exists. Table can be removed with:', 'red', self.ct))
+            print(colored(' DESDB ~> DROP TABLE %s;\n' % table.upper(), 'red', self.ct))
+            return
+        pending = []
+        for filename in files:
+            journal = journals[filename]
+            if exists and journal.finished:
+                if journal.changed():
+                    report.add_skipped(filename, 'already loaded but modified since then')
+                else:
+                    report.add_skipped(filename, 'already loaded')
+            else:
+                if journal.started:
+                    journal.remove()
+                pending.append(filename)
+        if not pending:
+            report.summary()
+            return
+
+        try:
             if chunk is None:
-                chunk = data[1].get_nrows()
-            start = 0
-            while not done:
-                try:
-                    df = data
-                    if iteration == 0:
-                        dtypes = eafile.get_dtypes(df)
-                        columns = df[1].get_colnames()
-                    values = df[1][start:start + chunk].tolist()
-                    start += chunk
-                    if len(values) == 0:
-                        break
-                    total_rows += len(values)
-                except:
-                    break
+                # files are read by chunks, one per worker within the default
+                # budget (500 Mb), never whole in memory
+                nworkers = min(workers, len(pending))
+                chunk = eafile.get_chunksize(pending[0], memory=500 / float(nworkers),
+                                             columns=columns, prepared=True)
+            names, dtypes = self._files_schema(pending, columns, chunk)
+            if dtypes is None:
+                data, iterator = eafile.read_file(pending[0])
+                reader = eafile.ChunkReader(data, iterator, chunk, columns=names)
                 try:
-                    if not done:
-                        self.insert_data(
-                            table, columns, values, dtypes, iteration)
-                        iteration += 1
-                except:
-                    print_exception(mode=self.ct)
-                    return
+                    dtypes = eafile.get_dtypes(reader.read(reader.chunksize))
+                finally:
+                    reader.close()
+        except:
+            print_exception(mode=self.ct)
+            return
 
-        print(colored('\n ** Table %s appended '
-                      'successfully with %d rows.' % (table.upper(), total_rows), "green", self.ct))
+        timings = OrderedDict()
+        created = False
+        if not exists:
+            try:
+                t1 = time.time()
+                self.create_table(table, names, dtypes, nologging=nologging)
+                created = True
+                timings['create table'] = time.time() - t1
+            except:
+                print_exception(mode=self.ct)
+                return
+        else:
+            print(colored('\n Loading the remaining %d files into %s\n' % (
+                len(pending), table.upper()), 'green', self.ct))
+
+        t1 = time.time()
+        self._load_files(table, pending, names, dtypes, journals, report, workers, chunk,
+                         tuner, max_errors)
+        timings['insert'] = time.time() - t1
+        report.summary()
+        if tuner is not None and tuner.summary() is not None:
+            print(colored('\n ' + tuner.summary(), 'green', self.ct))
+        if created and not report.loaded:
+            self.drop_table(table)
+            return
+        if report.failed:
+            print(colored('\n Run the same command again to load the files that failed\n',
+                          'red', self.ct))
+            return
+        for journal in journals.values():
+            journal.remove()
+        self._post_load(table, index, nologging, gather_stats, timings)
+        print(colored(
+            '\n ** Table %s loaded successfully with %d rows from %d files.\n' % (
+                table.upper(), report.rows, len(report.loaded)), "green", self.ct))
+        print(colored(' DESDB ~> refresh_metadata_cache;', "cyan", self.ct))
+        print()
 
+    def _files_schema(self, files, columns=None, chunk=None):
+        """
+        Columns and types to load several files into one table: the columns
+        of the first file and types that can hold the values of all the
+        files (None if the files are not scanned, see file_schema). Each file
+        is read once for its columns and types, and not at all if they are
+        cached. Raises a ValueError listing the files whose columns do not
+        match.
+        """
+        def kind(dtype):
+            return 'number' if dtype.kind in 'biuf' else dtype.kind
+
+        names, dtypes, problems = None, None, []
+        scan = self.schema_scan or all(
+            eafile.split_ext(f)[1] in eafile.FITS_EXTS for f in files)
+        for filename in files:
+            try:
+                if scan:
+                    fnames, fdtypes = eafile.file_schema(filename, chunk)
+                else:
+                    fnames, fdtypes = eafile.get_columns(filename), None
+                if names is None:
+                    names = eafile.select_columns(fnames, columns)
+                else:
+                    extra = set(c.upper() for c in fnames) - set(c.upper() for c in names)
+                    if columns is None and extra:
+                        raise ValueError('Columns not in %s: %s' % (
+                            os.path.basename(files[0]), ', '.join(sorted(extra))))
+                if not scan:
+                    eafile.select_columns(fnames, names)
+                    continue
+                lookup = dict(zip(fnames, fdtypes))
+                fdtypes = [lookup[name] for name in eafile.select_columns(fnames, names)]
+                if dtypes is None:
+                    dtypes = fdtypes
+                    continue
+                for name, dtype1, dtype2 in zip(names, dtypes, fdtypes):
+                    if kind(dtype1) != kind(dtype2):
+                        raise ValueError('Column %s is %s (%s in %s)' % (
+                            name, dtype2, dtype1, os.path.basename(files[0])))
+                dtypes = [eafile.merge_dtypes(d1, d2) for d1, d2 in zip(dtypes, fdtypes)]
+            except Exception as e:
+                problems.append('%s: %s' % (filename, e))
+        if problems:
+            raise ValueError('Files do not match:\n ' + '\n '.join(problems))
+        return names, dtypes
+
+    def _load_files(self, table, files, names, dtypes, journals, report, workers=1, chunk=None,
+                    tuner=None, max_errors=None):
+        """
+        Insert files into a table with 'workers' threads, each one with its
+        own DB session, reading and inserting one file at a time. A file is
+        committed once all its rows are inserted and recorded as done in its
+        journal; a file that fails is rolled back without stopping the others.
+
+        Parameters:
+        -----------
+        table      : Name of the table
+        files      : List of files
+        names      : List of columns to load
+        dtypes     : Column types
+        journals   : Dictionary of LoadJournal by file
+        report     : FileReport
+        workers    : Number of threads/sessions
+        chunk      : Number of rows per chunk
+        tuner      : ChunkTuner shared by all the workers
+        max_errors : Max number of rows rejected per file (see RejectFile)
+        """
+        pending = queue.Queue()
+        for filename in files:
+            pending.put(filename)
+        lock = threading.Lock()
+        errors = []
+
+        def run():
+            try:
+                con = self.new_connection()
+            except Exception as e:
+                errors.append(e)
+                return
+            cursor = con.cursor()
+            try:
+                while True:
+                    try:
+                        filename = pending.get_nowait()
+                    except queue.Empty:
+                        break
+                    t1 = time.time()
+                    try:
+                        rows, nchunks = self._insert_file(table, filename, names, dtypes,
+                                                          cursor, chunk, tuner, max_errors)
+                        con.commit()
+                    except Exception as e:
+                        con.rollback()
+                        report.add_failed(filename, e)
+                        continue
+                    with lock:
+                        journals[filename].update(rows, nchunks, done=True)
+                    report.add_loaded(filename, rows, time.time() - t1)
+            finally:
+                cursor.close()
+                con.close()
+
+        threads = []
+        for i in range(min(workers, len(files))):
+            thread = threading.Thread(target=run)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        # files left if the sessions could not be opened
+        while not pending.empty():
+            report.add_failed(pending.get_nowait(), errors[0] if errors else 'not loaded')
+
+    def _insert_file(self, table, filename, names, dtypes, cursor, chunk=None, tuner=None,
+                     max_errors=None):
+        """
+        Insert all the rows of a file with a cursor, without committing.
+        Returns the number of rows inserted and chunks read.
+        """
+        data, iterator = eafile.read_file(filename)
+        if tuner is not None:
+            chunk = tuner.size
+        reader = eafile.ChunkReader(data, iterator, chunk, columns=names)
+        rejects = None
+        if max_errors is not None:
+            rejects = RejectFile(eafile.split_ext(filename)[0] + '.bad', max_errors)
+        rows, nchunks = 0, 0
+        try:
+            for block in reader:
+                errors = [] if rejects is not None else None
+                seconds = self.insert_arrays(table, block.columns, block.arrays, dtypes,
+                                             cursor=cursor, rows=block.prepare().rows,
+                                             errors=errors)
+                if errors:
+                    rejects.add(block, errors)
+                if tuner is not None:
+                    reader.chunksize = tuner.update(len(block), seconds)
+                rows += len(block)
+                nchunks += 1
+        finally:
+            reader.close()
+            if rejects is not None:
+                rejects.close()
+        if rejects is not None:
+            rows -= rejects.count
+        return rows, nchunks
 
     def complete_append_table(self, text, line, start_idx, end_idx):
         return complete_path(line)
@@ -720,15 +1467,45 @@ class DatabaseActions(object):
         """
         DB:Refreshes meta data cache for auto-completion of table
         names and column names .
+
+        Usage:
+            refresh_metadata_cache                  # Reload all the names
+            refresh_metadata_cache --incremental    # Only add the columns of the tables
+                                                      created or altered since the last refresh
+            refresh_metadata_cache --background     # Reload in the background (with its own
+                                                      session), the prompt is back at once
+            refresh_metadata_cache --status         # Show if it is being loaded and its age
+
+        The metadata is saved on disk (~/.easyaccess/metadata) and used at
+        startup, it is refreshed in the background (incrementally) when older
+        than the metadata_ttl config option, or loaded in the background
+        the first time.
         """
         verb = True
+        options = arg.replace(';', '').split()
+        unknown = [option for option in options
+                   if option not in ('--incremental', '--background', '--status')]
+        if unknown:
+            print(colored('Unknown option: %s' % ' '.join(unknown), 'red', self.ct))
+            return self.do_help('refresh_metadata_cache')
+        incremental = '--incremental' in options
+        if '--status' in options:
+            return self.print_metadata_status()
+        if '--background' in options:
+            if self.refresh_metadata_background(incremental) is None:
+                print(colored('The metadata is already being loaded', 'yellow', self.ct))
+            else:
+                print('Loading metadata into cache in the background...')
+            return
         try:
             if verb:
                 print('Loading metadata into cache...')
-            self.cache_table_names = self.get_tables_names()
-            self.cache_usernames = self.get_userlist()
-            self.cache_column_names = self.get_columnlist()
+            self.metadata_status = 'loading'
+            cache, dbname = self.metadata_cache, self.dbname
+            metadata = self._read_metadata(incremental=incremental)
+            self._install_metadata(cache, dbname, *metadata)
         except:
+            self.metadata_status = 'failed'
             if verb:
                 print(
                     colored("There was an error when refreshing the metadata", "red", self.ct))
@@ -737,6 +1514,145 @@ class DatabaseActions(object):
         except:
             pass
 
+    def _install_metadata(self, cache, dbname, tables, users, columns, columns_by_table,
+                          db_time):
+        """
+        Use and save the metadata read from 'dbname', whose cache was
+        'cache' when it started being read. It is discarded (returns False)
+        if the DB was changed meanwhile, so its names are not used nor
+        saved as those of the new one.
+        """
+        with self.metadata_lock:
+            if self.metadata_cache is not cache or self.dbname != dbname:
+                return False
+            self.set_metadata(tables, users, columns, columns_by_table)
+            # synonyms are not tracked by the incremental refresh, resolve again
+            self.resolved_tables.clear()
+            self._save_metadata(db_time)
+            self.metadata_status = 'ready'
+        return True
+
+    def _read_metadata(self, cursor=None, incremental=False):
+        """
+        Read the table, user and column names for auto-completion (and the
+        columns of each table, for searches) from the DB. Table and user
+        names are always read in full. With 'incremental' only the columns
+        of the tables changed since the last refresh are read and added to
+        the current ones (the columns of dropped tables are kept until the
+        next full refresh).
+
+        Returns:
+        --------
+        tables, users, columns, columns_by_table, db_time
+        """
+        db_time = self.get_db_time(cursor=cursor)
+        tables = self.get_tables_names(cursor=cursor)
+        users = self.get_userlist(cursor=cursor)
+        since = self.metadata_cache.db_time
+        if incremental and since is not None:
+            known_tables = set(tables)
+            columns = list(self.cache_column_names)
+            known_columns = set(columns)
+            columns_by_table = dict(self.columns_by_table)
+            changed = {}
+            for owner, table, column in self.get_changed_columns(since, cursor=cursor):
+                name = owner + '.' + table
+                if table not in known_tables and name not in known_tables:
+                    continue
+                if column not in known_columns:
+                    known_columns.add(column)
+                    columns.append(column)
+                if name in columns_by_table or name in known_tables:
+                    changed.setdefault(name, []).append(column)
+            columns_by_table.update(changed)
+        else:
+            columns = self.get_columnlist(cursor=cursor)
+            columns_by_table = self.get_tables_columns(cursor=cursor)
+        return tables, users, columns, columns_by_table, db_time
+
+    def set_metadata(self, tables, users, columns, columns_by_table=None, load_columns=None):
+        """
+        Use these table, user and column names for auto-completion. The
+        lists are deduplicated and sorted into prefix indexes once here,
+        so completions do not scan them. 'columns_by_table' ('OWNER.TABLE'
+        -> [columns]) is used to search tables locally, or read with
+        'load_columns' when first searched. Everything is built first and
+        switched in a single assignment, so completions running meanwhile
+        see either the old metadata or the new one.
+        """
+        self.metadata_snapshot = MetadataSnapshot(tables, users, columns, columns_by_table,
+                                                  load_columns)
+
+    def _save_metadata(self, db_time=None):
+        snapshot = self.metadata_snapshot
+        with self.metadata_lock:
+            resolved = dict(self.resolved_tables)
+        try:
+            self.metadata_cache.save(snapshot.table_index.names, snapshot.user_index.names,
+                                     snapshot.column_index.names, db_time,
+                                     resolved=resolved,
+                                     columns_by_table=snapshot.columns_by_table)
+        except (IOError, OSError):
+            pass
+
+    def refresh_metadata_background(self, incremental=True):
+        """
+        Reload the metadata for auto-completion in a thread with its own
+        DB session, the current one is used until the new one is read.
+        Returns the thread, or None if the metadata is already being loaded.
+        """
+        if self.metadata_thread is not None and self.metadata_thread.is_alive():
+            return None
+        # the DB it is read from, change_db may switch it meanwhile
+        cache, dbname = self.metadata_cache, self.dbname
+
+        def run():
+            try:
+                con = self.new_connection()
+                try:
+                    cursor = con.cursor()
+                    metadata = self._read_metadata(cursor, incremental)
+                    try:
+                        cursor.execute('create table FGOTTENMETADATA (ID int)')
+                    except Exception:
+                        pass
+                    cursor.close()
+                finally:
+                    con.close()
+            except Exception as e:
+                with self.metadata_lock:
+                    if self.metadata_cache is cache:
+                        self.metadata_status = 'failed: %s' % str(e).strip()
+                return
+            self._install_metadata(cache, dbname, *metadata)
+
+        self.metadata_status = 'loading'
+        self.metadata_started = time.time()
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        self.metadata_thread = thread
+        thread.start()
+        return thread
+
+    def print_metadata_status(self):
+        """
+        Print whether the metadata for auto-completion is being loaded,
+        how many names it has and how old it is
+        """
+        if self.metadata_status == 'loading':
+            print(colored('Loading metadata in the background (%d seconds)...' %
+                          (time.time() - self.metadata_started), 'yellow', self.ct))
+        elif self.metadata_status.startswith('failed'):
+            print(colored('Loading the metadata %s' % self.metadata_status, 'red', self.ct))
+        print('%d tables, %d users and %d columns' % (
+            len(self.cache_table_names), len(self.cache_usernames), len(self.cache_column_names)))
+        age = self.metadata_cache.age()
+        if age is None:
+            print(colored('The metadata has not been loaded', 'yellow', self.ct))
+        else:
+            print('Updated %.1f hours ago (refreshed when older than %g hours)' % (
+                age / 3600., self.metadata_ttl))
+
 
     def do_show_db(self, arg):
         """
@@ -838,7 +1754,14 @@ class DatabaseActions(object):
         """
         Return the tuple (schema,table,link) that can be used to
         locate the fundamental definition of the table requested.
+        Resolved names are kept for the session (and saved with the
+        metadata cache).
         """
+        tablename = tablename.upper()
+        resolved = self.resolved_tables.get(tablename)
+        if resolved is not None:
+            return tuple(resolved)
+
         table = tablename
         schema = self.user.upper()  # default --- Mine
         link = ""  # default no link
@@ -848,48 +1771,54 @@ class DatabaseActions(object):
         if "@" in table:
             (table, link) = table.split("@")
 
-        # Loop until we find a fundamental definition OR determine there is
-        # no reachable fundamental definition, follow links and resolve
-        # schema names. Rely on how the DES database is constructed we log
-        # into our own schema, and rely on synonyms for a "simple" view of
-        # common schema.
-
+        # Rely on how the DES database is constructed we log into our own
+        # schema, and rely on synonyms (own or public) for a "simple" view
+        # of common schema. The whole chain of synonyms is followed in one
+        # query, a new one is needed only when it goes through a DB link.
+        # As with one query per step, the synonyms are those of the user at
+        # that side of the link (USER_SYNONYMS), a public synonym is used
+        # only if the user has none with that name, and the closest table
+        # in the chain is the one found.
         while (1):
-            # check for fundamental definition  e.g. schema.table@link
-            q = """
-            select count(*) from ALL_TAB_COLUMNS%s
-            where OWNER = '%s' and TABLE_NAME = '%s'
-            """ % ("@" + link if link else "", schema, table)
-            ans = self.query_results(q)
-            if ans[0][0] > 0:
-                # found real definition return the tuple
-                return (schema, table, link)
-
-            # check if we are indirect by synonym of user
             q = """
-            select TABLE_OWNER, TABLE_NAME, DB_LINK from USER_SYNONYMS%s
-            where SYNONYM_NAME = '%s'
-            """ % ("@" + link if link else "", table)
-            ans = self.query_results(q)
-            if len(ans) == 1:
-                # resolved one step closer to fundamental definition
-                (schema, table, link) = ans[0]
+            select :schema, :tname, null, 0, 1 from dual
+            where exists (select 1 from ALL_TAB_COLUMNS%(link)s
+                          where OWNER = :schema and TABLE_NAME = :tname)
+            union all
+            select s.*, (select count(*) from ALL_TAB_COLUMNS%(link)s c
+                         where c.OWNER = s.TABLE_OWNER and c.TABLE_NAME = s.TABLE_NAME
+                         and rownum = 1)
+            from (select TABLE_OWNER, TABLE_NAME, DB_LINK, level LVL
+                  from (select SYNONYM_NAME, TABLE_OWNER, TABLE_NAME, DB_LINK
+                        from USER_SYNONYMS%(link)s
+                        union all
+                        select SYNONYM_NAME, TABLE_OWNER, TABLE_NAME, DB_LINK
+                        from ALL_SYNONYMS%(link)s p
+                        where OWNER = 'PUBLIC' and not exists (
+                            select 1 from USER_SYNONYMS%(link)s u
+                            where u.SYNONYM_NAME = p.SYNONYM_NAME))
+                  start with SYNONYM_NAME = :tname
+                  connect by nocycle SYNONYM_NAME = prior TABLE_NAME
+                  and prior DB_LINK is null) s
+            """ % dict(link="@" + link if link else "")
+            self.cur.execute(q, schema=schema, tname=table)
+            # one synonym per name: a single chain, closest first
+            ans = sorted(self.cur.fetchall(), key=lambda row: row[3])
+            found = [row for row in ans if row[4] and not row[2]]
+            if found:
+                # found real definition
+                (schema, table) = found[0][:2]
+                break
+            hops = [row for row in ans if row[2]]
+            if hops:
+                # resolved up to a DB link, continue at the other side
+                (schema, table, link) = hops[0][:3]
                 continue
-
-            # check if we are indirect by a public synonym
-            q = """
-            select TABLE_OWNER, TABLE_NAME, DB_LINK from ALL_SYNONYMS%s
-            where SYNONYM_NAME = '%s' AND OWNER = 'PUBLIC'
-            """ % ("@" + link if link else "", table)
-            ans = self.query_results(q)
-            if len(ans) == 1:
-                # resolved one step closer to fundamental definition
-                (schema, table, link) = ans[0]
-                continue
-
             # failed to find the reference to the table
             # no such table accessible by user
-            break
+            msg = "No table found for: %s" % tablename
+            raise Exception(msg)
 
-        msg = "No table found for: %s" % tablename
-        raise Exception(msg)
+        with self.metadata_lock:
+            self.resolved_tables[tablename] = (schema, table, link or "")
+        return (schema, table, link or "")
@@ -1,5 +1,6 @@
 from easyaccess.eautils.ea_utils import *
 import easyaccess.config_ea as config_mod
+from easyaccess.eautils.meta_utils import MetadataCache, search_names, sql_search
 import pandas as pd
 import os
 import sys
@@ -110,6 +111,13 @@ class DesActions(object):
                 os._exit(0)
             self.cur = self.con.cursor()
             self.cur.arraysize = int(self.prefetch)
+            with self.metadata_lock:
+                # a background refresh of the previous DB is discarded
+                self.metadata_cache = MetadataCache(self.dbname, self.user)
+                self.resolved_tables = {}
+                self.metadata_status = 'not loaded'
+            self.table_columns.clear()
+            self.table_descriptions.clear()
             print()
             print("Run refresh_metadata_cache to reload the auto-completion metatada")
             self.set_messages()
@@ -151,27 +159,44 @@ class DesActions(object):
         self.query_and_print(query, print_time=False, clear=True)
 
     def complete_find_user(self, text, line, start_index, end_index):
-        options_users = self.cache_usernames
-        if text:
-            return [option for option in options_users if option.startswith(text.lower())]
-        else:
-            return options_users
+        return self.user_index.complete(text.lower())
 
     def do_find_tables_with_column(self, arg):
         """
-        DB:Finds tables having a column name matching column-name-string.
+        DB:Finds tables having a column name matching column-name-string,
+        an oracle pattern, a regular expression or a name (the closest
+        names if there is no column with it), best matches first.
+
+        The columns are searched in the auto-completion metadata, the DB is
+        queried (the same matches, but no closest names) when it is older
+        than the metadata_ttl config option or with --server
 
-        Usage: find_tables_with_column  <column-name-substring>
+        Usage: find_tables_with_column  <column-name-substring> [--server]
         Example: find_tables_with_column %MAG%  # hunt for columns with MAG
+                 find_tables_with_column ^MAG_AUTO_[GRIZ]$
         """
+        arg = arg.replace(';', '')
+        server = '--server' in arg.split()
+        arg = ' '.join(word for word in arg.split() if word != '--server')
         if arg == '':
             return self.do_help('find_tables_with_column')
+        if not server and self.metadata_is_fresh() and self.columns_by_table:
+            tables_by_column = {}
+            for table, columns in self.columns_by_table.items():
+                for column in columns:
+                    tables_by_column.setdefault(column, []).append(table)
+            rows = [(table, column) for column in search_names(tables_by_column, arg)
+                    for table in sorted(tables_by_column[column])]
+            data = pd.DataFrame(rows, columns=['TABLE_NAME', 'COLUMN_NAME'])
+            return self.print_found(data, extra="")
+        condition, order = sql_search('t.column_name', arg)
         query = """
            SELECT t.owner || '.' || t.table_name as table_name, t.column_name
            FROM all_tab_cols t, DES_ADMIN.CACHE_TABLES d
-           WHERE t.column_name LIKE '%s'
+           WHERE %s
            AND t.owner || '.' || t.table_name = d.table_name
-           """ % (arg.upper())
+           ORDER BY %s, 1
+           """ % (condition, order)
 
         self.query_and_print(query)
         return
@@ -236,8 +261,4 @@ class DesActions(object):
 
 
     def complete_user_tables(self, text, line, start_index, end_index):
-        options_users = self.cache_usernames
-        if text:
-            return [option for option in options_users if option.startswith(text.lower())]
-        else:
-            return options_users
+        return self.user_index.complete(text.lower())
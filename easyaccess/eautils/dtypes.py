@@ -166,6 +166,37 @@ def numpy2oracle(dtype):
         # raise ValueError(msg)
 
 
+def numpy2cxoracle(dtype):
+    """Takes a numpy dtype object and converts to the cx_Oracle bind type
+    to be passed to `cursor.setinputsizes`.
+
+    Parameters:
+    ----------
+    dtype: Numpy dtype object
+
+    Returns:
+    --------
+    btype: cx_Oracle type, maximum string size or None (cx_Oracle decides
+           from the values)
+    """
+    kind = dtype.kind
+    size = dtype.itemsize
+
+    if (kind == 'f'):
+        return or_f
+    elif (kind == 'i' or kind == 'u' or kind == 'b'):
+        return or_n
+    elif (kind == 'S'):
+        return max(size, 1)
+    elif (kind == 'U'):
+        # numpy unicode uses 4 bytes per character
+        return max(size // 4, 1)
+    elif (kind == 'M'):
+        return or_ts
+    else:
+        return None
+
+
 def numpy2desdm(desc):
     """
     Impose DESDM typing conventions based on column name.
@@ -9,7 +9,13 @@ pandas:
 
 """
 import os
+import bz2
 import datetime
+import glob
+import gzip
+import hashlib
+import json
+import time
 import numpy as np
 import pandas as pd
 import fitsio
@@ -22,6 +28,17 @@ try:
 except ImportError:
     def colored(line, color): return line
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
 PANDAS_DEFS = ('comma separated text', 'space separated tex', 'HDF5 format')
 PANDAS_EXTS = ('.csv', '.tab', '.h5')
 
@@ -33,6 +50,46 @@ GZIP_EXTS = ('.fits', '.csv', '.tab')
 FILE_DEFS = PANDAS_DEFS + FITS_DEFS
 FILE_EXTS = PANDAS_EXTS + FITS_EXTS
 
+# Input only formats (need pyarrow)
+ARROW_DEFS = ('Parquet format', 'Arrow IPC format', 'Feather format')
+ARROW_EXTS = ('.parquet', '.arrow', '.feather')
+
+INPUT_EXTS = FILE_EXTS + ARROW_EXTS
+
+# Compressed input files (e.g. 'catalog.csv.gz'), read as a stream
+COMPRESSION_EXTS = ('.gz', '.bz2', '.xz')
+COMPRESSED_INPUT_EXTS = ('.csv', '.tab', '.fits')
+
+
+def split_ext(filename):
+    """
+    Split a filename into base, extension and compression extension,
+    e.g. 'catalog.csv.gz' -> ('catalog', '.csv', '.gz')
+    """
+    base, ext = os.path.splitext(filename)
+    comp = ''
+    if ext.lower() in COMPRESSION_EXTS:
+        comp = ext.lower()
+        base, ext = os.path.splitext(base)
+    return base, ext, comp
+
+
+def open_compressed(filename):
+    """
+    Open a (possibly compressed) file for reading in binary mode. The
+    data is decompressed as it is read.
+    """
+    comp = split_ext(filename)[2]
+    if comp == '.gz':
+        return gzip.open(filename, 'rb')
+    if comp == '.bz2':
+        return bz2.BZ2File(filename, 'rb')
+    if comp == '.xz':
+        if lzma is None:
+            raise IOError('The lzma module is needed to read %s' % filename)
+        return lzma.open(filename, 'rb')
+    return open(filename, 'rb')
+
 
 def get_filename(line):
     """
@@ -48,8 +105,8 @@ def get_filename(line):
 
     filename = "".join(line.split())
     basename = os.path.basename(filename)
-    alls = basename.split('.')
-    if len(alls) > 2:
+    alls = split_ext(basename)[0].split('.')
+    if len(alls) > 1:
         # Oracle tables cannot contain a '.'
         print("\nDo not use extra '.' in filename\n")
         return
@@ -57,7 +114,42 @@ def get_filename(line):
     return filename
 
 
-def get_chunksize(filename, memory=500):
+def expand_files(pattern):
+    """
+    Input files matching a glob pattern (e.g. 'tiles/*.fits') or inside a
+    directory, sorted by name. Returns None if 'pattern' is a single file.
+    """
+    pattern = pattern.replace(';', '').strip().strip('\'"')
+    if os.path.isdir(pattern):
+        files = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+    elif any(char in pattern for char in '*?['):
+        files = glob.glob(pattern)
+    else:
+        return None
+    return sorted(f for f in files if os.path.isfile(f) and split_ext(f)[1] in INPUT_EXTS)
+
+
+def get_columns(filename):
+    """
+    Column names of an input file (from the header, or the first row of
+    text and HDF5 files)
+    """
+    data, iterator = read_file(filename)
+    reader = ChunkReader(data, iterator)
+    try:
+        if data.file_type == 'fits':
+            return data[1].get_colnames()
+        if data.file_type in ('fits_stream', 'arrow'):
+            return data.get_colnames()
+        chunk = reader.read(1)
+    finally:
+        reader.close()
+    if chunk is None:
+        return []
+    return chunk.columns
+
+
+def get_chunksize(filename, memory=500, columns=None, prepared=False):
     """
     Get the approximate number of lines ot be read given memory constrains
 
@@ -65,32 +157,88 @@ def get_chunksize(filename, memory=500):
     -----------
     filename : File name
     memory   : Memory in MB to compute the approximate number of rows
+    columns  : Only count these columns (default all)
+    prepared : Also count the python rows built for the insert (see
+               Chunk.prepare), which are kept next to the arrays
 
     Returns:
     --------
     The number of rows need to be read for each chunk of memory
     """
-    base, ext = os.path.splitext(filename)
-    check_filetype(ext, FILE_EXTS)
+    base, ext, comp = split_ext(filename)
+    check_filetype(ext, INPUT_EXTS)
 
+    sample = None
     if ext in PANDAS_EXTS:
+        temp = None
         if ext == '.csv':
             sepa = ','
         elif ext == '.tab':
             sepa = None
-        elif ext == '.h5':
-            return IOError('\nReading HDF5 files by chunks is not supported yet\n')
-        temp = pd.read_csv(filename, sep=sepa, nrows=100)
-        bytes_per_row = temp.memory_usage(index=True).sum() / 100.
-        del temp
+        if ext == '.h5':
+            with pd.HDFStore(filename, mode='r') as store:
+                storer = store.get_storer('data')
+                if storer.is_table and columns is None and not prepared:
+                    # size of the rows as stored, index included
+                    bytes_per_row = float(storer.table.dtype.itemsize)
+                else:
+                    temp = store.select('data', stop=100)
+        else:
+            temp = pd.read_csv(filename, sep=sepa, nrows=100)
+        if temp is not None:
+            if columns is not None:
+                temp = temp[select_columns(temp.columns.values.tolist(), columns)]
+            bytes_per_row = temp.memory_usage(index=True).sum() / float(max(len(temp), 1))
+            sample = [temp[name].values for name in temp.columns]
+            del temp
+    elif ext in FITS_EXTS and comp:
+        temp = FitsStream(filename)
+        names = select_columns(temp.get_colnames(), columns)
+        bytes_per_row = float(sum(temp.dtype[name].itemsize for name in names))
+        if prepared:
+            data = temp.read(100, names)
+            if data is not None:
+                sample = [data[name] for name in names]
+        temp.close()
     elif ext in FITS_EXTS:
         temp = fitsio.FITS(filename)
-        temp_data = temp[1][0:100]
+        if columns is not None:
+            temp_data = temp[1][select_columns(temp[1].get_colnames(), columns)][0:100]
+        else:
+            temp_data = temp[1][0:100]
         bytes_per_row = temp_data.nbytes / 100.
+        sample = [temp_data[name] for name in temp_data.dtype.names]
         temp.close()
         del temp_data
+    elif ext in ARROW_EXTS:
+        temp = ArrowFile(filename)
+        batch = next(temp.batches(select_columns(temp.get_colnames(), columns)), None)
+        temp.close()
+        if batch is None or batch.num_rows == 0:
+            return 1
+        bytes_per_row = batch.nbytes / float(batch.num_rows)
+        if prepared:
+            sample = [batch.column(i).to_pandas().values for i in range(batch.num_columns)]
 
-    return int(memory * 1024**2 / bytes_per_row)
+    if prepared and sample:
+        bytes_per_row += prepared_row_bytes(sample)
+    return max(int(memory * 1024**2 / bytes_per_row), 1)
+
+
+def prepared_row_bytes(arrays):
+    """
+    Average size in bytes of a row converted for the insert (the tuple
+    and the python values built by Chunk.prepare) for a sample of columns.
+    Shared objects (None, small integers) are counted every time, so it
+    is an upper bound.
+    """
+    if len(arrays) == 0 or len(arrays[0]) == 0:
+        return 0.
+    rows = Chunk(None, arrays).prepare().rows
+    total = 0
+    for row in rows:
+        total += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+    return total / float(len(rows))
 
 
 def cutquery(query, length):
@@ -126,13 +274,17 @@ def unrecognized_filetype(filename, types=None):
     return msg
 
 
-def check_filetype(filename, types=None):
+def check_filetype(filename, types=None, compressed=False):
     """
     Check file extension against allowed types.
 
     Parameters:
     -----------
-    filename : Name (or extension) of file
+    filename   : Name (or extension) of file
+    types      : Allowed extensions (default 'FILE_EXTS')
+    compressed : Also allow a compression extension ('COMPRESSION_EXTS'),
+                 only for input files. Output files are compressed with
+                 the 'compression' config option instead.
 
     Returns:
     --------
@@ -141,11 +293,14 @@ def check_filetype(filename, types=None):
     if types is None:
         types = FILE_EXTS
     # Try to split the filename
-    base, ext = os.path.splitext(filename)
+    base, ext, comp = split_ext(filename)
     # Also allow just the file extension
     if ext == '':
         ext = base
 
+    if comp and not compressed:
+        raise IOError("Compressed output files are not supported (%s), use the '%s' "
+                      "extension and 'config compression set yes'" % (comp, ext))
     if ext not in types:
         msg = unrecognized_filetype(ext, types)
         raise IOError(msg)
@@ -153,7 +308,90 @@ def check_filetype(filename, types=None):
         return True
 
 
-def write_file(filename, data, desc, fileindex=1, mode='w', max_mb=1000, query='', comp=False):
+class ExportManifest(object):
+    """
+    Keep track of the files (shards) written for a query and write a
+    JSON manifest with their row ranges, sizes and checksums.
+
+    Checksums are computed while the data is being written (no second
+    pass over the files). For uncompressed '.csv' and '.tab' files this
+    is the md5 of the file itself; for compressed text files it is the
+    md5 of the uncompressed content and for '.fits' and '.h5' files it
+    is the md5 of the table records.
+
+    Parameters:
+    -----------
+    filename : Output filename as given by the user
+    query    : Query used to generate the data
+    comp     : Compression (gzip) is used
+    """
+
+    def __init__(self, filename, query='', comp=False):
+        base, ext = os.path.splitext(filename)
+        self.filename = base + '.manifest.json'
+        self.query = query
+        self.ext = ext
+        self.comp = comp and ext in GZIP_EXTS
+        self.created = datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
+        self.t1 = time.time()
+        self.total_rows = 0
+        self.shards = []
+        self._digests = {}
+
+    def add(self, shard, nrows):
+        """
+        Record 'nrows' rows being written to 'shard'. Returns the hashlib
+        object to be updated with the data written.
+        """
+        if shard not in self._digests:
+            self.shards.append({'file': shard, 'first_row': self.total_rows, 'rows': 0})
+            self._digests[shard] = hashlib.md5()
+        self.shards[-1]['rows'] += nrows
+        self.total_rows += nrows
+        return self._digests[shard]
+
+    def rename(self, old, new):
+        """
+        Follow a shard that has been renamed (i.e., first file moved to _000001)
+        """
+        for entry in self.shards:
+            if entry['file'] == old:
+                entry['file'] = new
+        if old in self._digests:
+            self._digests[new] = self._digests.pop(old)
+
+    def write(self):
+        """
+        Write the manifest file next to the output files and return its name.
+        """
+        if self.ext in ('.csv', '.tab'):
+            scope = 'uncompressed content' if self.comp else 'file'
+        else:
+            scope = 'records'
+        shards = []
+        for entry in self.shards:
+            shard = dict(entry)
+            shard['last_row'] = shard['first_row'] + shard['rows'] - 1
+            shard['bytes'] = os.path.getsize(shard['file'])
+            shard['md5'] = self._digests[shard['file']].hexdigest()
+            shard['file'] = os.path.basename(shard['file'])
+            shards.append(shard)
+        manifest = {'easyaccess': version.__version__,
+                    'query': self.query,
+                    'format': self.ext,
+                    'compression': 'gzip' if self.comp else None,
+                    'created': self.created,
+                    'elapsed_seconds': round(time.time() - self.t1, 3),
+                    'total_rows': self.total_rows,
+                    'checksum': {'algorithm': 'md5', 'scope': scope},
+                    'shards': shards}
+        with open(self.filename, 'w') as fout:
+            json.dump(manifest, fout, indent=2)
+        return self.filename
+
+
+def write_file(filename, data, desc, fileindex=1, mode='w', max_mb=1000, query='', comp=False,
+               manifest=None):
     """
     Write a pandas DataFrame to a file. Append to existing file as
     long as smaller than specified size.  Create a new file (and
@@ -171,6 +409,7 @@ def write_file(filename, data, desc, fileindex=1, mode='w', max_mb=1000, query='
     max_mb :   Maximum file size.
     query :    Query used to generate data
     comp  :    Use compresion (gzip)
+    manifest : ExportManifest object to record the written rows (optional)
 
     Returns:
     fileindex: The (possibly incremented) fileindex.
@@ -202,6 +441,8 @@ def write_file(filename, data, desc, fileindex=1, mode='w', max_mb=1000, query='
                     filename += '.gz'
                     lastfile += '.gz'
                 os.rename(filename, lastfile)
+                if manifest is not None:
+                    manifest.rename(filename, lastfile)
 
             # and make a new filename, after incrementing
             fileindex += 1
@@ -216,15 +457,21 @@ def write_file(filename, data, desc, fileindex=1, mode='w', max_mb=1000, query='
             fileout = thisfile
             header = False
 
+    digest = None
+    if manifest is not None:
+        digest = manifest.add(fileout, len(data))
     if ext in PANDAS_EXTS:
-        write_pandas(fileout, data, fileindex, mode=mode, header=header, query=query, comp=comp)
+        write_pandas(fileout, data, fileindex, mode=mode, header=header, query=query, comp=comp,
+                     digest=digest)
     if ext in FITS_EXTS:
-        write_fitsio(fileout, data, desc, fileindex, mode=mode, query=query, comp=comp)
+        write_fitsio(fileout, data, desc, fileindex, mode=mode, query=query, comp=comp,
+                     digest=digest)
 
     return fileindex
 
 
-def write_pandas(filename, df, fileindex, mode='w', header=True, query='', comp=False):
+def write_pandas(filename, df, fileindex, mode='w', header=True, query='', comp=False,
+                 digest=None):
     """
     Write a pandas DataFrame to a file. Accepted file extension are
     defined by 'PANDAS_EXTS'.
@@ -236,6 +483,7 @@ def write_pandas(filename, df, fileindex, mode='w', header=True, query='', comp=
     fileindex: Index of this file (modifies filename based on maxfilesize)
     mode :     Write mode: 'w'=write, 'a'=append
     header :   Write header information
+    digest :   hashlib object updated with the data being written (optional)
 
     Returns:
     --------
@@ -246,22 +494,21 @@ def write_pandas(filename, df, fileindex, mode='w', header=True, query='', comp=
     # convert b to unicode (python 3) for convenience
     if sys.version_info[0] == 3:
         for col in df:
-            if df[col].dtype == np.object:
+            if df[col].dtype == object:
                 df[col] = df[col].str.decode('utf-8')
-    if ext == '.csv':
-        if comp:
-            df.to_csv(filename, index=False, float_format='%.8f', sep=',',
-                      mode=mode, header=header,compression='gzip')
-        else:
-            df.to_csv(filename, index=False, float_format='%.8f', sep=',',
-                      mode=mode, header=header, encoding='utf-8')
-    if ext == '.tab':
+    if ext in ('.csv', '.tab'):
+        sepa = ',' if ext == '.csv' else ' '
+        # Render the text once so the same bytes are written and checksummed
+        text = df.to_csv(None, index=False, float_format='%.8f', sep=sepa, header=header)
+        text = text.encode('utf-8')
+        if digest is not None:
+            digest.update(text)
         if comp:
-            df.to_csv(filename, index=False, float_format='%.8f', sep=' ',
-                      mode=mode, header=header,compression='gzip')
+            fout = gzip.open(filename, mode + 'b')
         else:
-            df.to_csv(filename, index=False, float_format='%.8f', sep=' ',
-                      mode=mode, header=header, encoding='utf-8')
+            fout = open(filename, mode + 'b')
+        with fout:
+            fout.write(text)
     if ext == '.h5':
         if mode == 'w':
             append = False
@@ -274,6 +521,8 @@ def write_pandas(filename, df, fileindex, mode='w', header=True, query='', comp=
             except:
                 nrows = 0
         df.index = pd.Series(df.index) + nrows
+        if digest is not None:
+            digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
         if comp:
             df.to_hdf(filename, 'data', mode=mode, format='t', append=append,
                       data_columns=True, complevel=9, complib='bzip2')
@@ -282,7 +531,7 @@ def write_pandas(filename, df, fileindex, mode='w', header=True, query='', comp=
                       data_columns=True)
 
 
-def write_fitsio(filename, df, desc, fileindex, mode='w', query='', comp=False):
+def write_fitsio(filename, df, desc, fileindex, mode='w', query='', comp=False, digest=None):
     """
     Write a pandas DataFrame to a FITS binary table using fitsio.
 
@@ -297,7 +546,8 @@ def write_fitsio(filename, df, desc, fileindex, mode='w', query='', comp=False):
     fileindex: Index of this file (modifies filename based on maxfilesize)
     mode :     Write mode: 'w'=write, 'a'=append
     query :    Query used to create file
-    comp :     Compression 
+    comp :     Compression
+    digest :   hashlib object updated with the records being written (optional)
 
     Returns:
     --------
@@ -328,6 +578,8 @@ def write_fitsio(filename, df, desc, fileindex, mode='w', query='', comp=False):
             arr[name] = np.array(df[name].values.tolist())
         else:
             arr[name][:] = df[name].values
+    if digest is not None:
+        digest.update(arr.tobytes())
 
     # write or append...
     if mode == 'w':
@@ -353,12 +605,14 @@ def write_fitsio(filename, df, desc, fileindex, mode='w', query='', comp=False):
 
 def read_file(filename):
     """
-    Read an input file with pandas or fitsio.
+    Read an input file with pandas, fitsio or pyarrow.
 
     Unfortunately, the conversion between pandas and numpy is too slow
     to put data into a consistent framework.
 
-    Accepted file extensions are defined by 'FILE_EXTS'.
+    Accepted file extensions are defined by 'INPUT_EXTS'. Text and FITS
+    files can also be compressed ('COMPRESSION_EXTS'), they are then
+    decompressed while they are read.
 
     Parameters:
     ----------
@@ -366,15 +620,20 @@ def read_file(filename):
 
     Returns:
     --------
-    data    : pandas.DataFrame or fitsio.FITS object
+    data    : pandas, fitsio.FITS, FitsStream or ArrowFile object
     """
-    base, ext = os.path.splitext(filename)
-    check_filetype(ext, FILE_EXTS)
+    base, ext, comp = split_ext(filename)
+    check_filetype(ext, INPUT_EXTS)
+    if comp and ext not in COMPRESSED_INPUT_EXTS:
+        raise IOError("Compressed '%s' files are not supported, only: %s" %
+                      (ext, ', '.join(COMPRESSED_INPUT_EXTS)))
 
     if ext in PANDAS_EXTS:
         data = read_pandas(filename)
     elif ext in FITS_EXTS:
         data = read_fitsio(filename)
+    elif ext in ARROW_EXTS:
+        data = read_arrow(filename)
     else:
         raise IOError()
     return data
@@ -392,13 +651,530 @@ def get_dtypes(df):
     if df.file_type == 'fits':
         dtype = df[1].get_rec_dtype(vstorage='fixed')[0]
         dtypes = [dtype[i] for i, d in enumerate(dtype.descr)]
+
+    if df.file_type == 'fits_stream':
+        dtypes = [df.dtype[name] for name in df.get_colnames()]
+
+    if df.file_type == 'chunk':
+        dtypes = []
+        for array in df.arrays:
+            if array.dtype.kind == 'O':
+                dtypes.append(np.dtype('S' + str(max_strlen(array))))
+            elif array.dtype.kind == 'U':
+                dtypes.append(np.dtype('S' + str(max(array.dtype.itemsize // 4, 1))))
+            else:
+                dtypes.append(array.dtype)
     return dtypes
 
 
+def merge_dtypes(dtype1, dtype2):
+    """
+    Widen two dtypes of the same column (e.g. from different chunks) to
+    one that can hold the values of both.
+
+    Parameters:
+    ----------
+    dtype1, dtype2 : numpy dtypes
+
+    Returns:
+    --------
+    dtype : numpy dtype
+    """
+    if dtype1 == dtype2:
+        return dtype1
+    kind1, kind2 = dtype1.kind, dtype2.kind
+    if kind1 == 'S' and kind2 == 'S':
+        return np.dtype('S%d' % max(dtype1.itemsize, dtype2.itemsize))
+    if kind1 in 'biuf' and kind2 in 'biuf':
+        if 'f' in (kind1, kind2):
+            return np.dtype('f8')
+        return np.dtype('i8')
+    if kind1 == 'M' and kind2 == 'M':
+        return np.dtype('M8[ns]')
+    # mixed numbers and strings are kept as strings long enough for both
+    return np.dtype('S%d' % max(dtype1.itemsize, dtype2.itemsize, 32))
+
+
+def scan_dtypes(filename, columns=None, chunksize=100000):
+    """
+    Read a whole file by chunks to find column types valid for all the
+    rows: strings as long as the longest one, integers with nulls as floats.
+
+    Parameters:
+    ----------
+    filename  : Input filename
+    columns   : List of columns to scan (default all)
+    chunksize : Number of rows read at a time
+
+    Returns:
+    --------
+    names  : List of column names
+    dtypes : List of numpy dtypes
+    nrows  : Number of rows in the file
+    """
+    data, iterator = read_file(filename)
+    reader = ChunkReader(data, iterator, chunksize, columns=columns)
+    names, dtypes, nrows = [], None, 0
+    try:
+        for chunk in reader:
+            chunk_dtypes = get_dtypes(chunk)
+            if dtypes is None:
+                names, dtypes = chunk.columns, chunk_dtypes
+            else:
+                dtypes = [merge_dtypes(d1, d2) for d1, d2 in zip(dtypes, chunk_dtypes)]
+            nrows += len(chunk)
+    finally:
+        reader.close()
+    return names, dtypes, nrows
+
+
+def schema_path(filename):
+    """
+    File caching the schema of an input file (see file_schema), in
+    ~/.easyaccess/schemas and named after the absolute path of the file,
+    so nothing is written next to the data.
+    """
+    key = hashlib.sha1(os.path.abspath(filename).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(os.path.expanduser('~'), '.easyaccess', 'schemas',
+                        '%s_%s.json' % (os.path.basename(filename), key))
+
+
+def get_schema(filename, columns=None, chunksize=None):
+    """
+    Column types for a whole input file (see file_schema).
+
+    Parameters:
+    ----------
+    filename  : Input filename
+    columns   : List of columns (default all)
+    chunksize : Number of rows read at a time while scanning
+
+    Returns:
+    --------
+    dtypes : List of numpy dtypes, one per column
+    """
+    names, dtypes = file_schema(filename, chunksize)
+    lookup = dict(zip(names, dtypes))
+    return [lookup[name] for name in select_columns(names, columns)]
+
+
+def file_schema(filename, chunksize=None):
+    """
+    Names and types of all the columns of an input file (see scan_dtypes).
+    The result is cached in ~/.easyaccess/schemas (see schema_path) and
+    used as long as the size and modification time of the file do not
+    change. FITS files (also compressed ones) are not scanned, the types
+    are taken from the header.
+
+    Parameters:
+    ----------
+    filename  : Input filename
+    chunksize : Number of rows read at a time while scanning
+
+    Returns:
+    --------
+    names  : List of column names
+    dtypes : List of numpy dtypes, one per column
+    """
+    base, ext, comp = split_ext(filename)
+    if ext in FITS_EXTS and comp:
+        fits = FitsStream(filename)
+        fits.close()
+        names = fits.get_colnames()
+        return names, [fits.dtype[name] for name in names]
+    if ext in FITS_EXTS:
+        fits = fitsio.FITS(filename)
+        try:
+            hdu = fits[1]
+            dtype = hdu.get_rec_dtype(vstorage='fixed')[0]
+            names = hdu.get_colnames()
+        finally:
+            fits.close()
+        return names, [dtype[name] for name in names]
+
+    stat = os.stat(filename)
+    path = schema_path(filename)
+    schema = None
+    if os.path.exists(path):
+        try:
+            with open(path) as fin:
+                schema = json.load(fin)
+            if schema['size'] != stat.st_size or schema['mtime'] != stat.st_mtime:
+                schema = None
+        except (IOError, ValueError, KeyError):
+            schema = None
+    if schema is None:
+        # always the whole file, so the cache is valid for any set of columns
+        names, dtypes, nrows = scan_dtypes(filename, None, chunksize or 100000)
+        schema = {'easyaccess': version.__version__,
+                  'file': os.path.abspath(filename),
+                  'size': stat.st_size,
+                  'mtime': stat.st_mtime,
+                  'rows': nrows,
+                  'columns': names,
+                  'dtypes': [dtype.str for dtype in dtypes]}
+        try:
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as fout:
+                json.dump(schema, fout, indent=2)
+        except (IOError, OSError):
+            pass
+    return list(schema['columns']), [np.dtype(str(dtype)) for dtype in schema['dtypes']]
+
+
+def max_strlen(array):
+    """
+    Maximum length of the strings in an object array (ignoring nulls)
+    """
+    length = pd.Series(array).str.len().max()
+    if pd.isnull(length) or length < 1:
+        return 1
+    return int(length)
+
+
+def has_nulls(array):
+    """
+    True if a column has null values (None, NaN or NaT)
+    """
+    if array.dtype.kind not in 'OfcmM':
+        return False
+    return bool(pd.isnull(array).any())
+
+
+def column_values(array):
+    """
+    Convert a numpy column into a list of python values that cx_Oracle can
+    bind directly: strings are decoded, nulls are None, booleans are 0/1
+    and datetimes are datetime objects. The conversion is done for the
+    whole column at once.
+
+    Parameters:
+    ----------
+    array : numpy array
+
+    Returns:
+    --------
+    values : list
+    """
+    kind = array.dtype.kind
+    if kind == 'S' and sys.version_info[0] == 3:
+        array = np.char.decode(array, 'utf-8')
+    elif kind == 'O':
+        array = np.where(pd.isnull(array), None, array)
+    elif kind == 'M':
+        array = array.astype('datetime64[us]')
+    elif kind == 'b':
+        array = array.astype(np.int8)
+    return array.tolist()
+
+
+def bind_size(array):
+    """
+    cx_Oracle bind type of a column for `setinputsizes` (see
+    dtypes.numpy2cxoracle). Object columns holding strings (as read by
+    pandas) are bound as strings of their maximum length.
+
+    Parameters:
+    ----------
+    array : numpy array
+
+    Returns:
+    --------
+    cx_Oracle type, maximum string size or None (cx_Oracle decides from the values)
+    """
+    size = eatypes.numpy2cxoracle(array.dtype)
+    if size is None and array.dtype.kind == 'O' and \
+            pd.api.types.infer_dtype(array, skipna=True) in ('string', 'empty'):
+        return max_strlen(array)
+    return size
+
+
+def select_columns(available, columns=None):
+    """
+    Match the requested column names (case insensitive) with the ones in
+    a file, keeping the requested order.
+
+    Parameters:
+    ----------
+    available : List of column names in the file
+    columns   : List of requested column names (default all)
+
+    Returns:
+    --------
+    names : List of column names as written in the file
+    """
+    if columns is None:
+        return list(available)
+    lookup = dict((name.upper(), name) for name in available)
+    missing = [c for c in columns if c.upper() not in lookup]
+    if missing:
+        raise ValueError('Columns not found in file: %s' % ', '.join(missing))
+    return [lookup[c.upper()] for c in columns]
+
+
+def fits_memmap(hdu):
+    """
+    Memory-mapped view of the rows of an uncompressed FITS binary table,
+    so only the bytes of the requested rows and columns are read from disk.
+    Values keep the FITS (big-endian) byte order; they are converted when
+    bound to the insert.
+
+    Returns None when fitsio has to decode the values: compressed files,
+    variable-length, logical or bit columns and scaled (TZERO/TSCAL) columns.
+
+    Parameters:
+    ----------
+    hdu : fitsio TableHDU
+
+    Returns:
+    --------
+    rows : numpy.memmap with one record per row, or None
+    """
+    filename = hdu.get_filename()
+    if hdu.get_exttype() != 'BINARY_TBL' or os.path.splitext(filename)[1] not in FITS_EXTS:
+        return None
+    header = hdu.read_header()
+    nrows = header.get('NAXIS2', 0)
+    if nrows == 0:
+        return None
+    for i in range(1, header.get('TFIELDS', 0) + 1):
+        tform = str(header.get('TFORM%d' % i, '')).upper()
+        if any(code in tform for code in ('L', 'X', 'P', 'Q')):
+            return None
+        if header.get('TZERO%d' % i, 0) != 0 or header.get('TSCAL%d' % i, 1) != 1:
+            return None
+    dtype, offsets, isvar = hdu.get_rec_dtype(vstorage='fixed')
+    if np.any(isvar):
+        return None
+    rowtype = np.dtype({'names': list(dtype.names),
+                        'formats': [dtype[i] for i in range(len(dtype.names))],
+                        'offsets': [int(o) for o in offsets],
+                        'itemsize': header['NAXIS1']})
+    return np.memmap(filename, dtype=rowtype, mode='r',
+                     offset=hdu.get_offsets()['data_start'], shape=(nrows,))
+
+
+class Chunk(object):
+    """
+    Block of rows read from an input file, stored column by column.
+
+    Parameters:
+    ----------
+    columns : List of column names
+    arrays  : List of numpy arrays, one per column
+    start   : Index of the first row of the chunk in the file
+    """
+    file_type = 'chunk'
+
+    def __init__(self, columns, arrays, start=0):
+        self.columns = columns
+        self.arrays = arrays
+        self.start = start
+        self.rows = None
+
+    def __len__(self):
+        if len(self.arrays) == 0:
+            return 0
+        return len(self.arrays[0])
+
+    def prepare(self):
+        """
+        Convert the columns into the list of rows bound by the insert
+        (see column_values). cx_Oracle's executemany takes one sequence per
+        row, so the rows of the chunk are built here (zipping the columns
+        converted as a whole, not row by row from the file); memory is
+        bounded by the chunk size. It is done only once, so it can be run
+        ahead in another thread while the previous chunk is inserted.
+        """
+        if self.rows is None:
+            self.rows = list(zip(*[column_values(array) for array in self.arrays]))
+        return self
+
+
+class ChunkReader(object):
+    """
+    Read an input file (as returned by 'read_file') in blocks of rows.
+
+    Iterating over the reader returns 'Chunk' objects of 'chunksize'
+    rows (all the remaining rows if None). 'chunksize' can be changed
+    between reads.
+
+    Only the requested columns are returned. FITS binary tables are read
+    through a memory map when possible (see fits_memmap), otherwise with
+    fitsio column reads. Compressed FITS files are read sequentially from
+    the stream (see FitsStream). Parquet/Arrow files are read one row group or
+    record batch at a time ('chunksize' None returns one of them per chunk).
+
+    Parameters:
+    ----------
+    data      : pandas.DataFrame, TextFileReader, HDFStore, fitsio.FITS, FitsStream
+                or ArrowFile
+    iterator  : True if 'data' is read by chunks (pandas TextFileReader)
+    chunksize : Number of rows per chunk
+    columns   : List of column names to read (default all)
+    """
+
+    def __init__(self, data, iterator=True, chunksize=None, columns=None):
+        self.data = data
+        self.iterator = iterator
+        self.chunksize = chunksize
+        self.columns = columns
+        self.names = None
+        self.nread = 0
+        self.done = False
+        self.memmap = None
+        if data.file_type == 'fits':
+            self.memmap = fits_memmap(data[1])
+        self.batches = None
+        self.pending = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        chunk = self.read(self.chunksize)
+        if chunk is None:
+            raise StopIteration
+        return chunk
+
+    next = __next__
+
+    def read(self, nrows=None):
+        """
+        Return the next Chunk with up to 'nrows' rows, or None at the end of the file.
+        """
+        if self.done:
+            return None
+        if self.data.file_type == 'pandas':
+            if isinstance(self.data, pd.HDFStore):
+                stop = None if nrows is None else self.nread + nrows
+                df = self.data.select('data', start=self.nread, stop=stop)
+            elif self.iterator:
+                try:
+                    df = self.data.get_chunk(nrows)
+                except StopIteration:
+                    df = None
+            else:
+                stop = None if nrows is None else self.nread + nrows
+                df = self.data.iloc[self.nread:stop]
+            if df is None or len(df) == 0:
+                self.done = True
+                return None
+            if self.names is None:
+                self.names = select_columns(df.columns.values.tolist(), self.columns)
+            columns = self.names
+            arrays = [df[c].values for c in columns]
+        elif self.data.file_type == 'fits':
+            hdu = self.data[1]
+            total = hdu.get_nrows()
+            stop = total if nrows is None else min(self.nread + nrows, total)
+            if stop <= self.nread:
+                self.done = True
+                return None
+            if self.names is None:
+                self.names = select_columns(hdu.get_colnames(), self.columns)
+            columns = self.names
+            if self.memmap is not None:
+                rec = self.memmap[self.nread:stop]
+            else:
+                rec = hdu[columns][self.nread:stop]
+            arrays = [rec[c] for c in columns]
+        elif self.data.file_type == 'fits_stream':
+            if self.names is None:
+                self.names = select_columns(self.data.get_colnames(), self.columns)
+            columns = self.names
+            values = self.data.read(nrows, columns)
+            if values is None:
+                self.done = True
+                return None
+            arrays = [values[c] for c in columns]
+        elif self.data.file_type == 'arrow':
+            if self.names is None:
+                self.names = select_columns(self.data.get_colnames(), self.columns)
+                self.batches = self.data.batches(self.names)
+            table = self._read_arrow(nrows)
+            if table is None:
+                self.done = True
+                return None
+            columns = self.names
+            arrays = [np.asarray(table.column(c).to_pandas()) for c in columns]
+        else:
+            raise IOError('Unknown file type: %s' % self.data.file_type)
+
+        chunk = Chunk(columns, arrays, start=self.nread)
+        self.nread += len(chunk)
+        return chunk
+
+    def skip(self, nrows):
+        """
+        Skip the next 'nrows' rows (e.g. the ones already uploaded). Files
+        with random access (FITS, HDF5, DataFrames) are not read.
+        """
+        if nrows <= 0:
+            return
+        if self.data.file_type == 'fits' or isinstance(self.data, pd.HDFStore) or (
+                self.data.file_type == 'pandas' and not self.iterator):
+            self.nread += nrows
+            return
+        while nrows > 0:
+            step = min(nrows, 100000)
+            if self.data.file_type == 'arrow':
+                if self.names is None:
+                    self.names = select_columns(self.data.get_colnames(), self.columns)
+                    self.batches = self.data.batches(self.names)
+                table = self._read_arrow(step)
+                nskip = 0 if table is None else table.num_rows
+            elif self.data.file_type == 'fits_stream':
+                nskip = self.data.skip(step)
+            else:
+                try:
+                    nskip = len(self.data.get_chunk(step))
+                except StopIteration:
+                    nskip = 0
+            if nskip == 0:
+                self.done = True
+                return
+            self.nread += nskip
+            nrows -= nskip
+
+    def _read_arrow(self, nrows=None):
+        """
+        Next 'nrows' rows of an Arrow file as a pyarrow Table, joining or
+        splitting (without copies) the row groups/batches as needed.
+        """
+        pending = self.pending
+        while pending is None or (nrows is not None and pending.num_rows < nrows):
+            table = next(self.batches, None)
+            if table is None:
+                break
+            if table.num_rows == 0:
+                continue
+            pending = table if pending is None else pa.concat_tables([pending, table])
+            if nrows is None:
+                break
+        if pending is None or pending.num_rows == 0:
+            return None
+        if nrows is None or pending.num_rows <= nrows:
+            self.pending = None
+            return pending
+        self.pending = pending.slice(nrows)
+        return pending.slice(0, nrows)
+
+    def close(self):
+        """
+        Close the HDF5 store, FITS or Arrow file being read.
+        """
+        if self.data.file_type in ('fits', 'fits_stream', 'arrow') or isinstance(self.data, pd.HDFStore):
+            self.memmap = None
+            self.data.close()
+
+
 def read_pandas(filename):
     """
     Read an input file into a pandas DataFrame.  Accepted file
-    extension defined by 'PANDAS_EXTS'.
+    extension defined by 'PANDAS_EXTS'. Text files can be compressed
+    (.gz, .bz2, .xz).
 
     Parameters:
     ----------
@@ -406,11 +1182,12 @@ def read_pandas(filename):
 
     Returns:
     --------
-    df : pandas.DataFrame object
+    df : pandas TextFileReader or pandas.HDFStore object
+    iterator : True if the file is read by chunks
     """
     # ADW: Pandas does a pretty terrible job of automatic typing
-    base, ext = os.path.splitext(filename)
-    check_filetype(filename, PANDAS_EXTS)
+    base, ext, comp = split_ext(filename)
+    check_filetype(filename, PANDAS_EXTS, compressed=True)
 
     try:
         if ext in ('.csv', '.tab'):
@@ -418,11 +1195,16 @@ def read_pandas(filename):
                 sepa = ','
             if ext == '.tab':
                 sepa = None
-            df = pd.read_csv(filename, sep=sepa, iterator=True)
+            # compressed files are decompressed by pandas as they are read
+            df = pd.read_csv(filename, sep=sepa, iterator=True, compression='infer')
             iterator = True
         elif ext in ('.h5'):
-            df = pd.read_hdf(filename, key='data')  # iterator for hdf in padnas 0.18
-            iterator = False
+            # rows are selected by slices from the store
+            df = pd.HDFStore(filename, mode='r')
+            if 'data' not in df:
+                df.close()
+                raise KeyError('data')
+            iterator = True
     except:
         msg = 'Problem reading %s\n' % filename
         raise IOError(msg)
@@ -443,7 +1225,8 @@ def read_pandas(filename):
 
 def read_fitsio(filename):
     """Read an input FITS file into a numpy recarray. Accepted file
-    extensions defined by 'FITS_EXTS'.
+    extensions defined by 'FITS_EXTS'. Compressed files are opened as
+    a FitsStream.
 
     Parameters:
     ----------
@@ -451,9 +1234,18 @@ def read_fitsio(filename):
 
     Returns:
     --------
-    fits : fitsio.FITS object
+    fits : fitsio.FITS (or FitsStream) object
     """
-    check_filetype(filename, FITS_EXTS)
+    check_filetype(filename, FITS_EXTS, compressed=True)
+    if split_ext(filename)[2]:
+        try:
+            fits = FitsStream(filename)
+        except ValueError as e:
+            raise IOError('Problem reading %s: %s\n' % (filename, e))
+        except Exception:
+            msg = 'Problem reading %s\n' % filename
+            raise IOError(msg)
+        return fits, True
     try:
         fits = fitsio.FITS(filename)
     except:
@@ -479,6 +1271,269 @@ def read_fitsio(filename):
     return fits, True
 
 
+FITS_BLOCK = 2880
+
+# Binary table TFORM codes (as stored, big-endian)
+TFORM_DTYPES = {'L': 'S1', 'B': 'u1', 'I': '>i2', 'J': '>i4', 'K': '>i8',
+                'E': '>f4', 'D': '>f8', 'C': '>c8', 'M': '>c16'}
+
+# TZERO values used to store unsigned (or signed bytes) integers
+TZERO_DTYPES = {('B', -128): 'i1', ('I', 32768): 'u2',
+                ('J', 2147483648): 'u4', ('K', 9223372036854775808): 'u8'}
+
+
+def parse_fits_card(card):
+    """
+    Keyword and value of an 80 character FITS header card (value is None
+    for cards without one, e.g. COMMENT)
+    """
+    key = card[:8].strip()
+    if card[8:10] != '= ':
+        return key, None
+    value = card[10:].strip()
+    if value.startswith("'"):
+        text, i = '', 1
+        while i < len(value):
+            if value[i] == "'":
+                if value[i + 1:i + 2] != "'":
+                    break
+                i += 1
+            text += value[i]
+            i += 1
+        return key, text.rstrip()
+    value = value.split('/')[0].strip()
+    if value in ('T', 'F'):
+        return key, value == 'T'
+    try:
+        return key, int(value)
+    except ValueError:
+        pass
+    try:
+        return key, float(value.replace('D', 'E'))
+    except ValueError:
+        return key, value
+
+
+class FitsStream(object):
+    """
+    First binary table of a compressed FITS file, read sequentially while
+    it is decompressed (fitsio decompresses the whole file in memory).
+    Rows are decoded with numpy from the raw records: logical columns as
+    booleans, strings without trailing spaces, TZERO unsigned integers and
+    TSCAL/TZERO scaled values.
+    Variable-length and bit columns are not supported.
+
+    Parameters:
+    ----------
+    filename : Input filename (.fits.gz, .fits.bz2, .fits.xz)
+    """
+    file_type = 'fits_stream'
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.stream = open_compressed(filename)
+        try:
+            header = self._read_header()
+            self._skip_bytes(self._data_size(header))
+            header = self._read_header()
+            if header.get('XTENSION') != 'BINTABLE':
+                raise ValueError('first extension is not a binary table')
+            self._parse_columns(header)
+        except Exception:
+            self.close()
+            raise
+        self.header = header
+        self.nrows = header['NAXIS2']
+        self.rowsize = header['NAXIS1']
+        self.nread = 0
+
+    def _read_exact(self, nbytes):
+        data = self.stream.read(nbytes)
+        if len(data) != nbytes:
+            raise IOError('Unexpected end of file in %s' % self.filename)
+        return data
+
+    def _skip_bytes(self, nbytes):
+        while nbytes > 0:
+            step = min(nbytes, 64 * 1024**2)
+            self._read_exact(step)
+            nbytes -= step
+
+    def _read_header(self):
+        header = {}
+        while True:
+            block = self._read_exact(FITS_BLOCK).decode('ascii', 'replace')
+            for i in range(0, FITS_BLOCK, 80):
+                key, value = parse_fits_card(block[i:i + 80])
+                if key == 'END':
+                    return header
+                if value is not None:
+                    header[key] = value
+
+    @staticmethod
+    def _data_size(header):
+        """Size of the data of an HDU, padded to a whole number of blocks"""
+        naxis = header.get('NAXIS', 0)
+        if naxis == 0:
+            return 0
+        size = 1
+        for i in range(1, naxis + 1):
+            size *= header['NAXIS%d' % i]
+        size = abs(header['BITPIX']) // 8 * header.get('GCOUNT', 1) * (
+            header.get('PCOUNT', 0) + size)
+        return -(-size // FITS_BLOCK) * FITS_BLOCK
+
+    def _parse_columns(self, header):
+        names, formats, offsets = [], [], []
+        self.codes, self.scaling = {}, {}
+        offset = 0
+        for i in range(1, header['TFIELDS'] + 1):
+            name = header.get('TTYPE%d' % i, 'COL%d' % i)
+            tform = str(header['TFORM%d' % i]).strip().upper()
+            digits = len(tform) - len(tform.lstrip('0123456789'))
+            repeat = int(tform[:digits]) if digits else 1
+            code = tform[digits:digits + 1]
+            if code == 'A':
+                fmt = np.dtype('S%d' % repeat)
+            elif code in TFORM_DTYPES:
+                fmt = np.dtype(TFORM_DTYPES[code])
+                if repeat != 1:
+                    fmt = np.dtype((fmt, (repeat,)))
+            else:
+                raise ValueError("column '%s' with format '%s' is not supported" % (name, tform))
+            names.append(name)
+            formats.append(fmt)
+            offsets.append(offset)
+            offset += fmt.itemsize
+            self.codes[name] = code
+            self.scaling[name] = (header.get('TSCAL%d' % i, 1), header.get('TZERO%d' % i, 0))
+        self.names = names
+        self.raw_dtype = np.dtype({'names': names, 'formats': formats, 'offsets': offsets,
+                                   'itemsize': header['NAXIS1']})
+        empty = np.zeros(0, dtype=self.raw_dtype)
+        self.dtype = np.dtype([(name, self._decode(name, empty[name]).dtype.str)
+                               for name in names])
+
+    def _decode(self, name, raw):
+        code = self.codes[name]
+        scale, zero = self.scaling[name]
+        if code == 'L':
+            return raw == b'T'
+        if code == 'A':
+            # strings can be padded with spaces (as cfitsio does, strip them)
+            return np.char.rstrip(raw, b' ')
+        if scale == 1 and (code, zero) in TZERO_DTYPES:
+            dtype = TZERO_DTYPES[(code, zero)]
+            if code == 'K':
+                return (raw.view('>u8') ^ np.uint64(zero)).astype(dtype)
+            return (raw.astype('i8') + zero).astype(dtype)
+        if scale != 1 or zero != 0:
+            return raw * scale + zero
+        return raw
+
+    def get_colnames(self):
+        return list(self.names)
+
+    def read(self, nrows=None, columns=None):
+        """
+        Next 'nrows' rows (all the remaining ones if None) of the given
+        columns, as a dictionary of numpy arrays (None at the end of the table).
+        """
+        remaining = self.nrows - self.nread
+        nrows = remaining if nrows is None else min(nrows, remaining)
+        if nrows <= 0:
+            return None
+        raw = np.frombuffer(self._read_exact(nrows * self.rowsize), dtype=self.raw_dtype)
+        self.nread += nrows
+        return dict((name, self._decode(name, raw[name])) for name in columns or self.names)
+
+    def skip(self, nrows):
+        """
+        Skip the next 'nrows' rows, returns the number of rows skipped.
+        """
+        nrows = max(min(nrows, self.nrows - self.nread), 0)
+        self._skip_bytes(nrows * self.rowsize)
+        self.nread += nrows
+        return nrows
+
+    def close(self):
+        self.stream.close()
+
+
+class ArrowFile(object):
+    """
+    Parquet or Arrow IPC (feather) file, read one row group or record
+    batch at a time with pyarrow.
+
+    Parameters:
+    ----------
+    filename : Input filename
+    """
+    file_type = 'arrow'
+
+    def __init__(self, filename):
+        if pa is None:
+            raise ImportError('pyarrow is needed to read %s files' % ', '.join(ARROW_EXTS))
+        self.filename = filename
+        self.parquet = None
+        self.ipc = None
+        if os.path.splitext(filename)[1] == '.parquet':
+            self.parquet = pq.ParquetFile(filename)
+            self.schema = self.parquet.schema_arrow
+        else:
+            self.source = pa.memory_map(filename, 'r')
+            self.ipc = pa.ipc.open_file(self.source)
+            self.schema = self.ipc.schema
+
+    def get_colnames(self):
+        return list(self.schema.names)
+
+    def batches(self, columns=None):
+        """
+        Generator of pyarrow Tables, one per row group (parquet) or record
+        batch (arrow/feather), with only the given columns.
+        """
+        if self.parquet is not None:
+            for i in range(self.parquet.num_row_groups):
+                yield self.parquet.read_row_group(i, columns=columns)
+        else:
+            for i in range(self.ipc.num_record_batches):
+                table = pa.Table.from_batches([self.ipc.get_batch(i)])
+                if columns is not None:
+                    table = table.select(columns)
+                yield table
+
+    def close(self):
+        if self.ipc is not None:
+            self.source.close()
+        elif hasattr(self.parquet, 'close'):
+            self.parquet.close()
+
+
+def read_arrow(filename):
+    """
+    Open a Parquet, Arrow or Feather file. Accepted file extensions
+    defined by 'ARROW_EXTS'.
+
+    Parameters:
+    ----------
+    filename : Input filename
+
+    Returns:
+    --------
+    data : ArrowFile object
+    """
+    check_filetype(filename, ARROW_EXTS)
+    if pa is None:
+        raise ImportError('pyarrow is needed to read %s files' % ', '.join(ARROW_EXTS))
+    try:
+        data = ArrowFile(filename)
+    except:
+        msg = 'Problem reading %s\n' % filename
+        raise IOError(msg)
+    return data, True
+
+
 if __name__ == "__main__":
     import argparse
 
@@ -0,0 +1,578 @@
+"""
+Helpers for uploading data into DB tables (load_table, append_table)
+"""
+from __future__ import print_function
+import csv
+import json
+import math
+import os
+import sys
+import time
+import threading
+from easyaccess.eautils.ea_utils import colored
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+def journal_file():
+    """
+    Default load journal (see LoadJournal), in ~/.easyaccess
+    """
+    return os.path.join(os.path.expanduser('~'), '.easyaccess', 'load_journal.json')
+
+
+def parse_chunksize(value):
+    """
+    Value of --chunksize: a number of rows or 'auto'
+    """
+    if str(value).lower() == 'auto':
+        return 'auto'
+    value = int(value)
+    if value < 1:
+        raise ValueError('chunksize must be a positive number')
+    return value
+
+
+def column_list(value):
+    """
+    Value of --columns, --index or --key: comma separated names (or a
+    list of them from python), None if not given
+    """
+    if value is None:
+        return None
+    if not isinstance(value, (list, tuple)):
+        value = value.split(',')
+    return [c.strip() for c in value if c.strip()]
+
+
+def chunks_in_memory(readahead=0, workers=1):
+    """
+    Max number of chunks held in memory at the same time by an upload:
+    the ones waiting in the read-ahead queue, the one being read and
+    the ones being inserted (or queued for the workers).
+    """
+    if workers > 1:
+        return readahead + 2 * workers + 2
+    return readahead + 2
+
+
+class ReadAhead(object):
+    """
+    Iterate over 'iterable' in a background thread, keeping up to 'depth'
+    items ready in a bounded queue, so the next chunks are read (and
+    converted with 'prepare') while the current one is being inserted.
+    Errors in the thread are raised when the item would have been returned.
+
+    Parameters:
+    -----------
+    iterable : Iterable (e.g. eafile.ChunkReader)
+    depth    : Max number of items read ahead
+    prepare  : Function applied to each item in the thread
+    """
+    _end = object()
+
+    def __init__(self, iterable, depth=1, prepare=None):
+        self.iterable = iterable
+        self.prepare = prepare
+        self.error = None
+        self.done = False
+        self.queue = queue.Queue(maxsize=max(depth, 1))
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        try:
+            for item in self.iterable:
+                if self.prepare is not None:
+                    item = self.prepare(item)
+                if not self._put(item):
+                    return
+        except Exception:
+            self.error = sys.exc_info()
+        self._put(self._end)
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.done:
+            raise StopIteration
+        item = self.queue.get()
+        if item is self._end:
+            self.done = True
+            if self.error is not None:
+                (type, value, traceback) = self.error
+                raise value
+            raise StopIteration
+        return item
+
+    next = __next__
+
+    def close(self):
+        """
+        Stop reading and wait for the thread.
+        """
+        self._stop.set()
+        self.thread.join()
+
+
+class ChunkTuner(object):
+    """
+    Tune the number of rows per chunk while uploading to maximize the
+    insert rate (rows/sec). The size is doubled (or halved) while the rate
+    improves; when it gets worse the search goes back to the best size and
+    turns around with a smaller step, until the step is too small to matter.
+    The size is kept within [minimum, maximum] (the memory budget).
+
+    Parameters:
+    -----------
+    size      : Initial number of rows
+    minimum   : Min number of rows
+    maximum   : Max number of rows
+    tolerance : Relative improvement needed to keep going in one direction
+    """
+
+    def __init__(self, size, minimum=1000, maximum=None, tolerance=0.05):
+        self.maximum = maximum if maximum is not None else 10 * size
+        self.minimum = min(minimum, self.maximum)
+        self.size = min(max(size, self.minimum), self.maximum)
+        self.tolerance = tolerance
+        self.factor = 2.0
+        self.direction = 1
+        self.best_size = self.size
+        self.best_rate = 0.
+        self.settled = False
+        self._lock = threading.Lock()
+
+    def update(self, nrows, seconds):
+        """
+        Record the time spent inserting a chunk of 'nrows' rows and
+        return the size for the next chunks.
+        """
+        with self._lock:
+            # the last (shorter) chunk or chunks read before the last change
+            if self.settled or nrows != self.size:
+                return self.size
+            rate = nrows / max(seconds, 1e-6)
+            if rate > self.best_rate * (1 + self.tolerance):
+                self.best_rate = rate
+                self.best_size = self.size
+            else:
+                self.direction = -self.direction
+                self.factor = math.sqrt(self.factor)
+            if self.factor < 1.1:
+                self.settled = True
+                self.size = self.best_size
+                return self.size
+            size = int(self.best_size * self.factor ** self.direction)
+            size = min(max(size, self.minimum), self.maximum)
+            if size == self.best_size:
+                # reached one of the limits
+                self.settled = True
+            self.size = size
+            return size
+
+    def summary(self):
+        """
+        Message with the best size found to reuse it, None if no chunk
+        of the tried sizes was measured (e.g. a file smaller than one chunk)
+        """
+        if self.best_rate <= 0:
+            return None
+        if self.settled:
+            found = 'settled at'
+        else:
+            found = 'best so far'
+        return 'Chunk size %s %d rows (%d rows/sec), use --chunksize %d to reuse it' % (
+            found, self.best_size, self.best_rate, self.best_size)
+
+
+class UploadProgress(object):
+    """
+    Single progress line shared by all the threads inserting into a table.
+    """
+
+    def __init__(self, table, nworkers=1, mode=0):
+        self.table = table.upper()
+        self.nworkers = nworkers
+        self.mode = mode
+        self.rows = 0
+        self.chunks = 0
+        self.t1 = time.time()
+        self._lock = threading.Lock()
+
+    def update(self, nrows):
+        with self._lock:
+            self.rows += nrows
+            self.chunks += 1
+            elapsed = max(time.time() - self.t1, 1e-6)
+            line = ' Inserted %d rows into %s, Rows/sec: %d [%d workers] ' % (
+                self.rows, self.table, self.rows / elapsed, self.nworkers)
+            sys.stdout.write('\r' + colored(line, 'yellow', self.mode))
+            sys.stdout.flush()
+
+    def close(self):
+        sys.stdout.write('\n')
+        sys.stdout.flush()
+
+
+class InsertWorkers(object):
+    """
+    Pool of threads inserting chunks of rows concurrently, each one using
+    its own DB session. Nothing is committed until all the chunks have
+    been inserted, so a failure in any worker can be rolled back in all
+    the sessions (the final commits are not atomic, see finish).
+
+    Parameters:
+    -----------
+    nworkers : Number of threads/sessions
+    connect  : Function returning a new cx_Oracle connection
+    insert   : Function called as insert(item, cursor) for each item
+    """
+
+    def __init__(self, nworkers, connect, insert):
+        self.insert = insert
+        self.errors = []
+        self.closed = False
+        self.connections = []
+        try:
+            for i in range(nworkers):
+                self.connections.append(connect())
+        except Exception:
+            # e.g. too many sessions, do not leave the opened ones behind
+            for con in self.connections:
+                try:
+                    con.close()
+                except Exception:
+                    pass
+            raise
+        # Bounded so the reader does not get too far ahead of the inserts
+        self.queue = queue.Queue(maxsize=nworkers)
+        self.threads = []
+        for con in self.connections:
+            thread = threading.Thread(target=self._run, args=(con,))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def _run(self, con):
+        cursor = con.cursor()
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if self.errors:
+                # another worker failed, just drain the queue
+                continue
+            try:
+                self.insert(item, cursor)
+            except Exception:
+                self.errors.append(sys.exc_info())
+        cursor.close()
+
+    def put(self, item):
+        """
+        Queue an item to be inserted. Raises the first error found by the workers.
+        """
+        if self.errors:
+            self.reraise()
+        self.queue.put(item)
+
+    def reraise(self):
+        (type, value, traceback) = self.errors[0]
+        raise value
+
+    def finish(self, commit=True):
+        """
+        Wait for all the workers, then commit (or roll back if any of them
+        failed or commit is False) and close all the sessions.
+
+        The sessions commit one after another, so the load is not atomic
+        across them: if a commit fails, the rows of the sessions already
+        committed stay in the table (an error saying how many is raised).
+        Every session is rolled back (if not committed) and closed in any
+        case. A new table is dropped by load_table on that error, rows
+        appended to an existing table are not removed.
+
+        Returns:
+        --------
+        True if the data was committed
+        """
+        if self.closed:
+            return False
+        self.closed = True
+        for thread in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        commit = commit and not self.errors
+        committed = 0
+        try:
+            if commit:
+                for con in self.connections:
+                    try:
+                        con.commit()
+                    except Exception as e:
+                        raise RuntimeError('Commit failed after %d of %d sessions were '
+                                           'committed: %s' % (committed, len(self.connections),
+                                                              str(e).strip()))
+                    committed += 1
+        finally:
+            for con in self.connections[committed:]:
+                try:
+                    con.rollback()
+                except Exception:
+                    pass
+            for con in self.connections:
+                try:
+                    con.close()
+                except Exception:
+                    pass
+        return commit
+
+
+class LoadJournal(object):
+    """
+    Progress of a resumable upload (--resume): the rows and chunks already
+    committed into a table from a file. Entries are kept in 'journal_file()'
+    by database, user, table and file path, and removed once the upload
+    finishes. When several files are loaded into a table, each file is
+    recorded as done once it is committed.
+
+    A commit and the journal can not be updated together: before each
+    commit the chunk is recorded as pending with the number of rows the
+    table will have (see prepare), and when resuming 'resolve' compares it
+    with the rows in the table to know if that commit made it. Without a
+    row count (several files, or appends with a key, where a chunk can be
+    inserted again without duplicating rows) a crash right after a commit
+    makes that chunk (or file) be inserted again.
+
+    Parameters:
+    -----------
+    db       : Database name
+    user     : DB user
+    table    : Name of the table
+    filename : Input file
+    path     : Journal file (default 'journal_file()')
+    """
+
+    def __init__(self, db, user, table, filename, path=None):
+        self.path = path or journal_file()
+        self.filename = os.path.abspath(filename)
+        self.key = '|'.join([db, user.upper(), table.upper(), self.filename])
+        stat = os.stat(filename)
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.entry = self._read().get(self.key)
+        self.rows = self.entry['rows'] if self.entry else 0
+        self.chunks = self.entry['chunks'] if self.entry else 0
+        self.count = self.entry.get('count') if self.entry else None
+
+    @property
+    def started(self):
+        """True if there is a previous (unfinished) upload to continue."""
+        return self.entry is not None
+
+    @property
+    def finished(self):
+        """True if the whole file was loaded."""
+        return self.entry is not None and self.entry.get('done', False)
+
+    def changed(self):
+        """True if the file was modified since the upload started."""
+        return (self.entry is not None and
+                (self.entry['size'] != self.size or self.entry['mtime'] != self.mtime))
+
+    def _read(self):
+        try:
+            with open(self.path) as fin:
+                return json.load(fin)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _write(self, entries):
+        if not os.path.exists(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+        temp = self.path + '.tmp'
+        with open(temp, 'w') as fout:
+            json.dump(entries, fout, indent=2)
+        getattr(os, 'replace', os.rename)(temp, self.path)
+
+    def update(self, rows, chunks, done=False, count=None):
+        """
+        Record that 'rows' rows in 'chunks' chunks are committed ('done'
+        if they are all the rows of the file) and the table has 'count'
+        rows (None if not known).
+        """
+        self.rows = rows
+        self.chunks = chunks
+        self.count = count
+        self._save(done=done)
+
+    def prepare(self, rows, chunks, count=None):
+        """
+        Record, before a commit, that 'rows' rows in 'chunks' chunks will be
+        committed leaving 'count' rows in the table.
+        """
+        self._save(pending={'rows': rows, 'chunks': chunks, 'count': count})
+
+    def resolve(self, count):
+        """
+        Compare the rows in the table ('count') with the pending commit of
+        a previous upload. Returns True if that commit was done, and the
+        chunk is then recorded as committed.
+        """
+        pending = self.entry.get('pending') if self.entry else None
+        if pending is None or pending['count'] is None or pending['count'] != count:
+            return False
+        self.update(pending['rows'], pending['chunks'], count=count)
+        return True
+
+    def _save(self, done=False, pending=None):
+        self.entry = {'file': self.filename, 'size': self.size, 'mtime': self.mtime,
+                      'rows': self.rows, 'chunks': self.chunks, 'count': self.count,
+                      'done': done, 'pending': pending,
+                      'updated': time.strftime('%Y-%m-%d %H:%M:%S')}
+        entries = self._read()
+        entries[self.key] = self.entry
+        self._write(entries)
+
+    def remove(self):
+        """
+        Forget the upload (it finished or will start over).
+        """
+        entries = self._read()
+        if entries.pop(self.key, None) is not None:
+            self._write(entries)
+        self.entry = None
+        self.rows = 0
+        self.chunks = 0
+        self.count = None
+
+
+class FileReport(object):
+    """
+    Completion report of a load of several files into a table: a line is
+    printed as each file is loaded, skipped or fails, and a summary at the
+    end. Shared by all the threads loading files.
+
+    Parameters:
+    -----------
+    nfiles : Number of files
+    mode   : Color mode
+    """
+
+    def __init__(self, nfiles, mode=0):
+        self.nfiles = nfiles
+        self.mode = mode
+        self.loaded = []
+        self.skipped = []
+        self.failed = []
+        self.rows = 0
+        self.t1 = time.time()
+        self._lock = threading.Lock()
+
+    def _print(self, line, color):
+        ndone = len(self.loaded) + len(self.skipped) + len(self.failed)
+        print(colored(' [%d/%d] %s' % (ndone, self.nfiles, line), color, self.mode))
+        sys.stdout.flush()
+
+    def add_loaded(self, filename, rows, seconds):
+        with self._lock:
+            self.loaded.append(filename)
+            self.rows += rows
+            self._print('%s: %d rows in %.2f seconds (%d rows/sec)' % (
+                os.path.basename(filename), rows, seconds, rows / max(seconds, 1e-6)), 'green')
+
+    def add_skipped(self, filename, reason):
+        with self._lock:
+            self.skipped.append(filename)
+            self._print('%s: skipped, %s' % (os.path.basename(filename), reason), 'cyan')
+
+    def add_failed(self, filename, error):
+        with self._lock:
+            self.failed.append((filename, str(error).strip()))
+            self._print('%s: failed, %s' % (os.path.basename(filename), str(error).strip()), 'red')
+
+    def summary(self):
+        elapsed = time.time() - self.t1
+        print(colored('\n %d files loaded (%d rows in %.2f seconds), %d skipped, %d failed' % (
+            len(self.loaded), self.rows, elapsed, len(self.skipped), len(self.failed)),
+            'red' if self.failed else 'green', self.mode))
+        for filename, error in self.failed:
+            print(colored('   %s: %s' % (filename, error), 'red', self.mode))
+
+
+class RejectFile(object):
+    """
+    Rows rejected by the database while uploading (--max-errors), written
+    as CSV lines with their row number in the input file and the ORA
+    error, like the .bad files of SQL*Loader. The file is only created
+    when a row is rejected. Once more than 'max_errors' rows are rejected
+    an error is raised to abort the upload.
+
+    Parameters:
+    -----------
+    filename   : Reject file
+    max_errors : Max number of rejected rows
+    append     : Add to an existing reject file (resumed uploads)
+    """
+
+    def __init__(self, filename, max_errors=0, append=False):
+        self.filename = filename
+        self.max_errors = max_errors
+        self.append = append
+        self.count = 0
+        self.fout = None
+        self.writer = None
+        self._lock = threading.Lock()
+
+    def _open(self, columns):
+        header = not (self.append and os.path.exists(self.filename))
+        mode = 'a' if self.append else 'w'
+        if sys.version_info[0] == 3:
+            self.fout = open(self.filename, mode, newline='')
+        else:
+            self.fout = open(self.filename, mode + 'b')
+        self.writer = csv.writer(self.fout)
+        if header:
+            self.writer.writerow(['ROW'] + list(columns) + ['ERROR'])
+
+    def add(self, chunk, errors):
+        """
+        Write the rows of 'chunk' (eafile.Chunk, already prepared) rejected
+        with 'errors' (as returned by cursor.getbatcherrors()).
+        """
+        if not errors:
+            return
+        with self._lock:
+            if self.fout is None:
+                self._open(chunk.columns)
+            for error in errors:
+                row = chunk.rows[error.offset]
+                self.writer.writerow([chunk.start + error.offset + 1] + list(row) +
+                                     [error.message.strip()])
+            self.fout.flush()
+            self.count += len(errors)
+            if self.count > self.max_errors:
+                raise ValueError('%d rows rejected, more than --max-errors %d (see %s)' %
+                                 (self.count, self.max_errors, self.filename))
+
+    def close(self):
+        if self.fout is not None:
+            self.fout.close()
+            self.fout = None
@@ -0,0 +1,348 @@
+"""
+Metadata used for auto-completion (table, user and column names), kept
+on disk by database and user
+"""
+from __future__ import print_function
+import bisect
+import difflib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import easyaccess.version as version
+
+metadata_dir = os.path.join(os.environ["HOME"], ".easyaccess/metadata")
+
+
+class PrefixIndex(object):
+    """
+    Sorted list of unique names, the ones starting with a prefix are found
+    with two binary searches instead of scanning all the names on every
+    completion.
+
+    Parameters:
+    -----------
+    names : Iterable of names
+    """
+
+    def __init__(self, names=()):
+        self.names = sorted(set(name for name in names if name is not None))
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        i = bisect.bisect_left(self.names, name)
+        return i < len(self.names) and self.names[i] == name
+
+    def complete(self, prefix=''):
+        """
+        Names starting with 'prefix' (all of them if empty), sorted
+        """
+        if not prefix:
+            return list(self.names)
+        start = bisect.bisect_left(self.names, prefix)
+        # first name after all the ones starting with prefix
+        stop = bisect.bisect_left(self.names, prefix[:-1] + chr(ord(prefix[-1]) + 1), start)
+        return self.names[start:stop]
+
+
+class LRUCache(object):
+    """
+    Dictionary keeping only the 'maxsize' most recently used items.
+
+    Parameters:
+    -----------
+    maxsize : Max number of items
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self.items.pop(key)
+            except KeyError:
+                return default
+            self.items[key] = value
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self.items.pop(key, None)
+            self.items[key] = value
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self.items.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self.items.clear()
+
+
+class MetadataSnapshot(object):
+    """
+    Prefix indexes of the table, user and column names, the columns of
+    each table and the caches that depend on them (columns and
+    descriptions of single tables), replaced as a whole when the
+    metadata is reloaded. The columns of each table are only needed to
+    search tables, if 'load_columns' is given they are read with it when
+    first used instead.
+    """
+
+    def __init__(self, tables=(), users=(), columns=(), columns_by_table=None,
+                 load_columns=None):
+        self.table_index = PrefixIndex(tables)
+        self.user_index = PrefixIndex(users)
+        self.column_index = PrefixIndex(columns)
+        if columns_by_table is None and load_columns is None:
+            columns_by_table = {}
+        self._columns_by_table = columns_by_table
+        self._load_columns = load_columns
+        self._lock = threading.Lock()
+        # columns by (schema, table, link), read when first completed
+        self.table_columns = LRUCache(maxsize=256)
+        # described tables by (schema, table, link)
+        self.table_descriptions = LRUCache(maxsize=256)
+
+    @property
+    def columns_by_table(self):
+        with self._lock:
+            if self._columns_by_table is None:
+                self._columns_by_table = self._load_columns() or {}
+            return self._columns_by_table
+
+
+# Keywords ending the list of tables after FROM
+_FROM_END = (r'\b(?:WHERE|GROUP|ORDER|HAVING|CONNECT|START|UNION|INTERSECT|MINUS|FETCH|OFFSET)\b'
+             r'|[;()]')
+_JOIN = r'\b(?:(?:NATURAL\s+)?(?:INNER|CROSS|(?:LEFT|RIGHT|FULL)(?:\s+OUTER)?)\s+)?JOIN\b'
+_TABLE_NAME = re.compile(r'^[A-Z][\w$#]*(?:\.[A-Z][\w$#]*)?(?:@[\w.$#]+)?$')
+_ALIAS = re.compile(r'^[A-Z][\w$#]*$')
+
+
+def query_tables(query):
+    """
+    Tables in the FROM and JOIN clauses of a (partial) query, as a
+    dictionary from the names they can be referred to (table name, name
+    without schema and alias) to the table name, e.g.:
+    'select a.ra from des_admin.y6_gold a' -> {'DES_ADMIN.Y6_GOLD': 'DES_ADMIN.Y6_GOLD',
+                                               'Y6_GOLD': 'DES_ADMIN.Y6_GOLD',
+                                               'A': 'DES_ADMIN.Y6_GOLD'}
+    """
+    query = re.sub(r"'[^']*'?", "''", query.upper())
+    tables = OrderedDict()
+    for match in re.finditer(r'\bFROM\b', query):
+        clause = query[match.end():]
+        end = re.search(_FROM_END, clause)
+        if end is not None:
+            clause = clause[:end.start()]
+        for item in re.split(',|' + _JOIN, clause):
+            words = re.split(r'\b(?:ON|USING)\b', item)[0].split()
+            if not words or not _TABLE_NAME.match(words[0]):
+                continue
+            table = words[0]
+            tables[table] = table
+            tables.setdefault(table.split('@')[0].split('.')[-1], table)
+            alias = words[-1] if len(words) > 1 else None
+            if alias is not None and alias != 'AS' and _ALIAS.match(alias):
+                tables[alias] = table
+    return tables
+
+
+def like_regex(pattern):
+    """
+    Compiled regular expression matching the same names as an Oracle LIKE
+    pattern (% for any string, _ for any character)
+    """
+    regex = ''.join('.*' if char == '%' else '.' if char == '_' else re.escape(char)
+                    for char in pattern)
+    return re.compile(regex + '$', re.DOTALL)
+
+
+# Characters making a search pattern a regular expression
+_REGEX_CHARS = r'[\^$*+?\[\]()|\\]'
+
+
+def search_names(names, pattern, fuzzy=True):
+    """
+    Names matching a pattern, best matches first. The pattern is:
+    - an Oracle LIKE pattern if it has '%'
+    - a regular expression if it has any of ^$*+?[]()|\\
+    - otherwise a substring, exact matches first then names starting
+      with it, or the closest names when none contains it ('fuzzy')
+    Names as OWNER.TABLE match if either the full name or the table name
+    does. The search is case insensitive.
+    """
+    pattern = pattern.upper()
+    if '%' in pattern:
+        regex = like_regex(pattern)
+        return sorted(name for name in names
+                      if regex.match(name.upper()) or regex.match(name.upper().split('.')[-1]))
+    if re.search(_REGEX_CHARS, pattern):
+        regex = re.compile(pattern, re.IGNORECASE)
+        return sorted(name for name in names
+                      if regex.search(name) or regex.search(name.split('.')[-1]))
+    found = [name for name in names if pattern in name.upper()]
+    if found:
+        return sorted(found, key=lambda name: (name.upper() != pattern,
+                                               not name.upper().startswith(pattern),
+                                               name.upper().find(pattern), name))
+    if not fuzzy:
+        return []
+    # compare without the owner
+    by_short = {}
+    for name in names:
+        by_short.setdefault(name.upper().split('.')[-1], []).append(name)
+    close = difflib.get_close_matches(pattern.split('.')[-1], list(by_short), n=20, cutoff=0.6)
+    return [name for short in close for name in sorted(by_short[short])]
+
+
+def sql_search(column, pattern):
+    """
+    SQL condition and ORDER BY expression to search names in the DB the
+    same way as search_names (without the fuzzy matches): regexp_like for
+    regular expressions, LIKE for oracle patterns and, for a plain name,
+    the names containing it, exact matches first then by the position
+    of the match.
+    """
+    if '%' not in pattern and re.search(_REGEX_CHARS, pattern):
+        return "regexp_like(%s, '%s', 'i')" % (column, pattern.replace("'", "''")), column
+    pattern = pattern.upper().replace("'", "''")
+    if '%' in pattern:
+        return "upper(%s) like '%s'" % (column, pattern), column
+    # '_' is a plain character in a name
+    escaped = pattern.replace('\\', '\\\\').replace('_', '\\_')
+    condition = "upper(%s) like '%%%s%%' escape '\\'" % (column, escaped)
+    order = "case when upper(%s) = '%s' then 0 else 1 end, instr(upper(%s), '%s'), %s" % (
+        column, pattern, column, pattern, column)
+    return condition, order
+
+
+class MetadataCache(object):
+    """
+    Table, user and column names of a database saved in a JSON file
+    ('metadata_dir/<db>_<user>.json') with the time they were read, so the
+    interpreter can start with them at once and refresh them when they
+    get old. The DB time of the last refresh ('db_time') is kept to find
+    the tables changed since then (incremental refresh), the table
+    names resolved to (schema, table, link) ('resolved') are kept too. The
+    columns of each table ('columns_by_table', for local searches) are
+    the bulk of the metadata and go to a file of their own
+    ('<db>_<user>_columns.json'), read only when searched (load_columns).
+
+    Parameters:
+    -----------
+    db   : Database name
+    user : DB user
+    path : Cache file (default in 'metadata_dir')
+    """
+
+    def __init__(self, db, user, path=None):
+        self.path = path or os.path.join(metadata_dir, '%s_%s.json' % (db, user.lower()))
+        self.columns_path = os.path.splitext(self.path)[0] + '_columns.json'
+        self.tables = []
+        self.users = []
+        self.columns = []
+        self.timestamp = None
+        self.db_time = None
+        self.resolved = {}
+        self.columns_by_table = {}
+
+    def load(self):
+        """
+        Read the cache file. Returns False if it does not exist or can not be read.
+        """
+        try:
+            with open(self.path) as fin:
+                data = json.load(fin)
+            tables, users, columns = data['tables'], data['users'], data['columns']
+            timestamp = data['timestamp']
+        except (IOError, OSError, ValueError, KeyError):
+            return False
+        self.tables = tables
+        self.users = users
+        self.columns = columns
+        self.timestamp = timestamp
+        self.db_time = data.get('db_time')
+        self.resolved = dict((name, tuple(value))
+                             for name, value in data.get('resolved', {}).items())
+        # embedded in the file by older versions
+        self.columns_by_table = data.get('columns_by_table', {})
+        return True
+
+    def load_columns(self):
+        """
+        Columns of each table ('OWNER.TABLE' -> [columns]), read from their
+        file the first time. Empty if it does not exist or can not be read.
+        """
+        if not self.columns_by_table:
+            try:
+                with open(self.columns_path) as fin:
+                    self.columns_by_table = json.load(fin)
+            except (IOError, OSError, ValueError):
+                pass
+        return self.columns_by_table
+
+    def save(self, tables, users, columns, db_time=None, resolved=None, columns_by_table=None):
+        """
+        Write the metadata just read from the DB to the cache file. 'db_time'
+        is the DB time (YYYY-MM-DD HH24:MI:SS) when it started being read,
+        'resolved' a dictionary of table name -> (schema, table, link) and
+        'columns_by_table' of 'OWNER.TABLE' -> [columns].
+        """
+        resolved = dict(resolved or {})
+        columns_by_table = columns_by_table or {}
+        self.tables = tables
+        self.users = users
+        self.columns = columns
+        self.timestamp = time.time()
+        self.db_time = db_time
+        self.resolved = resolved
+        self.columns_by_table = columns_by_table
+        data = {'easyaccess': version.__version__,
+                'timestamp': self.timestamp,
+                'db_time': db_time,
+                'updated': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.timestamp)),
+                'tables': tables,
+                'users': users,
+                'columns': columns,
+                'resolved': resolved}
+        dirname = os.path.dirname(self.path)
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+        # the columns first, the names file tells when both were saved
+        for path, content in ((self.columns_path, columns_by_table), (self.path, data)):
+            temp = path + '.tmp'
+            with open(temp, 'w') as fout:
+                json.dump(content, fout)
+            getattr(os, 'replace', os.rename)(temp, path)
+
+    def age(self):
+        """
+        Seconds since the metadata was read from the DB (None if never).
+        """
+        if self.timestamp is None:
+            return None
+        return time.time() - self.timestamp
+
+    def is_stale(self, ttl):
+        """
+        True if the metadata is older than 'ttl' hours.
+        """
+        age = self.age()
+        return age is None or age > ttl * 3600.
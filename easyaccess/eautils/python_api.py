@@ -4,7 +4,11 @@ import easyaccess.eautils.fileio as eafile
 import easyaccess.eautils.fun_utils as fun_utils
 from easyaccess.eautils.ea_utils import desfile, config_file, colored, read_buf
 import pandas as pd
+import cx_Oracle
 import getpass
+import hashlib
+import threading
+import time
 
 try:
     from builtins import input, str, range
@@ -61,8 +65,94 @@ def to_pandas(cur):
     return data
 
 
+class SessionPool(object):
+    """
+    Sessions to a DB opened once and shared by all the pooled connect
+    objects of the same section and credentials (see get_session_pool)
+
+    Parameters:
+    -----------
+    user, password, dsn : Credentials and DSN of the DB
+    min, max, increment : Sessions opened at first, max number of sessions and
+                          how many are opened at once when more are needed
+    timeout             : Seconds to wait for a session when all of them are
+                          in use before giving up with an error
+    """
+
+    def __init__(self, user, password, dsn, min=1, max=4, increment=1, timeout=60):
+        self.pool = cx_Oracle.SessionPool(user, password, dsn, min=min, max=max,
+                                          increment=increment, threaded=True,
+                                          getmode=cx_Oracle.SPOOL_ATTRVAL_TIMEDWAIT,
+                                          waitTimeout=int(timeout * 1000))
+        # the setup queries of a new connection are run only by the first one
+        self.ready = False
+
+    def acquire(self):
+        """
+        Session from the pool, waits up to the timeout if all of them are in use
+        """
+        return self.pool.acquire()
+
+    def release(self, con):
+        """
+        Return a session to the pool (uncommitted changes are rolled back)
+        """
+        self.pool.release(con)
+
+    def close(self, force=False):
+        """
+        Close the sessions, with force even those still in use
+        """
+        self.pool.close(force)
+
+
+_session_pools = {}
+_session_pools_lock = threading.Lock()
+
+
+def get_session_pool(section, user, password, dsn, min=1, max=4, increment=1, timeout=60):
+    """
+    Session pool of a section (DB) and credentials, created the first time
+    it is requested and shared by all threads afterwards (the sizes are
+    those of the first request). The password is part of the key (hashed),
+    so a session is only handed out to callers that logged in with it: a
+    different one gets a pool of its own, checked by the DB when created.
+    """
+    secret = password if isinstance(password, bytes) else password.encode('utf-8')
+    digest = hashlib.sha256(secret).hexdigest()
+    key = (section, user.lower(), dsn, digest)
+    with _session_pools_lock:
+        pool = _session_pools.get(key)
+        if pool is None:
+            pool = SessionPool(user, password, dsn, min=min, max=max, increment=increment,
+                               timeout=timeout)
+            _session_pools[key] = pool
+        return pool
+
+
+def close_session_pools(force=False):
+    """
+    Close all the session pools, their sessions must have been released
+    unless 'force' is given. All of them are tried and forgotten, then the
+    errors of those that could not be closed are raised.
+    """
+    with _session_pools_lock:
+        pools = list(_session_pools.values())
+        _session_pools.clear()
+    errors = []
+    for pool in pools:
+        try:
+            pool.close(force)
+        except Exception as e:
+            errors.append(str(e).strip())
+    if errors:
+        raise Exception('%d session pools could not be closed: %s' % (
+            len(errors), '; '.join(errors)))
+
+
 class connect(easy_or):
-    def __init__(self, section='', user=None, passwd=None, quiet=False, refresh=False):
+    def __init__(self, section='', user=None, passwd=None, quiet=False, refresh=False,
+                 pooled=False, pool_min=1, pool_max=4, pool_increment=1, pool_timeout=60):
         """
         Creates a connection to the DB as easyaccess commands, section is
          obtained from config file, can be bypass here, e.g., section = desoper
@@ -73,11 +163,20 @@ class connect(easy_or):
         user    :  Manualy use username
         passwd  :  password for username (if not enter is prompted)
         quiet   :  Don't print much
+        pooled  :  Take the session from a pool shared by all the connect objects
+                   of the same section and credentials, close() returns it to the pool
+        pool_min, pool_max, pool_increment : Sizes of the pool when it is created
+        pool_timeout : Seconds to wait for a session of the pool when all of them
+                       are in use (call close() to return them), then fails
 
         Returns:
         --------
         easy_or object
         """
+        self.pooled = pooled
+        self.pool = None
+        self.pool_sizes = dict(min=pool_min, max=pool_max, increment=pool_increment,
+                               timeout=pool_timeout)
         self.quiet = quiet
         conf = config_mod.get_config(config_file)
         self.conf = conf
@@ -102,12 +201,28 @@ class connect(easy_or):
         else:
             desconf = config_mod.get_desconfig(desfile, db)
         easy_or.__init__(self, conf, desconf, db, interactive=False, quiet=quiet, pymod=True)
-        try:
-            self.cur.execute('create table FGOTTENMETADATA (ID int)')
-        except:
-            pass
+        if self.pool is None or not self.pool.ready:
+            try:
+                self.cur.execute('create table FGOTTENMETADATA (ID int)')
+            except:
+                pass
+            if self.pool is not None:
+                self.pool.ready = True
         self.loading_bar = False
 
+    def open_connection(self):
+        if not self.pooled:
+            return easy_or.open_connection(self)
+        self.pool = get_session_pool(self.dbname, self.user, self.password, self.dsn,
+                                     **self.pool_sizes)
+        return self.pool.acquire()
+
+    def last_pass_changed(self):
+        if self.pool is not None and self.pool.ready:
+            # already checked by the first session of the pool
+            return None
+        return easy_or.last_pass_changed(self)
+
     def cursor(self):
         cursor = self.con.cursor()
         cursor.arraysize = int(self.prefetch)
@@ -127,7 +242,17 @@ class connect(easy_or):
             return False
 
     def close(self):
-        self.con.close()
+        """
+        Close the connection, or return the session to the pool if pooled
+        """
+        if self.pool is None:
+            self.con.close()
+            return
+        try:
+            self.cur.close()
+        except:
+            pass
+        self.pool.release(self.con)
 
     def ea_import(self, import_line='', help=False):
         """
@@ -205,6 +330,21 @@ class connect(easy_or):
         """
         return self.do_describe_table(tablename, False, return_df=True)
 
+    def describe_tables(self, pattern):
+        """
+        Describes all the tables matching a pattern at once
+
+        Parameters:
+        -----------
+        pattern : Oracle pattern for the table names, e.g. Y6A2_% (or OWNER.Y6A2_%)
+
+        Returns:
+        --------
+        An OrderedDict of table name -> dict(owner, comment, columns), each column
+        a dict with column_name, data_type, data_format and comments
+        """
+        return self.get_schemas(pattern)
+
     def loadsql(self, filename):
         """
         Reads sql statement from a file, returns query to be parsed in
@@ -231,18 +371,33 @@ class connect(easy_or):
         """
         self.do_myquota('')
 
-    def load_table(self, table_file, name=None, chunksize=None, memsize=None):
+    def load_table(self, table_file, name=None, chunksize=None, memsize=None, workers=None,
+                   columns=None, resume=False, index=None, nologging=False,
+                   gather_stats=False, max_errors=None):
         """
         Loads and create a table in the DB. If name is not passed, is taken from
-        the filename. Formats supported are 'fits', 'csv' and 'tab' files
+        the filename. Formats supported are 'fits', 'csv', 'tab', 'h5' files and
+        'parquet', 'arrow', 'feather' (with pyarrow)
 
         Parameters:
         -----------
-        table_file : Filename to be uploaded as table (.csv, .fits, .tab)
-        name       : Name of the table to be created
-        chunksize  : Number of rows to upload at a time to avoid memory issues
-        memsize    : Size of chunk to be read. In Mb.
+        table_file : Filename to be uploaded as table (.csv, .fits, .tab, .parquet, ...),
+                     or a pattern/directory to load several files into one table
+        name       : Name of the table to be created (needed for several files)
+        chunksize  : Number of rows to upload at a time to avoid memory issues,
+                     or 'auto' to tune it for the best insert rate
+        memsize    : Memory in Mb shared by all the chunks held at the same time
+                     (read ahead and being inserted), converted rows included.
                      If both specified, the lower number of rows is selected
+        workers    : Number of DB sessions inserting chunks (or files) in parallel
+        columns    : List of columns to upload (default all)
+        resume     : Commit by chunks and continue a previous load that failed
+        index      : List of columns of one (composite) index built once the table
+                     is loaded
+        nologging  : Create the table NOLOGGING and load it with direct-path inserts
+        gather_stats : Gather the table statistics once it is loaded
+        max_errors : Max number of rows rejected by the DB before failing, the
+                     rejected rows are written to <table_file without extensions>.bad
 
         Returns:
         --------
@@ -250,31 +405,46 @@ class connect(easy_or):
 
         """
         try:
-            self.do_load_table(table_file, name=name, chunksize=chunksize, memsize=memsize)
+            self.do_load_table(table_file, name=name, chunksize=chunksize, memsize=memsize,
+                               workers=workers, columns=columns, resume=resume, index=index,
+                               nologging=nologging, gather_stats=gather_stats,
+                               max_errors=max_errors)
             return True
         except:
             # exception
             return False
 
-    def append_table(self, table_file, name=None, chunksize=None, memsize=None):
+    def append_table(self, table_file, name=None, chunksize=None, memsize=None, workers=None,
+                     columns=None, resume=False, key=None, max_errors=None):
         """
         Appends data to a table in the DB. If name is not passed, is taken from
-        the filename. Formats supported are 'fits', 'csv' and 'tab' files
+        the filename. Formats supported are 'fits', 'csv', 'tab', 'h5' files and
+        'parquet', 'arrow', 'feather' (with pyarrow)
 
         Parameters:
         -----------
-        table_file : Filename to be uploaded as table (.csv, .fits, .tab)
+        table_file : Filename to be uploaded as table (.csv, .fits, .tab, .parquet, ...)
         name       : Name of the table to be created
-        chunksize  : Number of rows to upload at a time to avoid memory issues
-        memsize    : Size of chunk to be read. In Mb.
+        chunksize  : Number of rows to upload at a time to avoid memory issues,
+                     or 'auto' to tune it for the best insert rate
+        memsize    : Memory in Mb shared by all the chunks held at the same time
+                     (read ahead and being inserted), converted rows included.
                      If both specified, the lower number of rows is selected
+        workers    : Number of DB sessions inserting chunks in parallel
+        columns    : List of columns to upload (default all)
+        resume     : Commit by chunks and continue a previous append that failed
+        key        : List of key columns, rows already in the table are skipped
+        max_errors : Max number of rows rejected by the DB before failing, the
+                     rejected rows are written to <table_file without extensions>.bad
 
         Returns:
         --------
         True if success otherwise False
         """
         try:
-            self.do_append_table(table_file, name=name, chunksize=chunksize, memsize=memsize)
+            self.do_append_table(table_file, name=name, chunksize=chunksize, memsize=memsize,
+                                 workers=workers, columns=columns, resume=resume, key=key,
+                                 max_errors=max_errors)
             return True
         except:
             return False
@@ -297,24 +467,31 @@ class connect(easy_or):
         pattern = "%" + pattern + "%"
         return self.do_find_tables(pattern, extra='', return_df=True)
 
-    def pandas_to_db(self, df, tablename=None, append=False):
+    def pandas_to_db(self, df, tablename=None, append=False, chunksize=100000, workers=None):
         """ Writes a pandas DataFrame directly to the DB
 
+        The DataFrame is inserted 'chunksize' rows at a time binding the
+        column arrays (see load_table), so no list with all the rows is built.
+
         Parameters:
         -----------
         df        : The DataFrame to be loaded to the DB
         tablename : The name of the table to be created
         append    : Set True if appending to existing table, if table doesn't exists it is created
+        chunksize : Number of rows inserted at a time (None for all)
+        workers   : Number of DB sessions inserting chunks in parallel
 
 
         Returns:
         --------
-        True or False depending on the success
+        Upload report (dict with 'table', 'rows', 'chunks', 'seconds' and
+        'rows_per_sec') or False if it failed
         """
         if tablename is None:
             print("Please indicate a tablename to be ingested in the DB")
             return False
-        if self.check_table_exists(tablename) and not append:
+        exists = self.check_table_exists(tablename)
+        if exists and not append:
             print(
                 colored('\n Table already exists. Table can be removed with:', 'red', self.ct))
             print(colored(' DESDB ~> DROP TABLE %s;\n' %
@@ -324,12 +501,22 @@ class connect(easy_or):
         if len(df) == 0:
             print('DataFrame is empty')
             return False
+        if not exists and append:
+            print('Table does not exist. Creating table\n')
+        # string sizes must hold the longest value in the whole frame
         dtypes = eafile.get_dtypes(df)
-        columns = df.columns.values.tolist()
-        values = df.values.tolist()
-        if not self.check_table_exists(tablename):
-            if append:
-                print('Table does not exist. Creating table\n')
-            self.create_table(tablename, columns, dtypes)
-        self.insert_data(tablename, columns, values, dtypes)
-        return True
+        t1 = time.time()
+        uploaded = self._upload_data(tablename, df, False, chunksize, create=not exists,
+                                     workers=workers or 1, dtypes=dtypes)
+        if uploaded is None:
+            return False
+        nrows, nchunks = uploaded
+        seconds = time.time() - t1
+        if exists:
+            # the cached description has the number of rows before the append
+            self.forget_table(tablename)
+        return {'table': tablename.upper(),
+                'rows': nrows,
+                'chunks': nchunks,
+                'seconds': seconds,
+                'rows_per_sec': nrows / max(seconds, 1e-6)}
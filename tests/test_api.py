@@ -65,6 +65,31 @@ class TestApi(unittest.TestCase):
         self.con.drop_table(self.tablename)
         cursor.close()
 
+    def test_pandas_to_db_chunks(self):
+        print('\n*** test_pandas_to_db_chunks ***\n')
+        data = create_test_data()
+        df = pd.DataFrame(data)
+        try:
+            self.con.drop_table(self.tablename)
+        except:
+            pass
+        report = self.con.pandas_to_db(df, tablename=self.tablename, chunksize=self.chunk)
+        self.assertEqual(report['rows'], self.nrows)
+        self.assertEqual(report['chunks'], self.nrows // self.chunk)
+        cursor = self.con.cursor()
+        temp = cursor.execute('select RA,DEC from %s' % self.tablename.upper())
+        fetch = temp.fetchall()
+        self.assertEqual(len(fetch), self.nrows)
+        # appending with two sessions
+        report = self.con.pandas_to_db(df, tablename=self.tablename, append=True,
+                                       chunksize=self.chunk, workers=2)
+        self.assertEqual(report['rows'], self.nrows)
+        temp = cursor.execute('select RA,DEC from %s' % self.tablename.upper())
+        fetch = temp.fetchall()
+        self.assertEqual(len(fetch), self.nrows * 2)
+        self.con.drop_table(self.tablename)
+        cursor.close()
+
     def test_query_to_pandas(self):
         print('\n*** test_query_to_pandas ***\n')
         data = create_test_data()
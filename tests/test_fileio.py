@@ -0,0 +1,344 @@
+from __future__ import print_function
+import unittest
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+import fitsio
+import easyaccess.eautils.fileio as eafile
+import easyaccess.eautils.dtypes as eatypes
+
+
+def create_test_data(nrows=25):
+    data = np.zeros(nrows, dtype=[('ID', 'i8'), ('RA', 'f8'), ('NAME', 'S8')])
+    data['ID'] = np.arange(nrows)
+    data['RA'] = np.linspace(0, 360, nrows)
+    data['NAME'] = ['obj%d' % i for i in range(nrows)]
+    return data
+
+
+class TestColumnValues(unittest.TestCase):
+
+    def test_numbers(self):
+        values = eafile.column_values(np.array([1, 2, 3], dtype='i4'))
+        self.assertEqual(values, [1, 2, 3])
+        self.assertTrue(all(type(v) is int for v in values))
+
+    def test_strings(self):
+        self.assertEqual(eafile.column_values(np.array([b'a', b'bc'])), ['a', 'bc'])
+
+    def test_nulls(self):
+        array = np.array(['a', None, np.nan], dtype=object)
+        self.assertEqual(eafile.column_values(array), ['a', None, None])
+
+    def test_bool(self):
+        self.assertEqual(eafile.column_values(np.array([True, False])), [1, 0])
+
+    def test_datetime(self):
+        array = np.array(['2020-01-02T03:04:05'], dtype='M8[ns]')
+        self.assertEqual(eafile.column_values(array),
+                         [datetime.datetime(2020, 1, 2, 3, 4, 5)])
+
+    def test_has_nulls(self):
+        self.assertFalse(eafile.has_nulls(np.array([1, 2])))
+        self.assertFalse(eafile.has_nulls(np.array(['a', 'b'], dtype=object)))
+        self.assertTrue(eafile.has_nulls(np.array(['a', None], dtype=object)))
+        self.assertTrue(eafile.has_nulls(np.array([1.0, np.nan])))
+
+    def test_bind_size(self):
+        self.assertEqual(eafile.bind_size(np.array([1.0])), eatypes.or_f)
+        self.assertEqual(eafile.bind_size(np.array([True])), eatypes.or_n)
+        self.assertEqual(eafile.bind_size(np.array([b'abc'])), 3)
+        self.assertEqual(eafile.bind_size(np.array(['ab', None, 'abcde'], dtype=object)), 5)
+        self.assertIsNone(eafile.bind_size(np.array([1, 'a'], dtype=object)))
+
+
+class TestDtypes(unittest.TestCase):
+
+    def test_merge_dtypes(self):
+        merge = eafile.merge_dtypes
+        self.assertEqual(merge(np.dtype('S3'), np.dtype('S7')), np.dtype('S7'))
+        self.assertEqual(merge(np.dtype('i4'), np.dtype('i8')), np.dtype('i8'))
+        self.assertEqual(merge(np.dtype('i8'), np.dtype('f4')), np.dtype('f8'))
+        self.assertEqual(merge(np.dtype('?'), np.dtype('i2')), np.dtype('i8'))
+        self.assertEqual(merge(np.dtype('M8[s]'), np.dtype('M8[ns]')), np.dtype('M8[ns]'))
+        self.assertEqual(merge(np.dtype('f8'), np.dtype('S4')), np.dtype('S32'))
+        self.assertEqual(merge(np.dtype('i2'), np.dtype('i2')), np.dtype('i2'))
+
+    def test_scan_dtypes(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmpdir, 'test.csv')
+            with open(filename, 'w') as fout:
+                fout.write('ID,NAME,MAG\n1,a,1\n2,bb,\n3,a much longer name,2.5\n')
+            names, dtypes, nrows = eafile.scan_dtypes(filename, chunksize=2)
+        finally:
+            shutil.rmtree(tmpdir)
+        self.assertEqual(names, ['ID', 'NAME', 'MAG'])
+        self.assertEqual(dtypes, [np.dtype('i8'), np.dtype('S18'), np.dtype('f8')])
+        self.assertEqual(nrows, 3)
+
+
+class TestChunkSize(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'test.fits')
+        fitsio.write(self.filename, create_test_data(200))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_prepared_row_bytes(self):
+        arrays = [np.arange(10), np.array([b'abc'] * 10)]
+        size = eafile.prepared_row_bytes(arrays)
+        row = (0, 'abc')
+        self.assertGreaterEqual(size, sys.getsizeof(row) + sys.getsizeof('abc'))
+        self.assertEqual(eafile.prepared_row_bytes([np.array([])]), 0.)
+
+    def test_prepared(self):
+        arrays_only = eafile.get_chunksize(self.filename, memory=1)
+        prepared = eafile.get_chunksize(self.filename, memory=1, prepared=True)
+        self.assertGreater(prepared, 0)
+        self.assertLess(prepared, arrays_only / 2)
+        columns = eafile.get_chunksize(self.filename, memory=1, columns=['ID'], prepared=True)
+        self.assertGreater(columns, prepared)
+
+
+class TestSchema(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.home = os.environ.get('HOME')
+        os.environ['HOME'] = os.path.join(self.tmpdir, 'home')
+        self.filename = os.path.join(self.tmpdir, 'data', 'test.csv')
+        os.makedirs(os.path.dirname(self.filename))
+        pd.DataFrame({'ID': [1, 2, 3], 'NAME': ['a', 'b', 'long name']}).to_csv(
+            self.filename, index=False)
+
+    def tearDown(self):
+        if self.home is None:
+            del os.environ['HOME']
+        else:
+            os.environ['HOME'] = self.home
+        shutil.rmtree(self.tmpdir)
+
+    def test_columns_then_all(self):
+        self.assertEqual(eafile.get_schema(self.filename, columns=['name'], chunksize=2),
+                         [np.dtype('S9')])
+        self.assertEqual(eafile.get_schema(self.filename, chunksize=2),
+                         [np.dtype('i8'), np.dtype('S9')])
+
+    def test_file_schema(self):
+        names, dtypes = eafile.file_schema(self.filename)
+        self.assertEqual(names, ['ID', 'NAME'])
+        self.assertEqual(dtypes, [np.dtype('i8'), np.dtype('S9')])
+        with open(eafile.schema_path(self.filename)) as fin:
+            self.assertEqual(json.load(fin)['rows'], 3)
+
+    def test_cache_location(self):
+        eafile.get_schema(self.filename)
+        path = eafile.schema_path(self.filename)
+        self.assertTrue(path.startswith(os.path.join(self.tmpdir, 'home', '.easyaccess')))
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(os.listdir(os.path.dirname(self.filename)), ['test.csv'])
+
+
+class TestFileTypes(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_check_filetype(self):
+        self.assertTrue(eafile.check_filetype('out.csv'))
+        self.assertTrue(eafile.check_filetype('in.csv.gz', compressed=True))
+        self.assertRaises(IOError, eafile.check_filetype, 'out.csv.gz')
+        self.assertRaises(IOError, eafile.check_filetype, 'out.fits.bz2', eafile.FITS_EXTS)
+        self.assertRaises(IOError, eafile.check_filetype, 'out.txt')
+
+    def test_write_compressed_name(self):
+        df = pd.DataFrame({'ID': [1, 2]})
+        filename = os.path.join(self.tmpdir, 'out.csv.gz')
+        self.assertRaises(IOError, eafile.write_file, filename, df, None)
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_write_compression(self):
+        df = pd.DataFrame({'ID': [1, 2]})
+        filename = os.path.join(self.tmpdir, 'out.csv')
+        eafile.write_file(filename, df, None, comp=True)
+        self.assertEqual(os.listdir(self.tmpdir), ['out.csv.gz'])
+        with gzip.open(filename + '.gz', 'rb') as fin:
+            self.assertEqual(fin.read().decode('utf-8').split(), ['ID', '1', '2'])
+
+
+class TestManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.df = pd.DataFrame({'ID': np.arange(4), 'MAG': np.linspace(10., 11., 4)})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, filename, nchunks=3, comp=False):
+        filename = os.path.join(self.tmpdir, filename)
+        manifest = eafile.ExportManifest(filename, query='select 1 from dual', comp=comp)
+        desc = [('ID', 'updated'), ('MAG', 'updated')]
+        fileindex, mode = 1, 'w'
+        for i in range(nchunks):
+            # any file is over the size limit, one file per chunk
+            fileindex = eafile.write_file(filename, self.df.copy(), desc, fileindex, mode=mode,
+                                          max_mb=1e-6, comp=comp, manifest=manifest)
+            mode = 'a'
+        with open(manifest.write()) as fin:
+            return json.load(fin)
+
+    def test_shards(self):
+        manifest = self.write('out.csv')
+        self.assertEqual(manifest['total_rows'], 12)
+        self.assertEqual([shard['file'] for shard in manifest['shards']],
+                         ['out_000001.csv', 'out_000002.csv', 'out_000003.csv'])
+        self.assertEqual([(shard['first_row'], shard['last_row'], shard['rows'])
+                          for shard in manifest['shards']], [(0, 3, 4), (4, 7, 4), (8, 11, 4)])
+        self.assertNotIn('out.csv', os.listdir(self.tmpdir))
+
+    def test_csv_md5(self):
+        manifest = self.write('out.csv')
+        self.assertEqual(manifest['checksum'], {'algorithm': 'md5', 'scope': 'file'})
+        for shard in manifest['shards']:
+            filename = os.path.join(self.tmpdir, shard['file'])
+            with open(filename, 'rb') as fin:
+                self.assertEqual(shard['md5'], hashlib.md5(fin.read()).hexdigest())
+            self.assertEqual(shard['bytes'], os.path.getsize(filename))
+
+    def test_single_file(self):
+        manifest = self.write('out.csv', nchunks=1, comp=True)
+        self.assertEqual(manifest['checksum']['scope'], 'uncompressed content')
+        self.assertEqual(manifest['compression'], 'gzip')
+        self.assertEqual([(shard['file'], shard['last_row']) for shard in manifest['shards']],
+                         [('out.csv.gz', 3)])
+
+    def test_records(self):
+        for filename in ('out.fits', 'out.h5'):
+            manifest = self.write(filename, nchunks=2)
+            self.assertEqual(manifest['checksum']['scope'], 'records')
+            self.assertEqual(manifest['total_rows'], 8)
+            self.assertEqual(len(manifest['shards']), 2)
+
+
+class TestFitsStream(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        nrows = 7
+        self.data = np.zeros(nrows, dtype=[('FLAG', '?'), ('NAME', 'S6'), ('U2', 'u2'),
+                                           ('U4', 'u4'), ('U8', 'u8'), ('SCALED', 'i2'),
+                                           ('VEC', 'f4', (2,))])
+        self.data['FLAG'] = np.arange(nrows) % 2 == 0
+        self.data['NAME'] = ['a', 'bb', '', 'dddd', 'e e', 'ffffff', 'g']
+        self.data['U2'] = [0, 1, 2**15, 2**16 - 1, 5, 6, 7]
+        self.data['U4'] = [0, 1, 2**31, 2**32 - 1, 5, 6, 7]
+        self.data['U8'] = [0, 1, 2**63, 2**64 - 1, 5, 6, 7]
+        self.data['SCALED'] = np.arange(nrows) - 3
+        self.data['VEC'] = np.arange(2 * nrows).reshape(nrows, 2)
+        self.filename = os.path.join(self.tmpdir, 'test.fits')
+        fitsio.write(self.filename, self.data)
+        with fitsio.FITS(self.filename, 'rw') as fits:
+            fits[1].write_key('TSCAL6', 0.5)
+            fits[1].write_key('TZERO6', 10.)
+        with open(self.filename, 'rb') as fin:
+            with gzip.open(self.filename + '.gz', 'wb') as fout:
+                fout.write(fin.read())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_read(self):
+        stream = eafile.FitsStream(self.filename + '.gz')
+        self.assertEqual(stream.get_colnames(), list(self.data.dtype.names))
+        self.assertEqual(stream.nrows, len(self.data))
+        data = stream.read(3)
+        self.assertEqual(stream.skip(1), 1)
+        rest = stream.read()
+        self.assertIsNone(stream.read())
+        stream.close()
+        for name in self.data.dtype.names:
+            values = np.concatenate([data[name], rest[name]])
+            expected = np.delete(self.data[name], 3, axis=0)
+            if name == 'SCALED':
+                expected = expected * 0.5 + 10.
+            elif name == 'NAME':
+                expected = np.char.rstrip(expected)
+            np.testing.assert_array_equal(values, expected)
+            self.assertEqual(values.dtype.kind, expected.dtype.kind, name)
+
+    def test_same_as_fitsio(self):
+        expected = fitsio.read(self.filename, columns=['FLAG', 'NAME', 'U4'])
+        data, iterator = eafile.read_file(self.filename + '.gz')
+        chunks = list(eafile.ChunkReader(data, iterator, 4, columns=['FLAG', 'NAME', 'U4']))
+        self.assertEqual([len(c) for c in chunks], [4, 3])
+        for i, name in enumerate(['FLAG', 'NAME', 'U4']):
+            values = np.concatenate([c.arrays[i] for c in chunks])
+            np.testing.assert_array_equal(values.astype(expected[name].dtype), expected[name])
+
+
+class TestChunkReader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.data = create_test_data()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read_all(self, reader):
+        chunks = list(reader)
+        reader.close()
+        return chunks
+
+    def test_csv(self):
+        filename = os.path.join(self.tmpdir, 'test.csv')
+        df = pd.DataFrame(self.data)
+        df['NAME'] = df['NAME'].str.decode('utf-8')
+        df.to_csv(filename, index=False)
+        data, iterator = eafile.read_file(filename)
+        chunks = self.read_all(eafile.ChunkReader(data, iterator, 10, columns=['ra', 'ID']))
+        self.assertEqual([len(c) for c in chunks], [10, 10, 5])
+        self.assertEqual(chunks[0].columns, ['RA', 'ID'])
+        self.assertEqual([c.start for c in chunks], [0, 10, 20])
+        ids = np.concatenate([c.arrays[1] for c in chunks])
+        np.testing.assert_array_equal(ids, self.data['ID'])
+        rows = chunks[1].prepare().rows
+        self.assertEqual(rows[0], (self.data['RA'][10], 10))
+
+    def test_fits(self):
+        filename = os.path.join(self.tmpdir, 'test.fits')
+        fitsio.write(filename, self.data)
+        data, iterator = eafile.read_file(filename)
+        reader = eafile.ChunkReader(data, iterator, 10)
+        self.assertIsNotNone(reader.memmap)
+        reader.skip(15)
+        chunks = self.read_all(reader)
+        self.assertEqual([len(c) for c in chunks], [10])
+        self.assertEqual(chunks[0].start, 15)
+        np.testing.assert_array_equal(chunks[0].arrays[0], self.data['ID'][15:])
+        self.assertEqual(chunks[0].prepare().rows[0], (15, self.data['RA'][15], 'obj15'))
+
+    def test_missing_column(self):
+        data = pd.DataFrame(self.data)
+        data.file_type = 'pandas'
+        reader = eafile.ChunkReader(data, False, 10, columns=['DEC'])
+        self.assertRaises(ValueError, reader.read, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,271 @@
+from __future__ import print_function
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+import easyaccess.eautils.fileio as eafile
+from easyaccess.eautils.load_utils import (InsertWorkers, LoadJournal, ChunkTuner, RejectFile,
+                                           ReadAhead, parse_chunksize, column_list,
+                                           chunks_in_memory)
+
+
+class FakeConnection(object):
+
+    def __init__(self, fail_commit=False):
+        self.fail_commit = fail_commit
+        self.state = 'open'
+        self.rows = []
+
+    def cursor(self):
+        return self
+
+    def close(self):
+        self.closed = True
+
+    def commit(self):
+        if self.fail_commit:
+            raise Exception('ORA-00000: commit failed')
+        self.state = 'committed'
+
+    def rollback(self):
+        self.state = 'rolled back'
+
+
+class TestInsertWorkers(unittest.TestCase):
+
+    def make_pool(self, connections, fail_item=None):
+        pending = list(connections)
+
+        def insert(item, cursor):
+            if item == fail_item:
+                raise ValueError('bad chunk')
+            cursor.rows.append(item)
+        return InsertWorkers(len(pending), lambda: pending.pop(0), insert)
+
+    def test_commit(self):
+        connections = [FakeConnection(), FakeConnection()]
+        pool = self.make_pool(connections)
+        for item in range(10):
+            pool.put(item)
+        self.assertTrue(pool.finish())
+        self.assertEqual(sorted(connections[0].rows + connections[1].rows), list(range(10)))
+        self.assertTrue(all(c.state == 'committed' and c.closed for c in connections))
+
+    def test_insert_error(self):
+        connections = [FakeConnection(), FakeConnection()]
+        pool = self.make_pool(connections, fail_item=3)
+        for item in range(5):
+            pool.put(item)
+        self.assertFalse(pool.finish())
+        self.assertRaises(ValueError, pool.reraise)
+        self.assertTrue(all(c.state == 'rolled back' and c.closed for c in connections))
+
+    def test_commit_error(self):
+        connections = [FakeConnection(), FakeConnection(fail_commit=True), FakeConnection()]
+        pool = self.make_pool(connections)
+        pool.put(1)
+        self.assertRaises(RuntimeError, pool.finish)
+        self.assertEqual([c.state for c in connections],
+                         ['committed', 'rolled back', 'rolled back'])
+        self.assertTrue(all(c.closed for c in connections))
+        self.assertFalse(pool.finish(commit=False))
+
+    def test_connect_error(self):
+        connections = [FakeConnection(), FakeConnection()]
+
+        def connect():
+            if not connections:
+                raise Exception('ORA-00018: maximum number of sessions exceeded')
+            return connections.pop(0)
+        opened = list(connections)
+        self.assertRaises(Exception, InsertWorkers, 3, connect, None)
+        self.assertTrue(all(c.closed for c in opened))
+
+
+class TestChunkSize(unittest.TestCase):
+
+    def test_parse_chunksize(self):
+        self.assertEqual(parse_chunksize('1000'), 1000)
+        self.assertEqual(parse_chunksize('AUTO'), 'auto')
+        self.assertRaises(ValueError, parse_chunksize, '0')
+        self.assertRaises(ValueError, parse_chunksize, 'many')
+
+    def test_column_list(self):
+        self.assertIsNone(column_list(None))
+        self.assertEqual(column_list('ra, dec,,MAG '), ['ra', 'dec', 'MAG'])
+        self.assertEqual(column_list(['RA ', 'DEC']), ['RA', 'DEC'])
+
+    def test_chunks_in_memory(self):
+        self.assertEqual(chunks_in_memory(0, 1), 2)
+        self.assertEqual(chunks_in_memory(2, 1), 4)
+        self.assertEqual(chunks_in_memory(2, 4), 12)
+
+
+class TestChunkTuner(unittest.TestCase):
+
+    def run_tuner(self, tuner, rate):
+        # rate(size) in rows/sec, until the tuner settles
+        for i in range(50):
+            if tuner.settled:
+                break
+            tuner.update(tuner.size, tuner.size / float(rate(tuner.size)))
+        return tuner
+
+    def test_limits(self):
+        tuner = ChunkTuner(10, minimum=1000, maximum=5000)
+        self.assertEqual(tuner.size, 1000)
+        self.assertEqual(ChunkTuner(10000, maximum=5000).size, 5000)
+
+    def test_grows_to_maximum(self):
+        tuner = self.run_tuner(ChunkTuner(1000, maximum=16000), lambda size: size)
+        self.assertTrue(tuner.settled)
+        self.assertEqual(tuner.size, 16000)
+
+    def test_finds_best_size(self):
+        # fastest around 8000 rows
+        tuner = self.run_tuner(ChunkTuner(1000, maximum=10**6),
+                               lambda size: 1e6 - abs(np.log2(size / 8000.)) * 2e5)
+        self.assertTrue(tuner.settled)
+        self.assertTrue(4000 < tuner.size < 16000, tuner.size)
+        self.assertEqual(tuner.size, tuner.best_size)
+
+    def test_ignores_other_sizes(self):
+        tuner = ChunkTuner(1000)
+        self.assertEqual(tuner.update(10, 1.), 1000)
+        self.assertEqual(tuner.best_rate, 0.)
+
+    def test_summary(self):
+        tuner = ChunkTuner(1000)
+        tuner.update(10, 1.)
+        # nothing measured, no size to recommend
+        self.assertIsNone(tuner.summary())
+        tuner.update(1000, 1.)
+        self.assertEqual(tuner.summary(), 'Chunk size best so far 1000 rows (1000 rows/sec), '
+                                          'use --chunksize 1000 to reuse it')
+        tuner = self.run_tuner(ChunkTuner(1000, maximum=4000), lambda size: size)
+        self.assertTrue(tuner.summary().startswith('Chunk size settled at 4000 rows'))
+
+
+class TestReadAhead(unittest.TestCase):
+
+    def test_order_and_prepare(self):
+        reader = ReadAhead(iter(range(10)), depth=2, prepare=lambda item: item * 2)
+        self.assertEqual(list(reader), [2 * i for i in range(10)])
+        reader.close()
+
+    def test_error(self):
+        def items():
+            yield 1
+            raise IOError('bad file')
+        reader = ReadAhead(items(), depth=1)
+        self.assertEqual(next(iter(reader)), 1)
+        self.assertRaises(IOError, list, reader)
+        reader.close()
+
+
+class BatchError(object):
+
+    def __init__(self, offset, message):
+        self.offset = offset
+        self.message = message
+
+
+class TestRejectFile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'test.bad')
+        self.chunk = eafile.Chunk(['ID', 'NAME'], [np.arange(3), np.array([b'a', b'b', b'c'])],
+                                  start=10).prepare()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read(self):
+        with open(self.filename) as fin:
+            return fin.read().splitlines()
+
+    def test_write(self):
+        rejects = RejectFile(self.filename, max_errors=5)
+        rejects.add(self.chunk, [])
+        self.assertFalse(os.path.exists(self.filename))
+        rejects.add(self.chunk, [BatchError(1, 'ORA-12899: value too large ')])
+        rejects.close()
+        self.assertEqual(rejects.count, 1)
+        self.assertEqual(self.read(), ['ROW,ID,NAME,ERROR', '12,1,b,ORA-12899: value too large'])
+
+    def test_max_errors(self):
+        rejects = RejectFile(self.filename, max_errors=1)
+        errors = [BatchError(0, 'ORA-1'), BatchError(2, 'ORA-2')]
+        self.assertRaises(ValueError, rejects.add, self.chunk, errors)
+        rejects.close()
+        # the rows are written before failing
+        self.assertEqual(len(self.read()), 3)
+
+    def test_append(self):
+        rejects = RejectFile(self.filename, max_errors=5)
+        rejects.add(self.chunk, [BatchError(0, 'ORA-1')])
+        rejects.close()
+        rejects = RejectFile(self.filename, max_errors=5, append=True)
+        rejects.add(self.chunk, [BatchError(2, 'ORA-2')])
+        rejects.close()
+        self.assertEqual(self.read()[1:], ['11,0,a,ORA-1', '13,2,c,ORA-2'])
+
+
+class TestLoadJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'test.csv')
+        with open(self.filename, 'w') as fout:
+            fout.write('ID\n1\n2\n')
+        self.path = os.path.join(self.tmpdir, 'journal', 'load_journal.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def journal(self):
+        return LoadJournal('db', 'user', 'table', self.filename, path=self.path)
+
+    def test_update(self):
+        journal = self.journal()
+        self.assertFalse(journal.started)
+        journal.update(100, 1, count=100)
+        journal = self.journal()
+        self.assertTrue(journal.started)
+        self.assertFalse(journal.finished)
+        self.assertEqual((journal.rows, journal.chunks, journal.count), (100, 1, 100))
+        journal.remove()
+        self.assertFalse(self.journal().started)
+
+    def test_pending_committed(self):
+        journal = self.journal()
+        journal.update(100, 1, count=100)
+        journal.prepare(200, 2, 195)
+        journal = self.journal()
+        self.assertEqual(journal.rows, 100)
+        self.assertTrue(journal.resolve(195))
+        self.assertEqual((journal.rows, journal.chunks), (200, 2))
+        self.assertEqual(self.journal().rows, 200)
+
+    def test_pending_not_committed(self):
+        journal = self.journal()
+        journal.update(100, 1, count=100)
+        journal.prepare(200, 2, 200)
+        journal = self.journal()
+        self.assertFalse(journal.resolve(100))
+        self.assertEqual((journal.rows, journal.chunks), (100, 1))
+        journal.prepare(300, 3, None)
+        self.assertFalse(self.journal().resolve(300))
+
+    def test_changed(self):
+        journal = self.journal()
+        journal.update(1, 1)
+        with open(self.filename, 'a') as fout:
+            fout.write('3\n')
+        self.assertTrue(self.journal().changed())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,208 @@
+from __future__ import print_function
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+from easyaccess.eautils.meta_utils import (PrefixIndex, LRUCache, MetadataSnapshot,
+                                           MetadataCache, query_tables, like_regex,
+                                           search_names, sql_search)
+from easyaccess.eautils.db_utils import DatabaseActions
+
+
+class TestPrefixIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = PrefixIndex(['Y6_GOLD', 'Y3_GOLD', 'Y6_GOLD', 'Y6_MOF', None, 'Y6Z'])
+
+    def test_unique_sorted(self):
+        self.assertEqual(len(self.index), 4)
+        self.assertEqual(self.index.complete(), ['Y3_GOLD', 'Y6Z', 'Y6_GOLD', 'Y6_MOF'])
+
+    def test_complete(self):
+        self.assertEqual(self.index.complete('Y6_'), ['Y6_GOLD', 'Y6_MOF'])
+        self.assertEqual(self.index.complete('Y6'), ['Y6Z', 'Y6_GOLD', 'Y6_MOF'])
+        self.assertEqual(self.index.complete('Y6_GOLD'), ['Y6_GOLD'])
+        self.assertEqual(self.index.complete('X'), [])
+
+    def test_contains(self):
+        self.assertIn('Y6_MOF', self.index)
+        self.assertNotIn('Y6_M', self.index)
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_evict_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.get('b', 'missing'), 'missing')
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+        self.assertEqual(cache.pop('a'), 1)
+        self.assertIsNone(cache.pop('a'))
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+class TestMetadataSnapshot(unittest.TestCase):
+
+    def test_indexes(self):
+        snapshot = MetadataSnapshot(tables=['B', 'A'], users=['DES_ADMIN'], columns=['RA'],
+                                    columns_by_table={'DES_ADMIN.A': ['RA']})
+        self.assertEqual(snapshot.table_index.complete(), ['A', 'B'])
+        self.assertIn('DES_ADMIN', snapshot.user_index)
+        self.assertEqual(snapshot.columns_by_table['DES_ADMIN.A'], ['RA'])
+        self.assertEqual(len(snapshot.table_descriptions), 0)
+        self.assertEqual(MetadataSnapshot().columns_by_table, {})
+
+    def test_load_columns(self):
+        calls = []
+
+        def load_columns():
+            calls.append(1)
+            return {'DES_ADMIN.A': ['RA']}
+
+        snapshot = MetadataSnapshot(tables=['A'], load_columns=load_columns)
+        self.assertEqual(calls, [])
+        self.assertEqual(snapshot.columns_by_table['DES_ADMIN.A'], ['RA'])
+        self.assertEqual(snapshot.columns_by_table['DES_ADMIN.A'], ['RA'])
+        self.assertEqual(calls, [1])
+
+
+class TestQueryTables(unittest.TestCase):
+
+    def test_schema_and_alias(self):
+        tables = query_tables('select a.ra from des_admin.y6_gold a where a.ra > 1')
+        self.assertEqual(tables, {'DES_ADMIN.Y6_GOLD': 'DES_ADMIN.Y6_GOLD',
+                                  'Y6_GOLD': 'DES_ADMIN.Y6_GOLD',
+                                  'A': 'DES_ADMIN.Y6_GOLD'})
+
+    def test_joins(self):
+        tables = query_tables('select * from t1 x join t2 y on x.id = y.id, t3 as z '
+                              'left outer join t4 using (id) order by 1')
+        self.assertEqual(tables['X'], 'T1')
+        self.assertEqual(tables['Y'], 'T2')
+        self.assertEqual(tables['T3'], 'T3')
+        self.assertEqual(tables['T4'], 'T4')
+        self.assertNotIn('AS', tables)
+
+    def test_link_and_partial(self):
+        self.assertEqual(query_tables('select ra from gold@desdr g')['G'], 'GOLD@DESDR')
+        self.assertEqual(list(query_tables('select ra, dec from mytab')), ['MYTAB'])
+        self.assertEqual(query_tables("select 'from x' from dual"), {'DUAL': 'DUAL'})
+
+
+class TestSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.names = ['DES_ADMIN.Y6_GOLD', 'DES_ADMIN.Y6_GOLD_MOF', 'Y6_GOLD', 'OLD_Y6',
+                      'MY_GOLDEN']
+
+    def test_like_regex(self):
+        regex = like_regex('Y6_%OLD')
+        self.assertTrue(regex.match('Y6XGOLD'))
+        self.assertTrue(regex.match('Y6_OLD'))
+        self.assertFalse(regex.match('Y6OLD'))
+        self.assertFalse(like_regex('Y6%').match('XY6'))
+        self.assertTrue(like_regex('A.B').match('A.B'))
+        self.assertFalse(like_regex('A.B').match('AXB'))
+
+    def test_like(self):
+        self.assertEqual(search_names(self.names, 'y6_gold%'),
+                         ['DES_ADMIN.Y6_GOLD', 'DES_ADMIN.Y6_GOLD_MOF', 'Y6_GOLD'])
+
+    def test_regex(self):
+        self.assertEqual(search_names(self.names, 'GOLD$'), ['DES_ADMIN.Y6_GOLD', 'Y6_GOLD'])
+
+    def test_substring_ranking(self):
+        self.assertEqual(search_names(self.names, 'y6_gold'),
+                         ['Y6_GOLD', 'DES_ADMIN.Y6_GOLD', 'DES_ADMIN.Y6_GOLD_MOF'])
+        # then by the position of the match
+        self.assertEqual(search_names(self.names, 'gold'),
+                         ['MY_GOLDEN', 'Y6_GOLD', 'DES_ADMIN.Y6_GOLD', 'DES_ADMIN.Y6_GOLD_MOF'])
+
+    def test_sql_search(self):
+        self.assertEqual(sql_search('c', '^Y6.*'), ("regexp_like(c, '^Y6.*', 'i')", 'c'))
+        self.assertEqual(sql_search('c', "y6%'"), ("upper(c) like 'Y6%'''", 'c'))
+        condition, order = sql_search('c', 'y6_gold')
+        self.assertEqual(condition, "upper(c) like '%Y6\\_GOLD%' escape '\\'")
+        self.assertEqual(order, "case when upper(c) = 'Y6_GOLD' then 0 else 1 end, "
+                                "instr(upper(c), 'Y6_GOLD'), c")
+
+    def test_fuzzy(self):
+        self.assertIn('Y6_GOLD', search_names(self.names, 'Y6_GLOD'))
+        self.assertEqual(search_names(self.names, 'Y6_GLOD', fuzzy=False), [])
+
+
+class TestMetadataCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'metadata', 'db_user.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_save_load(self):
+        cache = MetadataCache('db', 'user', path=self.path)
+        self.assertFalse(cache.load())
+        self.assertTrue(cache.is_stale(1))
+        cache.save(['T'], ['U'], ['C'], db_time='2020-01-01 00:00:00',
+                   resolved={'T': ('U', 'T', '')}, columns_by_table={'U.T': ['C']})
+        cache = MetadataCache('db', 'user', path=self.path)
+        self.assertTrue(cache.load())
+        self.assertEqual((cache.tables, cache.users, cache.columns), (['T'], ['U'], ['C']))
+        self.assertEqual(cache.resolved, {'T': ('U', 'T', '')})
+        # the columns are in their own file, read when searched
+        self.assertEqual(cache.columns_by_table, {})
+        self.assertEqual(cache.load_columns(), {'U.T': ['C']})
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, 'metadata',
+                                                    'db_user_columns.json')))
+        self.assertEqual(cache.db_time, '2020-01-01 00:00:00')
+        self.assertFalse(cache.is_stale(1))
+
+
+class TestInstallMetadata(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = DatabaseActions()
+        self.db.dbname = 'dessci'
+        self.db.metadata_lock = threading.RLock()
+        self.db.metadata_cache = MetadataCache('dessci', 'user',
+                                               path=os.path.join(self.tmpdir, 'dessci_user.json'))
+        self.db.resolved_tables = {'T': ('U', 'T', '')}
+        self.db.metadata_status = 'loading'
+        self.db.set_metadata([], [], [])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_install(self):
+        cache = self.db.metadata_cache
+        self.assertTrue(self.db._install_metadata(cache, 'dessci', ['T'], ['U'], ['C'],
+                                                  {'U.T': ['C']}, None))
+        self.assertEqual(self.db.cache_table_names, ['T'])
+        self.assertEqual(self.db.resolved_tables, {})
+        self.assertEqual(self.db.metadata_status, 'ready')
+        self.assertTrue(os.path.exists(cache.path))
+
+    def test_discard_after_change_db(self):
+        cache = self.db.metadata_cache
+        # what change_db does while the metadata is being read
+        self.db.dbname = 'desoper'
+        self.db.metadata_cache = MetadataCache('desoper', 'user',
+                                               path=os.path.join(self.tmpdir, 'desoper_user.json'))
+        self.assertFalse(self.db._install_metadata(cache, 'dessci', ['T'], ['U'], ['C'],
+                                                   {'U.T': ['C']}, None))
+        self.assertEqual(self.db.cache_table_names, [])
+        self.assertEqual(self.db.resolved_tables, {'T': ('U', 'T', '')})
+        self.assertFalse(os.path.exists(cache.path))
+        self.assertFalse(os.path.exists(self.db.metadata_cache.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+from __future__ import print_function
+import unittest
+import cx_Oracle
+import easyaccess.eautils.python_api as python_api
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+class FakePool(object):
+    """
+    cx_Oracle.SessionPool that does not connect, close() fails while busy
+    """
+
+    def __init__(self, user, password, dsn, **kwargs):
+        self.user = user
+        self.password = password
+        self.kwargs = kwargs
+        self.busy = False
+        self.closed = False
+
+    def close(self, force=False):
+        if self.busy and not force:
+            raise cx_Oracle.DatabaseError('ORA-24422: sessions still in use')
+        self.closed = True
+
+
+class TestSessionPool(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(cx_Oracle, 'SessionPool', FakePool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        python_api._session_pools.clear()
+        self.addCleanup(python_api._session_pools.clear)
+
+    def test_shared_by_credentials(self):
+        pool = python_api.get_session_pool('dessci', 'User', 'pw', 'dsn')
+        self.assertIs(python_api.get_session_pool('dessci', 'user', 'pw', 'dsn'), pool)
+        # a different password never gets the sessions of this pool
+        other = python_api.get_session_pool('dessci', 'user', 'wrong', 'dsn')
+        self.assertIsNot(other, pool)
+        self.assertEqual(other.pool.password, 'wrong')
+        self.assertIsNot(python_api.get_session_pool('desoper', 'user', 'pw', 'dsn'), pool)
+
+    def test_timed_wait(self):
+        pool = python_api.get_session_pool('dessci', 'user', 'pw', 'dsn', max=2, timeout=5)
+        self.assertEqual(pool.pool.kwargs['getmode'], cx_Oracle.SPOOL_ATTRVAL_TIMEDWAIT)
+        self.assertEqual(pool.pool.kwargs['waitTimeout'], 5000)
+        self.assertEqual(pool.pool.kwargs['max'], 2)
+
+    def test_close_all(self):
+        busy = python_api.get_session_pool('dessci', 'user', 'pw', 'dsn')
+        idle = python_api.get_session_pool('desoper', 'user', 'pw', 'dsn')
+        busy.pool.busy = True
+        with self.assertRaises(Exception) as context:
+            python_api.close_session_pools()
+        self.assertIn('ORA-24422', str(context.exception))
+        self.assertTrue(idle.pool.closed)
+        self.assertFalse(busy.pool.closed)
+        self.assertEqual(python_api._session_pools, {})
+        busy.close(force=True)
+        self.assertTrue(busy.pool.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()